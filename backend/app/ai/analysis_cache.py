@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.ai.embedding_cache import normalize_text
+from app.utils.preprocessing import mask_variables
+from app.utils.storage import DATA_DIR, open_sqlite
+
+ANALYSIS_CACHE_PATH = os.path.join(DATA_DIR, "analysis_cache.db")
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "1") != "0"
+ANALYSIS_CACHE_TTL_SECONDS = float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "3600"))
+ANALYSIS_CACHE_MEMORY_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MEMORY_ENTRIES", "1000"))
+ANALYSIS_CACHE_DISK_ENTRIES = int(os.getenv("ANALYSIS_CACHE_DISK_ENTRIES", "10000"))
+# Semantic hits: reuse an analysis whose query embedding is within this squared
+# L2 distance (unit vectors, so 0.1 ~ cosine similarity 0.95). 0 disables.
+ANALYSIS_CACHE_SEMANTIC_DISTANCE = float(os.getenv("ANALYSIS_CACHE_SEMANTIC_DISTANCE", "0"))
+
+# A cached entry: the LLM analysis, the similar incidents it was based on, creation time
+CachedAnalysis = Tuple[Dict, Optional[List[str]], float]
+
+
+def incident_fingerprint(model: str, logs: List[str], scope: str = "") -> bytes:
+    """Key for a log set: hash of its distinct lines with variables masked.
+
+    Order, duplicates, timestamps and ids do not change the fingerprint, so
+    a re-triaged alert storm maps to the same entry. `scope` separates
+    analyses whose similar-incident retrieval differed (filters or mode).
+    """
+    lines = sorted({mask_variables(normalize_text(line)) for line in logs})
+    payload = "\x00".join([model, scope] + lines if scope else [model] + lines).encode("utf-8")
+    return hashlib.sha256(payload).digest()
+
+
+class AnalysisCache:
+    """Persistent TTL + LRU cache of incident analyses keyed by fingerprint.
+
+    Entries live in SQLite with an in-memory LRU in front. Query embeddings
+    of live entries are kept in memory for optional nearest-neighbour
+    (semantic) lookups when no exact fingerprint matches.
+    """
+
+    def __init__(
+        self,
+        db_path: str = ANALYSIS_CACHE_PATH,
+        ttl_seconds: float = ANALYSIS_CACHE_TTL_SECONDS,
+        memory_entries: int = ANALYSIS_CACHE_MEMORY_ENTRIES,
+        disk_entries: int = ANALYSIS_CACHE_DISK_ENTRIES,
+        semantic_distance: float = ANALYSIS_CACHE_SEMANTIC_DISTANCE,
+    ):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.semantic_distance = semantic_distance
+        self._memory: "OrderedDict[bytes, CachedAnalysis]" = OrderedDict()
+        self._vectors: Dict[bytes, np.ndarray] = {}
+        self._matrix: Optional[Tuple[List[bytes], np.ndarray]] = None
+        self._lock = threading.Lock()
+        self._conn = None
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = open_sqlite(self.db_path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                "key BLOB PRIMARY KEY, body TEXT NOT NULL, embedding BLOB, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analyses_last_used ON analyses (last_used)"
+            )
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM analyses WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                )
+            for key, blob in self._conn.execute(
+                "SELECT key, embedding FROM analyses WHERE embedding IS NOT NULL"
+            ):
+                self._vectors[key] = np.frombuffer(blob, dtype=np.float32)
+        return self._conn
+
+    def _expired(self, created_at: float) -> bool:
+        return time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key: bytes, entry: CachedAnalysis) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _forget(self, conn, keys: List[bytes]) -> None:
+        for key in keys:
+            self._memory.pop(key, None)
+            self._vectors.pop(key, None)
+        self._matrix = None
+        with conn:
+            conn.executemany("DELETE FROM analyses WHERE key = ?", ((key,) for key in keys))
+
+    def _load(self, key: bytes) -> Optional[CachedAnalysis]:
+        """Look up one key in memory, then on disk, dropping it if expired."""
+        conn = self._db()
+        entry = self._memory.get(key)
+        if entry is None:
+            row = conn.execute(
+                "SELECT body, created_at FROM analyses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            body = json.loads(row[0])
+            entry = (body["analysis"], body["similar_incidents"], row[1])
+        if self._expired(entry[2]):
+            self._forget(conn, [key])
+            self.expirations += 1
+            return None
+        self._remember(key, entry)
+        with conn:
+            conn.execute("UPDATE analyses SET last_used = ? WHERE key = ?", (time.time(), key))
+        return entry
+
+    def get(self, key: bytes) -> Optional[CachedAnalysis]:
+        """Return the cached entry for an exact fingerprint, or None."""
+        with self._lock:
+            entry = self._load(key)
+            if entry is not None:
+                self.exact_hits += 1
+            return entry
+
+    def get_similar(self, embedding: List[float]) -> Optional[CachedAnalysis]:
+        """Return the nearest live entry within the semantic distance, or None."""
+        if self.semantic_distance <= 0:
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._db()
+            if self._matrix is None:
+                keys = [k for k, v in self._vectors.items() if v.shape == query.shape]
+                vectors = np.stack([self._vectors[k] for k in keys]) if keys else None
+                self._matrix = (keys, vectors)
+            keys, vectors = self._matrix
+            if vectors is None or vectors.shape[1] != query.shape[0]:
+                return None
+            distances = ((vectors - query) ** 2).sum(axis=1)
+            for i in np.argsort(distances):
+                if distances[i] > self.semantic_distance:
+                    break
+                entry = self._load(keys[i])
+                if entry is not None:
+                    self.semantic_hits += 1
+                    return entry
+            return None
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def put(
+        self,
+        key: bytes,
+        analysis: Dict,
+        similar_incidents: Optional[List[str]],
+        embedding: Optional[List[float]] = None,
+    ) -> None:
+        """Store an analysis, evicting least recently used entries over capacity."""
+        now = time.time()
+        body = json.dumps({"analysis": analysis, "similar_incidents": similar_incidents})
+        vector = np.asarray(embedding, dtype=np.float32) if embedding is not None else None
+        with self._lock:
+            conn = self._db()
+            self._remember(key, (analysis, similar_incidents, now))
+            if vector is not None:
+                self._vectors[key] = vector
+                self._matrix = None
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO analyses (key, body, embedding, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, body, vector.tobytes() if vector is not None else None, now, now),
+                )
+            count = conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+            if count > self.disk_entries:
+                excess = count - self.disk_entries + self.disk_entries // 10
+                stale = [
+                    row[0]
+                    for row in conn.execute(
+                        "SELECT key FROM analyses ORDER BY last_used LIMIT ?", (excess,)
+                    )
+                ]
+                self._forget(conn, stale)
+                self.evictions += len(stale)
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and cache size."""
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        with self._lock:
+            entries = self._db().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "entries": entries,
+        }
+
+
+# Singleton instance
+analysis_cache = AnalysisCache()
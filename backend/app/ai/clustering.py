@@ -0,0 +1,243 @@
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from app.utils.latency import LatencyTracker
+from app.utils.log_parser import LEVELS, parse_fields
+from app.utils.preprocessing import LogTemplate
+
+CLUSTERING_ENABLED = os.getenv("CLUSTERING_ENABLED", "1") != "0"
+# Clusters that receive no lines for this long are closed
+CLUSTER_WINDOW_SECONDS = float(os.getenv("CLUSTER_WINDOW_SECONDS", "3600"))
+# A template joins the nearest open cluster whose centroid is within this squared
+# L2 distance (unit vectors, so 0.3 ~ cosine similarity 0.85), else opens a new one
+CLUSTER_DISTANCE = float(os.getenv("CLUSTER_DISTANCE", "0.3"))
+# Most open clusters carried into a batch; beyond it the least recently active close
+CLUSTER_MAX_ACTIVE = int(os.getenv("CLUSTER_MAX_ACTIVE", "10000"))
+REPRESENTATIVES = 3
+
+
+class _Cluster:
+    """Bookkeeping of one open cluster; its centroid lives in IncidentClusters' arrays."""
+
+    __slots__ = ("id", "members", "level", "sources", "first_seen")
+
+    def __init__(self, cluster_id: int, now: float):
+        self.id = cluster_id
+        self.members: Dict[int, List] = {}  # template id -> [representative line, lines]
+        self.level = 0
+        self.sources = set()
+        self.first_seen = now
+
+
+class IncidentClusters:
+    """Online threshold micro-clustering of ingested log templates.
+
+    The unit of clustering is a mined template, weighted by how many lines
+    it received, so an alert storm of one repeated line costs one dict
+    update per batch. Templates seen for the first time are assigned with
+    one FAISS knn call per batch against all open centroids; those farther
+    than CLUSTER_DISTANCE from every centroid open new clusters (leader
+    clustering). Centroids are running means of their templates' unit
+    vectors. Clusters idle for CLUSTER_WINDOW_SECONDS close, and their
+    templates are assigned afresh when they show up again.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = CLUSTER_WINDOW_SECONDS,
+        distance: float = CLUSTER_DISTANCE,
+        max_active: int = CLUSTER_MAX_ACTIVE,
+    ):
+        self.window_seconds = window_seconds
+        self.distance = distance
+        self.max_active = max_active
+        self._lock = threading.Lock()
+        self._centroids: Optional[np.ndarray] = None  # capacity x dim; first _count rows used
+        self._weights = np.empty(0, dtype=np.float32)  # templates per cluster
+        self._lines = np.empty(0, dtype=np.int64)
+        self._last_seen = np.empty(0, dtype=np.float64)
+        self._clusters: List[_Cluster] = []
+        self._count = 0
+        self._rows: Dict[int, int] = {}  # cluster id -> row
+        self._assigned: Dict[int, int] = {}  # template id -> cluster id
+        self._next_id = 1
+        self.closed = 0
+        self.lines_clustered = 0
+        self.lines_unclustered = 0
+        self.batch_latency = LatencyTracker()
+
+    def unplaced(self, templates: List[LogTemplate]) -> List[LogTemplate]:
+        """Templates not in any open cluster (add() needs their vectors)."""
+        with self._lock:
+            return [t for t in templates if t.id not in self._assigned]
+
+    def add(
+        self,
+        batch: List[Tuple[LogTemplate, int]],
+        vectors: Dict[int, List[float]],
+        now: Optional[float] = None,
+    ) -> None:
+        """Cluster one ingest batch of (template, lines) pairs.
+
+        `vectors` maps template ids to embeddings; templates that are not in
+        an open cluster and have no vector are counted as unclustered.
+        """
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            new = []
+            for template, lines in batch:
+                cluster_id = self._assigned.get(template.id)
+                if cluster_id is not None:
+                    row = self._rows[cluster_id]
+                    self._clusters[row].members[template.id][1] += lines
+                    self._lines[row] += lines
+                    self._last_seen[row] = now
+                    self.lines_clustered += lines
+                elif template.id in vectors:
+                    new.append((template, lines))
+                else:
+                    self.lines_unclustered += lines
+            if new:
+                self._assign(new, vectors, now)
+        self.batch_latency.record(time.perf_counter() - started)
+
+    def _assign(self, new: List[Tuple[LogTemplate, int]], vectors: Dict[int, List[float]], now: float) -> None:
+        x = np.array([vectors[t.id] for t, _ in new], dtype=np.float32)
+        faiss.normalize_L2(x)
+        rows = np.full(len(x), -1, dtype=np.int64)
+        if self._count:
+            distances, nearest = faiss.knn(x, self._centroids[:self._count], 1)
+            close = distances[:, 0] <= self.distance
+            rows[close] = nearest[close, 0]
+
+        # Leftovers: join a cluster opened earlier in this batch, or open one
+        opened_from = self._count
+        for i in np.flatnonzero(rows < 0):
+            if self._count > opened_from:
+                d = ((self._centroids[opened_from:self._count] - x[i]) ** 2).sum(axis=1)
+                j = int(np.argmin(d))
+                if d[j] <= self.distance:
+                    rows[i] = opened_from + j
+                    self._update_centroids(rows[i:i + 1], x[i:i + 1])
+                    continue
+            rows[i] = self._open(x[i], now)
+
+        # Running-mean update of the existing centroids, all at once
+        joined = rows < opened_from
+        if joined.any():
+            self._update_centroids(rows[joined], x[joined])
+
+        for (template, lines), row in zip(new, rows.tolist()):
+            cluster = self._clusters[row]
+            cluster.members[template.id] = [template.representative, lines]
+            _, level, service, _ = parse_fields(template.representative)
+            cluster.level = max(cluster.level, level)
+            if service:
+                cluster.sources.add(service)
+            self._assigned[template.id] = cluster.id
+            self._lines[row] += lines
+            self._last_seen[row] = now
+            self.lines_clustered += lines
+
+    def _update_centroids(self, rows: np.ndarray, x: np.ndarray) -> None:
+        targets, inverse = np.unique(rows, return_inverse=True)
+        sums = np.zeros((len(targets), x.shape[1]), dtype=np.float32)
+        np.add.at(sums, inverse, x)
+        counts = np.bincount(inverse).astype(np.float32)
+        weights = self._weights[targets]
+        merged = self._centroids[targets] * weights[:, None] + sums
+        faiss.normalize_L2(merged)
+        self._centroids[targets] = merged
+        self._weights[targets] = weights + counts
+
+    def _open(self, vector: np.ndarray, now: float) -> int:
+        row = self._count
+        if self._centroids is None or row == len(self._centroids):
+            capacity = max(2 * row, 256)
+            centroids = np.empty((capacity, len(vector)), dtype=np.float32)
+            if self._centroids is not None:
+                centroids[:row] = self._centroids[:row]
+            self._centroids = centroids
+            self._weights = np.resize(self._weights, capacity)
+            self._lines = np.resize(self._lines, capacity)
+            self._last_seen = np.resize(self._last_seen, capacity)
+        self._centroids[row] = vector
+        self._weights[row] = 1
+        self._lines[row] = 0
+        self._last_seen[row] = now
+        cluster = _Cluster(self._next_id, now)
+        self._next_id += 1
+        self._clusters.append(cluster)
+        self._rows[cluster.id] = row
+        self._count += 1
+        return row
+
+    def _expire(self, now: float) -> None:
+        """Close idle clusters (and the least recent beyond max_active), compacting the arrays."""
+        n = self._count
+        keep = self._last_seen[:n] >= now - self.window_seconds
+        active = np.flatnonzero(keep)
+        if len(active) > self.max_active:
+            oldest = active[np.argsort(self._last_seen[active], kind="stable")]
+            keep[oldest[:len(active) - self.max_active]] = False
+        if keep.all():
+            return
+        for row in np.flatnonzero(~keep).tolist():
+            for template_id in self._clusters[row].members:
+                del self._assigned[template_id]
+        rows = np.flatnonzero(keep)
+        self._count = len(rows)
+        self._centroids[:self._count] = self._centroids[rows]
+        self._weights[:self._count] = self._weights[rows]
+        self._lines[:self._count] = self._lines[rows]
+        self._last_seen[:self._count] = self._last_seen[rows]
+        self._clusters = [self._clusters[row] for row in rows.tolist()]
+        self._rows = {cluster.id: row for row, cluster in enumerate(self._clusters)}
+        self.closed += n - self._count
+
+    def active(self, limit: int = 50, min_lines: int = 1) -> List[Dict]:
+        """Open clusters, largest first, with their most frequent lines as representatives."""
+        with self._lock:
+            self._expire(time.time())
+            rows = np.argsort(-self._lines[:self._count], kind="stable").tolist()
+            result = []
+            for row in rows:
+                lines = int(self._lines[row])
+                if lines < min_lines or len(result) >= limit:
+                    break
+                cluster = self._clusters[row]
+                members = sorted(cluster.members.values(), key=lambda member: -member[1])
+                result.append({
+                    "id": cluster.id,
+                    "lines": lines,
+                    "templates": len(members),
+                    "level": LEVELS[cluster.level - 1] if cluster.level else None,
+                    "sources": sorted(cluster.sources),
+                    "first_seen": datetime.fromtimestamp(cluster.first_seen).isoformat(),
+                    "last_seen": datetime.fromtimestamp(float(self._last_seen[row])).isoformat(),
+                    "representatives": [line for line, _ in members[:REPRESENTATIVES]],
+                })
+            return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "active_clusters": self._count,
+                "closed_clusters": self.closed,
+                "templates_assigned": len(self._assigned),
+                "lines_clustered": self.lines_clustered,
+                "lines_unclustered": self.lines_unclustered,
+                "batch_latency": self.batch_latency.stats(),
+            }
+
+
+# Singleton instance
+incident_clusters = IncidentClusters()
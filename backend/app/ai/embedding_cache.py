@@ -0,0 +1,169 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.storage import DATA_DIR, open_sqlite
+
+CACHE_PATH = os.path.join(DATA_DIR, "embedding_cache.db")
+CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "10000"))
+CACHE_DISK_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_ENTRIES", "1000000"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache keying (trim and collapse whitespace)."""
+    return _WHITESPACE.sub(" ", text.strip())
+
+
+def cache_key(model: str, task_type: str, text: str) -> bytes:
+    """Content address of an embedding: hash of (model, task_type, normalized text)."""
+    payload = f"{model}\x00{task_type}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).digest()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: in-memory LRU over SQLite float32 blobs.
+
+    Memory hits never touch disk. The disk tier tracks a last-used stamp
+    and evicts the least recently used tenth once it exceeds `disk_entries`.
+    """
+
+    def __init__(
+        self,
+        db_path: str = CACHE_PATH,
+        memory_entries: int = CACHE_MEMORY_ENTRIES,
+        disk_entries: int = CACHE_DISK_ENTRIES,
+    ):
+        self.db_path = db_path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_count = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = open_sqlite(self.db_path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)"
+            )
+            self._disk_count = self._count()
+        return self._conn
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, np.ndarray]:
+        """Return cached vectors for the given keys; missing keys are absent."""
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            pending = []
+            for key in dict.fromkeys(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+                else:
+                    pending.append(key)
+
+            conn = self._db()
+            for start in range(0, len(pending), 500):
+                chunk = pending[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[key] = vector
+                    self._remember(key, vector)
+                self.disk_hits += len(rows)
+                if rows:
+                    now = time.time()
+                    with conn:
+                        conn.executemany(
+                            "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                            ((now, key) for key, _ in rows),
+                        )
+            self.misses += len(pending) - sum(1 for key in pending if key in found)
+        return found
+
+    def put_many(self, items: List[Tuple[bytes, List[float]]]) -> None:
+        """Store vectors in both tiers, evicting from disk when over capacity."""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        with self._lock:
+            for key, embedding in items:
+                vector = np.asarray(embedding, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes(), now))
+
+            conn = self._db()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    rows,
+                )
+                # Upper bound (replaced keys are counted too); recounted on eviction
+                self._disk_count += len(rows)
+                if self._disk_count > self.disk_entries:
+                    self._disk_count = self._count()
+                if self._disk_count > self.disk_entries:
+                    excess = self._disk_count - self.disk_entries + self.disk_entries // 10
+                    conn.execute(
+                        "DELETE FROM embeddings WHERE key IN ("
+                        "SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                        (excess,),
+                    )
+                    self.evictions += excess
+                    self._disk_count = self._count()
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """Return a single cached vector or None."""
+        return self.get_many([key]).get(key)
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and tier sizes."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        with self._lock:
+            self._db()
+            disk_size = self._disk_count
+            memory_size = len(self._memory)
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory_entries": memory_size,
+            "disk_entries": disk_size,
+        }
+
+
+# Singleton instance
+embedding_cache = EmbeddingCache()
@@ -1,47 +1,287 @@
+import asyncio
+import hashlib
 import os
-from typing import List
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
 
 import google.generativeai as genai
+import numpy as np
+from google.api_core import exceptions as google_exceptions
+
+from app.ai.embedding_cache import cache_key, embedding_cache
+from app.utils.singleflight import SingleFlight
 
 # Configure the Gemini API
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
 EMBEDDING_MODEL = "models/gemini-embedding-001"
-EMBEDDING_DIM = 3072
+NATIVE_EMBEDDING_DIM = 3072
+# Output dimension; smaller values use the model's truncated (Matryoshka) output.
+# Must match EMBEDDING_DIM in app/db/vector_store.py.
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", str(NATIVE_EMBEDDING_DIM)))
 
+# Batching / concurrency knobs for bulk embedding
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))  # API max per call
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+EMBEDDING_BACKOFF_BASE = 1.0  # seconds, doubled per retry
+EMBEDDING_BACKOFF_MAX = 30.0
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") != "0"
+# Threads that run blocking embedding calls for async request handlers
+EMBEDDING_EXECUTOR_WORKERS = int(os.getenv("EMBEDDING_EXECUTOR_WORKERS", "8"))
+
+# Errors worth retrying with backoff (quota, overload, timeouts)
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+)
+
+# An embedding backend takes (texts, task_type) and returns one vector per text
+EmbeddingBackend = Callable[[List[str], str], List[List[float]]]
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row (truncated embeddings are not unit length)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def gemini_backend(texts: List[str], task_type: str) -> List[List[float]]:
+    """Embed a batch of texts with a single Gemini API call."""
+    if EMBEDDING_DIM == NATIVE_EMBEDDING_DIM:
+        result = genai.embed_content(
+            model=EMBEDDING_MODEL,
+            content=texts,
+            task_type=task_type,
+        )
+        return result["embedding"]
 
-def generate_embedding(text: str) -> List[float]:
-    """Generate an embedding vector for a single text using Gemini."""
     result = genai.embed_content(
         model=EMBEDDING_MODEL,
-        content=text,
-        task_type="retrieval_document",
+        content=texts,
+        task_type=task_type,
+        output_dimensionality=EMBEDDING_DIM,
     )
-    return result["embedding"]
+    return normalize_rows(np.array(result["embedding"], dtype=np.float32)).tolist()
 
 
-def generate_embeddings_batch(texts: List[str]) -> List[List[float]]:
-    """Generate embedding vectors for a batch of texts using Gemini.
+def fake_backend(texts: List[str], task_type: str) -> List[List[float]]:
+    """Deterministic local backend for development and benchmarks.
 
-    Processes texts individually to handle potential failures gracefully.
+    Vectors are seeded from a hash of the text, so identical texts embed
+    identically. FAKE_EMBEDDING_LATENCY_MS simulates per-call network time.
     """
-    embeddings = []
+    latency_ms = float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", "0"))
+    if latency_ms:
+        time.sleep(latency_ms / 1000)
+    vectors = []
     for text in texts:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM, dtype=np.float32)
+        vectors.append((vector / np.linalg.norm(vector)).tolist())
+    return vectors
+
+
+_backend: EmbeddingBackend = (
+    fake_backend if os.getenv("EMBEDDING_BACKEND") == "fake" else gemini_backend
+)
+
+
+def set_embedding_backend(backend: EmbeddingBackend) -> None:
+    """Swap the embedding backend (e.g. fake_backend for local runs)."""
+    global _backend
+    _backend = backend
+
+
+# Coalesces identical embedding requests that are in flight at the same time
+inflight = SingleFlight()
+
+
+def _model_key() -> str:
+    """Model identity used in cache keys; non-Gemini backends get their own namespace."""
+    model = EMBEDDING_MODEL
+    if _backend is not gemini_backend:
+        model = f"{model}:{getattr(_backend, '__name__', type(_backend).__name__)}"
+    if EMBEDDING_DIM != NATIVE_EMBEDDING_DIM:
+        model = f"{model}@{EMBEDDING_DIM}"
+    return model
+
+
+def _call_with_backoff(texts: List[str], task_type: str) -> List[List[float]]:
+    """Call the backend, retrying rate-limit and transient errors with backoff."""
+    for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+        try:
+            embeddings = _backend(texts, task_type)
+            if len(embeddings) != len(texts):
+                raise ValueError(
+                    f"Backend returned {len(embeddings)} embeddings for {len(texts)} texts"
+                )
+            return embeddings
+        except RETRYABLE_ERRORS:
+            if attempt == EMBEDDING_MAX_RETRIES:
+                raise
+            delay = min(EMBEDDING_BACKOFF_BASE * 2 ** attempt, EMBEDDING_BACKOFF_MAX)
+            time.sleep(delay * (0.5 + random.random() / 2))  # jitter
+    raise RuntimeError("unreachable")
+
+
+def _embed_chunk(texts: List[str], task_type: str) -> List[Optional[List[float]]]:
+    """Embed one chunk; on failure fall back to per-item calls to isolate bad texts."""
+    try:
+        return _call_with_backoff(texts, task_type)
+    except Exception as e:
+        if len(texts) == 1:
+            print(f"Error generating embedding for text: {texts[0][:50]}... - {e}")
+            return [None]
+        print(f"Batch embedding of {len(texts)} texts failed ({e}); retrying per item")
+    return [_embed_chunk([text], task_type)[0] for text in texts]
+
+
+def _embed_uncached(
+    texts: List[str],
+    task_type: str,
+    batch_size: Optional[int],
+    concurrency: Optional[int],
+) -> List[Optional[List[float]]]:
+    """Embed texts in chunks with bounded parallelism, bypassing the cache."""
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    concurrency = concurrency or EMBEDDING_CONCURRENCY
+
+    chunks = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    if len(chunks) == 1 or concurrency == 1:
+        results = [_embed_chunk(chunk, task_type) for chunk in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(chunks))) as pool:
+            results = list(pool.map(lambda chunk: _embed_chunk(chunk, task_type), chunks))
+
+    return [embedding for chunk in results for embedding in chunk]
+
+
+def embed_texts(
+    texts: List[str],
+    task_type: str = "retrieval_document",
+    batch_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> List[Optional[List[float]]]:
+    """Embed texts in chunks with bounded parallelism.
+
+    Cached texts are served from the embedding cache and repeated texts are
+    embedded once, so API calls scale with unique lines. Texts another
+    request is embedding right now are waited on rather than sent again. Returns one entry
+    per input text, in order. Failed texts are None; callers must skip them
+    rather than index a placeholder vector.
+    """
+    if not texts:
+        return []
+
+    model = _model_key()
+    keys = [cache_key(model, task_type, text) for text in texts]
+    found = embedding_cache.get_many(keys) if EMBEDDING_CACHE_ENABLED else {}
+
+    # Embed each missing key once, sharing keys another request is already embedding
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = text
+
+    def fetch(owned: List[bytes]) -> List[Optional[np.ndarray]]:
+        fresh = _embed_uncached([missing[key] for key in owned], task_type, batch_size, concurrency)
+        if EMBEDDING_CACHE_ENABLED:
+            embedding_cache.put_many(
+                [(key, emb) for key, emb in zip(owned, fresh) if emb is not None]
+            )
+        return [np.asarray(emb, dtype=np.float32) if emb is not None else None for emb in fresh]
+
+    if missing:
         try:
-            embedding = generate_embedding(text)
-            embeddings.append(embedding)
+            fetched = inflight.do_many(list(missing), fetch)
         except Exception as e:
-            print(f"Error generating embedding for text: {text[:50]}... - {e}")
-            # Use zero vector as fallback for failed embeddings
-            embeddings.append([0.0] * EMBEDDING_DIM)
-    return embeddings
+            # Another request's batch failed outright; treat its texts as failed
+            print(f"Warning: coalesced embedding failed: {e}")
+            fetched = {}
+        found.update((key, emb) for key, emb in fetched.items() if emb is not None)
+
+    return [found[key].tolist() if key in found else None for key in keys]
+
+
+def _embed_one(text: str, task_type: str) -> List[float]:
+    """Embed a single text through the cache, raising on failure."""
+    key = cache_key(_model_key(), task_type, text)
+    if EMBEDDING_CACHE_ENABLED:
+        cached = embedding_cache.get(key)
+        if cached is not None:
+            return cached.tolist()
+
+    def fetch() -> List[float]:
+        embedding = _call_with_backoff([text], task_type)[0]
+        if EMBEDDING_CACHE_ENABLED:
+            embedding_cache.put_many([(key, embedding)])
+        return embedding
+
+    return inflight.do(key, fetch)
+
+
+def generate_embedding(text: str) -> List[float]:
+    """Generate an embedding vector for a single text using Gemini."""
+    return _embed_one(text, "retrieval_document")
+
+
+def generate_embeddings_batch(texts: List[str]) -> List[Optional[List[float]]]:
+    """Generate embedding vectors for a batch of texts using Gemini.
+
+    Uses multi-content API calls in parallel chunks. Texts that could not be
+    embedded come back as None instead of a zero vector.
+    """
+    return embed_texts(texts, task_type="retrieval_document")
+
+
+def cached_embeddings(texts: List[str]) -> List[Optional[List[float]]]:
+    """Document embeddings of texts already in the embedding cache, without any API call.
+
+    Texts that are not cached (or all of them, with the cache disabled) come back as None.
+    """
+    if not texts or not EMBEDDING_CACHE_ENABLED:
+        return [None] * len(texts)
+    model = _model_key()
+    keys = [cache_key(model, "retrieval_document", text) for text in texts]
+    found = embedding_cache.get_many(keys)
+    return [found[key].tolist() if key in found else None for key in keys]
 
 
 def generate_query_embedding(query: str) -> List[float]:
     """Generate an embedding for a search query."""
-    result = genai.embed_content(
-        model=EMBEDDING_MODEL,
-        content=query,
-        task_type="retrieval_query",
-    )
-    return result["embedding"]
+    return _embed_one(query, "retrieval_query")
+
+
+def generate_query_embeddings_batch(queries: List[str]) -> List[Optional[List[float]]]:
+    """Embed many search queries in batched calls (None where embedding failed)."""
+    return embed_texts(queries, task_type="retrieval_query")
+
+
+# Dedicated pool so slow embedding calls cannot starve the shared threadpool
+_executor = ThreadPoolExecutor(
+    max_workers=EMBEDDING_EXECUTOR_WORKERS, thread_name_prefix="embedding"
+)
+
+
+async def generate_query_embedding_async(query: str) -> List[float]:
+    """generate_query_embedding without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, generate_query_embedding, query)
+
+
+async def generate_query_embeddings_batch_async(queries: List[str]) -> List[Optional[List[float]]]:
+    """generate_query_embeddings_batch without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, generate_query_embeddings_batch, queries)
+
+
+async def generate_embeddings_batch_async(texts: List[str]) -> List[Optional[List[float]]]:
+    """generate_embeddings_batch without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, generate_embeddings_batch, texts)
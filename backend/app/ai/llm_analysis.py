@@ -1,7 +1,9 @@
+import asyncio
 import json
 import os
 import re
-from typing import List, Optional
+import time
+from typing import AsyncIterator, List, Optional, Tuple, Union
 
 import google.generativeai as genai
 
@@ -12,6 +14,26 @@ from app.models.incident import IncidentAnalysis
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
 MODEL_NAME = "gemini-2.5-flash"
+MAX_ATTEMPTS = 3
+
+# "gemini" or "fake" (canned local responses for development and load tests)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+FAKE_LLM_RESPONSE = json.dumps({
+    "summary": "Simulated analysis (fake LLM backend)",
+    "root_cause": "Not analyzed: LLM_BACKEND=fake",
+    "severity_level": "P3",
+    "recommended_owner": "Engineering On-Call",
+    "next_steps": "Configure GEMINI_API_KEY and unset LLM_BACKEND for real analysis",
+})
+
+FALLBACK_SUMMARY = "Analysis could not be completed due to API error"
+
+GENERATION_CONFIG = genai.GenerationConfig(
+    temperature=0.1,  # Low temperature for deterministic output
+    max_output_tokens=4096,
+    response_mime_type="application/json",
+)
 
 
 def extract_json_from_response(text: str) -> dict:
@@ -44,6 +66,75 @@ def extract_json_from_response(text: str) -> dict:
     raise ValueError(f"Could not extract valid JSON from response: {text[:200]}")
 
 
+def _to_analysis(response_text: str) -> IncidentAnalysis:
+    """Parse and validate an LLM response into an IncidentAnalysis."""
+    result_dict = extract_json_from_response(response_text)
+    return IncidentAnalysis(
+        summary=result_dict.get("summary", "Unable to generate summary"),
+        root_cause=result_dict.get("root_cause", "Unable to determine root cause"),
+        severity_level=result_dict.get("severity_level", "P3"),
+        recommended_owner=result_dict.get("recommended_owner", "Engineering On-Call"),
+        next_steps=result_dict.get("next_steps", "Investigate further"),
+    )
+
+
+def _fallback_analysis(last_error: Optional[Exception]) -> IncidentAnalysis:
+    """Response returned when all retries fail."""
+    print(f"All analysis attempts failed. Last error: {last_error}")
+    return IncidentAnalysis(
+        summary=FALLBACK_SUMMARY,
+        root_cause=f"LLM analysis failed: {str(last_error)}",
+        severity_level="P3",
+        recommended_owner="Engineering On-Call",
+        next_steps="Retry analysis or perform manual triage",
+    )
+
+
+def is_fallback(analysis: IncidentAnalysis) -> bool:
+    """True for the placeholder returned when every LLM attempt failed."""
+    return analysis.summary == FALLBACK_SUMMARY
+
+
+def _generate(prompt: str) -> str:
+    if LLM_BACKEND == "fake":
+        time.sleep(FAKE_LLM_LATENCY_MS / 1000)
+        return FAKE_LLM_RESPONSE
+    model = genai.GenerativeModel(MODEL_NAME)
+    return model.generate_content(prompt, generation_config=GENERATION_CONFIG).text
+
+
+async def _generate_async(prompt: str) -> str:
+    if LLM_BACKEND == "fake":
+        await asyncio.sleep(FAKE_LLM_LATENCY_MS / 1000)
+        return FAKE_LLM_RESPONSE
+    model = genai.GenerativeModel(MODEL_NAME)
+    response = await model.generate_content_async(prompt, generation_config=GENERATION_CONFIG)
+    return response.text
+
+
+async def _stream_async(prompt: str) -> AsyncIterator[str]:
+    """Yield response text fragments as the model produces them."""
+    if LLM_BACKEND == "fake":
+        pieces = re.findall(r".{1,16}", FAKE_LLM_RESPONSE, re.DOTALL)
+        for piece in pieces:
+            await asyncio.sleep(FAKE_LLM_LATENCY_MS / 1000 / len(pieces))
+            yield piece
+        return
+    model = genai.GenerativeModel(MODEL_NAME)
+    response = await model.generate_content_async(
+        prompt, generation_config=GENERATION_CONFIG, stream=True
+    )
+    async for chunk in response:
+        if chunk.text:
+            yield chunk.text
+
+
+async def _build_prompt_async(logs: List[str], similar_incidents: Optional[List[str]]) -> str:
+    """build_analysis_prompt off the event loop (compressing large incidents takes a while)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, build_analysis_prompt, logs, similar_incidents)
+
+
 def analyze_incident(
     logs: List[str],
     similar_incidents: Optional[List[str]] = None,
@@ -59,43 +150,77 @@ def analyze_incident(
     """
     prompt = build_analysis_prompt(logs, similar_incidents)
 
-    model = genai.GenerativeModel(MODEL_NAME)
-
     # Attempt analysis with retry
     last_error = None
-    for attempt in range(3):
+    for attempt in range(MAX_ATTEMPTS):
         try:
-            response = model.generate_content(
-                prompt,
-                generation_config=genai.GenerationConfig(
-                    temperature=0.1,  # Low temperature for deterministic output
-                    max_output_tokens=4096,
-                    response_mime_type="application/json",
-                ),
-            )
-
-            result_dict = extract_json_from_response(response.text)
-
-            # Validate and return
-            return IncidentAnalysis(
-                summary=result_dict.get("summary", "Unable to generate summary"),
-                root_cause=result_dict.get("root_cause", "Unable to determine root cause"),
-                severity_level=result_dict.get("severity_level", "P3"),
-                recommended_owner=result_dict.get("recommended_owner", "Engineering On-Call"),
-                next_steps=result_dict.get("next_steps", "Investigate further"),
-            )
-
+            return _to_analysis(_generate(prompt))
         except Exception as e:
             last_error = e
             print(f"Analysis attempt {attempt + 1} failed: {e}")
-            continue
 
     # Fallback response if all retries fail
-    print(f"All analysis attempts failed. Last error: {last_error}")
-    return IncidentAnalysis(
-        summary="Analysis could not be completed due to API error",
-        root_cause=f"LLM analysis failed: {str(last_error)}",
-        severity_level="P3",
-        recommended_owner="Engineering On-Call",
-        next_steps="Retry analysis or perform manual triage",
-    )
+    return _fallback_analysis(last_error)
+
+
+async def analyze_incident_async(
+    logs: List[str],
+    similar_incidents: Optional[List[str]] = None,
+) -> IncidentAnalysis:
+    """Non-blocking analyze_incident using the async Gemini client.
+
+    Cancelling the awaiting task (e.g. on a request timeout) cancels the
+    in-flight generation.
+    """
+    prompt = await _build_prompt_async(logs, similar_incidents)
+
+    last_error = None
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return _to_analysis(await _generate_async(prompt))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            last_error = e
+            print(f"Analysis attempt {attempt + 1} failed: {e}")
+
+    return _fallback_analysis(last_error)
+
+
+async def analyze_incident_stream(
+    logs: List[str],
+    similar_incidents: Optional[List[str]] = None,
+) -> AsyncIterator[Tuple[str, Union[str, IncidentAnalysis]]]:
+    """Stream an analysis: ("token", text) fragments, then ("analysis", result).
+
+    The first attempt is streamed. If it fails or its output does not parse,
+    the remaining attempts run without streaming, as in analyze_incident_async;
+    a ("retry", reason) event tells the client to discard the tokens so far.
+    """
+    prompt = await _build_prompt_async(logs, similar_incidents)
+
+    try:
+        parts = []
+        async for text in _stream_async(prompt):
+            parts.append(text)
+            yield "token", text
+        yield "analysis", _to_analysis("".join(parts))
+        return
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        last_error = e
+        print(f"Analysis attempt 1 failed: {e}")
+        yield "retry", str(e)
+
+    for attempt in range(1, MAX_ATTEMPTS):
+        try:
+            yield "analysis", _to_analysis(await _generate_async(prompt))
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            last_error = e
+            print(f"Analysis attempt {attempt + 1} failed: {e}")
+
+    yield "analysis", _fallback_analysis(last_error)
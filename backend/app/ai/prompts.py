@@ -1,4 +1,19 @@
-from typing import List, Optional
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.log_parser import parse_fields
+from app.utils.preprocessing import mask_variables
+
+# Token budget for the logs and similar-incident context of one prompt (the
+# fixed instructions come on top); tokens are estimated at ~4 chars each
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+# Most of the budget similar incidents may take; logs get whatever is left
+PROMPT_SIMILAR_SHARE = float(os.getenv("PROMPT_SIMILAR_SHARE", "0.25"))
+# Longer log lines and similar incidents are cut to this many characters
+PROMPT_MAX_LINE_CHARS = int(os.getenv("PROMPT_MAX_LINE_CHARS", "1000"))
+CHARS_PER_TOKEN = 4
 
 INCIDENT_ANALYSIS_PROMPT = """You are an incident analysis assistant for a trading/fintech platform (like Deriv).
 
@@ -32,19 +47,142 @@ Keep output deterministic and concise. Severity guidelines:
 """
 
 
+def estimate_tokens(text: str) -> int:
+    """Rough token count of `text` (no tokenizer call)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _clip(text: str) -> str:
+    return text if len(text) <= PROMPT_MAX_LINE_CHARS else text[:PROMPT_MAX_LINE_CHARS] + "..."
+
+
+def compress_logs(logs: List[str], budget: int) -> Tuple[List[str], int]:
+    """Fit log lines into about `budget` tokens.
+
+    Lines equal after masking timestamps, ids and numbers collapse into
+    their first occurrence prefixed with an "xN" count. Groups are kept by
+    level (highest first), then novelty (rarest first), then first
+    appearance, and printed in their original order. Returns (prompt
+    lines, number of groups dropped).
+    """
+    groups: Dict[str, List[int]] = {}  # masked line -> [first index, count]
+    for i, line in enumerate(logs):
+        key = mask_variables(" ".join(line.split()))
+        group = groups.get(key)
+        if group is None:
+            groups[key] = [i, 1]
+        else:
+            group[1] += 1
+
+    rendered = []
+    for first, count in groups.values():
+        text = _clip(logs[first])
+        line = f"- [x{count}] {text}" if count > 1 else f"- {text}"
+        rendered.append((first, count, parse_fields(logs[first])[1], line))
+    ranked = sorted(rendered, key=lambda group: (-group[2], group[1], group[0]))
+
+    kept, used = [], 0
+    for group in ranked:
+        cost = estimate_tokens(group[3]) + 1
+        if used + cost > budget and kept:
+            continue
+        kept.append(group)
+        used += cost
+    kept.sort()
+    return [group[3] for group in kept], len(rendered) - len(kept)
+
+
+def trim_similar(similar_incidents: List[str], budget: int) -> List[str]:
+    """Most relevant similar incidents (as ranked by retrieval) fitting `budget` tokens."""
+    kept, used = [], 0
+    for incident in similar_incidents:
+        line = f"- {_clip(incident)}"
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+class PromptMetrics:
+    """Estimated prompt tokens before and after compression."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.max_tokens_after = 0
+        self.lines_in = 0
+        self.lines_out = 0
+        self.similar_dropped = 0
+
+    def record(
+        self, tokens_before: int, tokens_after: int, lines_in: int, lines_out: int, similar_dropped: int
+    ) -> None:
+        with self._lock:
+            self.prompts += 1
+            self.tokens_before += tokens_before
+            self.tokens_after += tokens_after
+            self.max_tokens_after = max(self.max_tokens_after, tokens_after)
+            self.lines_in += lines_in
+            self.lines_out += lines_out
+            self.similar_dropped += similar_dropped
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            prompts = self.prompts or 1
+            return {
+                "prompts": self.prompts,
+                "avg_tokens_before": round(self.tokens_before / prompts, 1),
+                "avg_tokens_after": round(self.tokens_after / prompts, 1),
+                "max_tokens_after": self.max_tokens_after,
+                "compression_ratio": round(self.tokens_before / self.tokens_after, 2) if self.tokens_after else 1.0,
+                "log_lines_in": self.lines_in,
+                "log_lines_out": self.lines_out,
+                "similar_dropped": self.similar_dropped,
+            }
+
+
 def build_analysis_prompt(
     logs: List[str],
     similar_incidents: Optional[List[str]] = None,
+    token_budget: int = PROMPT_TOKEN_BUDGET,
 ) -> str:
-    """Build the full analysis prompt with logs and optional similar incidents."""
-    logs_text = "\n".join(f"- {log}" for log in logs)
+    """Build the analysis prompt, compressing logs and context to `token_budget`.
 
+    Similar incidents get at most PROMPT_SIMILAR_SHARE of the budget and the
+    logs the rest; dropped log lines are summarized in one trailing line.
+    """
+    similar_incidents = similar_incidents or []
+    similar_lines = trim_similar(similar_incidents, int(token_budget * PROMPT_SIMILAR_SHARE))
     similar_context = ""
-    if similar_incidents:
-        similar_text = "\n".join(f"- {inc}" for inc in similar_incidents)
+    if similar_lines:
+        similar_text = "\n".join(similar_lines)
         similar_context = f"\nHistorically similar incidents found:\n{similar_text}\n"
 
-    return INCIDENT_ANALYSIS_PROMPT.format(
+    log_lines, dropped = compress_logs(logs, token_budget - estimate_tokens(similar_context))
+    if dropped:
+        log_lines.append(f"- ({dropped} lower-priority distinct lines omitted)")
+    logs_text = "\n".join(log_lines)
+
+    prompt = INCIDENT_ANALYSIS_PROMPT.format(
         logs=logs_text,
         similar_context=similar_context,
     )
+    # Before: every line and incident inlined in full, as without compression
+    before = estimate_tokens(INCIDENT_ANALYSIS_PROMPT) + sum(
+        estimate_tokens(text) + 1 for text in logs + similar_incidents
+    )
+    prompt_metrics.record(
+        before,
+        estimate_tokens(prompt),
+        len(logs),
+        len(log_lines) - (1 if dropped else 0),
+        len(similar_incidents) - len(similar_lines),
+    )
+    return prompt
+
+
+prompt_metrics = PromptMetrics()
@@ -0,0 +1,155 @@
+import math
+import re
+import threading
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Tokens keep inner punctuation so error codes, hostnames and symbols stay whole
+# ("ERR-504", "db-01.prod", "BTC/USD"); their parts are indexed as well.
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+(?:[.:/-][a-z0-9_]+)*")
+PART_PATTERN = re.compile(r"[.:/-]")
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Reciprocal rank fusion constant (Cormack et al.); larger flattens rank differences
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased tokens of `text`, plus the parts of punctuated tokens."""
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    parts = [part for token in tokens if not token.isalnum() for part in PART_PATTERN.split(token)]
+    return tokens + [part for part in parts if part]
+
+
+class _Postings:
+    """Doc ids and term frequencies of one term: a frozen array plus an append tail."""
+
+    __slots__ = ("ids", "tfs", "tail_ids", "tail_tfs")
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int32)
+        self.tfs = np.empty(0, dtype=np.float32)
+        self.tail_ids: List[int] = []
+        self.tail_tfs: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.tail_ids)
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self.tail_ids:
+            self.ids = np.concatenate([self.ids, np.array(self.tail_ids, dtype=np.int32)])
+            self.tfs = np.concatenate([self.tfs, np.array(self.tail_tfs, dtype=np.float32)])
+            self.tail_ids, self.tail_tfs = [], []
+        return self.ids, self.tfs
+
+
+class LexicalIndex:
+    """In-memory BM25 inverted index over the texts of a VectorStore.
+
+    Document i is vector i, so results share ids with FAISS and the
+    attribute filters. Adds append to per-term tails that are folded into
+    numpy arrays on the next query touching the term, and document lengths
+    go into a growable array, keeping both adds and scoring cheap.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, _Postings] = {}
+        self._lengths = np.empty(0, dtype=np.float32)  # capacity may exceed _count
+        self._count = 0
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, texts: Iterable[str]) -> None:
+        """Index texts as the next document ids.
+
+        Texts are tokenized before taking the lock, so queries only wait
+        for the postings appends.
+        """
+        docs = []
+        for text in texts:
+            counts: Dict[str, int] = {}
+            tokens = tokenize(text)
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            docs.append((counts, len(tokens)))
+        with self._lock:
+            needed = self._count + len(docs)
+            if needed > len(self._lengths):
+                grown = np.empty(max(needed, 2 * len(self._lengths), 1024), dtype=np.float32)
+                grown[:self._count] = self._lengths[:self._count]
+                self._lengths = grown
+            doc_id = self._count
+            for counts, length in docs:
+                for token, count in counts.items():
+                    postings = self._postings.get(token)
+                    if postings is None:
+                        postings = self._postings[token] = _Postings()
+                    postings.tail_ids.append(doc_id)
+                    postings.tail_tfs.append(count)
+                self._lengths[doc_id] = length
+                self._total_length += length
+                doc_id += 1
+            self._count = needed
+
+    def search(
+        self, query: str, k: int, mask: Optional[np.ndarray] = None, count: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (doc ids, BM25 scores) for `query`, best first.
+
+        Only the first `count` documents are considered (default all) and,
+        with a mask over them, only those where it is True. Documents
+        sharing no term with the query are never returned.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n = self._count if count is None else min(count, self._count)
+            if not terms or not n:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            lengths = self._lengths[:n]
+            average = self._total_length / self._count or 1.0
+            scores = np.zeros(n, dtype=np.float32)
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                ids, tfs = postings.arrays()
+                if ids[-1] >= n:
+                    keep = ids < n
+                    ids, tfs = ids[keep], tfs[keep]
+                df = len(ids)
+                if not df:
+                    continue
+                idf = math.log(1 + (self._count - df + 0.5) / (df + 0.5))
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[ids] / average)
+                scores[ids] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+
+        if mask is not None:
+            scores[~mask[:n]] = 0
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        order = np.argsort(-scores[matched], kind="stable")
+        return matched[order], scores[matched[order]]
+
+    def stats(self) -> Dict[str, int]:
+        return {"documents": self._count, "terms": len(self._postings)}
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Hashable]], k: int, rrf_k: int = RRF_K
+) -> List[Tuple[Hashable, float]]:
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (rrf_k + rank).
+
+    Ids may be any hashable key, e.g. texts when merging across shards.
+
+    Returns the top k (id, fused score), best first.
+    """
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])[:k]
@@ -0,0 +1,203 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.log_parser import level_code, parse_fields, parse_timestamp
+from app.utils.storage import SQLiteStore, store
+
+# Per-row column layout of a segment blob, stored back to back:
+# timestamp (epoch seconds, NaN if unknown), level code, service id, trace id (-1 if none)
+COLUMN_DTYPES = (("ts", np.float64), ("level", np.int8), ("service", np.int32), ("trace", np.int32))
+TERM_KINDS = ("service", "trace")
+
+
+def encode_segment(columns: Dict[str, np.ndarray]) -> bytes:
+    return b"".join(np.ascontiguousarray(columns[name], dtype=dtype).tobytes() for name, dtype in COLUMN_DTYPES)
+
+
+def decode_segment(blob: bytes, count: int) -> Dict[str, np.ndarray]:
+    columns, offset = {}, 0
+    for name, dtype in COLUMN_DTYPES:
+        size = count * np.dtype(dtype).itemsize
+        columns[name] = np.frombuffer(blob, dtype=dtype, count=count, offset=offset)
+        offset += size
+    return columns
+
+
+class LogColumns:
+    """Structured fields of every stored log, kept as compact typed columns.
+
+    Each ingested batch is parsed once into timestamp / level / service /
+    trace-id columns (17 bytes per log; service and trace ids are
+    dictionary-encoded) and stored as one segment in the same transaction
+    as its messages. All segments are held in memory as numpy arrays so
+    level, service and time-window prefilters are vectorized scans.
+    """
+
+    def __init__(self, sqlite_store: SQLiteStore = store):
+        self.store = sqlite_store
+        self._lock = threading.Lock()
+        self._segments: List[Tuple[int, Dict[str, np.ndarray]]] = []
+        self._merged: Optional[Dict[str, np.ndarray]] = None
+        self._terms: Dict[str, List[str]] = {kind: [] for kind in TERM_KINDS}
+        self._term_ids: Dict[str, Dict[str, int]] = {kind: {} for kind in TERM_KINDS}
+
+    def _term_id(self, kind: str, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        ids = self._term_ids[kind]
+        term_id = ids.get(value)
+        if term_id is None:
+            term_id = ids[value] = len(self._terms[kind])
+            self._terms[kind].append(value)
+        return term_id
+
+    def _encode(self, logs: List[str]) -> Tuple[Dict[str, np.ndarray], List[Tuple[str, int, str]]]:
+        """Parse a batch into columns; returns (columns, dictionary terms it uses)."""
+        parsed = [parse_fields(log) for log in logs]
+        with self._lock:
+            services = np.array([self._term_id("service", p[2]) for p in parsed], dtype=np.int32)
+            traces = np.array([self._term_id("trace", p[3]) for p in parsed], dtype=np.int32)
+            terms = [
+                (kind, int(term_id), self._terms[kind][term_id])
+                for kind, ids in (("service", services), ("trace", traces))
+                for term_id in np.unique(ids[ids >= 0])
+            ]
+        columns = {
+            "ts": np.array([np.nan if p[0] is None else p[0] for p in parsed], dtype=np.float64),
+            "level": np.array([p[1] for p in parsed], dtype=np.int8),
+            "service": services,
+            "trace": traces,
+        }
+        return columns, terms
+
+    def _add(self, first_seq: int, columns: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            self._segments.append((first_seq, columns))
+            self._merged = None
+
+    def append_logs(self, logs: List[str]) -> Optional[int]:
+        """Store logs with their parsed columns; returns the first seq."""
+        if not logs:
+            return None
+        columns, terms = self._encode(logs)
+        first_seq = self.store.append_logs(logs, lambda _: (encode_segment(columns), terms))
+        self._add(first_seq, columns)
+        return first_seq
+
+    def load(self) -> None:
+        """Load stored segments and parse any logs stored without columns."""
+        with self._lock:
+            self._segments = []
+            self._merged = None
+            self._terms = {kind: [] for kind in TERM_KINDS}
+            self._term_ids = {kind: {} for kind in TERM_KINDS}
+            for kind, term_id, value in sorted(self.store.read_log_terms()):
+                terms = self._terms[kind]
+                terms.extend([None] * (term_id + 1 - len(terms)))
+                terms[term_id] = value
+                self._term_ids[kind][value] = term_id
+
+        segments = self.store.read_log_segments()
+        for first_seq, count, blob in segments:
+            self._add(first_seq, decode_segment(blob, count))
+
+        # Backfill logs outside any segment (stored before columns existed)
+        bounds = [(first_seq, first_seq + count) for first_seq, count, _ in segments]
+        gaps = zip([0] + [end for _, end in bounds], [start for start, _ in bounds] + [2 ** 62])
+        backfilled = 0
+        for gap_start, gap_end in gaps:
+            for rows in self.store.iter_logs_between(gap_start, gap_end):
+                for run in _contiguous_runs(rows):
+                    logs = [message for _, message in run]
+                    columns, terms = self._encode(logs)
+                    self.store.add_log_segment(run[0][0], len(run), encode_segment(columns), terms)
+                    self._add(run[0][0], columns)
+                    backfilled += len(run)
+        if backfilled:
+            print(f"Parsed structured fields for {backfilled} existing logs")
+
+    def _columns(self) -> Dict[str, np.ndarray]:
+        with self._lock:
+            if self._merged is None:
+                segments = sorted(self._segments, key=lambda s: s[0])
+                merged = {
+                    "seq": np.concatenate(
+                        [np.arange(first, first + len(c["ts"]), dtype=np.int64) for first, c in segments]
+                    ) if segments else np.empty(0, dtype=np.int64)
+                }
+                for name, dtype in COLUMN_DTYPES:
+                    merged[name] = (
+                        np.concatenate([c[name] for _, c in segments])
+                        if segments else np.empty(0, dtype=dtype)
+                    )
+                self._merged = merged
+            return self._merged
+
+    def select(
+        self,
+        min_level: Optional[str] = None,
+        service: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        trace_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> np.ndarray:
+        """Seqs of logs matching every given filter, ascending (the last `limit`).
+
+        since/until are ISO timestamps; logs without a timestamp never match a
+        time filter, and logs without a level never match min_level.
+        """
+        columns = self._columns()
+        mask = np.ones(len(columns["seq"]), dtype=bool)
+        if min_level:
+            code = level_code(min_level)
+            if not code:
+                raise ValueError(f"Unknown level: {min_level}")
+            mask &= columns["level"] >= code
+        for kind, value in (("service", service), ("trace", trace_id)):
+            if value is not None:
+                term_id = self._term_ids[kind].get(value)
+                if term_id is None:
+                    return np.empty(0, dtype=np.int64)
+                mask &= columns[kind] == term_id
+        for bound, compare in ((since, np.greater_equal), (until, np.less)):
+            if bound:
+                ts = parse_timestamp(bound)
+                if ts is None:
+                    raise ValueError(f"Invalid timestamp: {bound}")
+                with np.errstate(invalid="ignore"):
+                    mask &= compare(columns["ts"], ts)
+        seqs = columns["seq"][mask]
+        return seqs[-limit:] if limit else seqs
+
+    def services(self) -> List[str]:
+        """All service names seen so far."""
+        with self._lock:
+            return [s for s in self._terms["service"] if s is not None]
+
+    def stats(self) -> Dict[str, int]:
+        columns = self._columns()
+        return {
+            "logs": int(len(columns["seq"])),
+            "segments": len(self._segments),
+            "services": len(self._terms["service"]),
+            "trace_ids": len(self._terms["trace"]),
+            "bytes": int(sum(c.nbytes for name, c in columns.items() if name != "seq")),
+        }
+
+
+def _contiguous_runs(rows: List[Tuple[int, str]]) -> List[List[Tuple[int, str]]]:
+    """Split (seq, message) rows into runs of consecutive seqs."""
+    runs: List[List[Tuple[int, str]]] = []
+    for row in rows:
+        if runs and row[0] == runs[-1][-1][0] + 1:
+            runs[-1].append(row)
+        else:
+            runs.append([row])
+    return runs
+
+
+# Singleton instance
+log_columns = LogColumns()
@@ -0,0 +1,190 @@
+import mmap
+import os
+from typing import Iterator, List, Optional
+
+import faiss
+import numpy as np
+
+# Base vectors scanned per block by masked searches
+SCAN_BLOCK_BYTES = 64 << 20
+# Blocks with at least this fraction of matching rows are searched whole, not gathered
+GATHER_DENSITY = 0.25
+
+
+def is_flat(index) -> bool:
+    """True for exact L2 indexes whose raw vectors can be stored as a .npy file."""
+    return isinstance(index, (faiss.IndexFlat, MmapFlatIndex))
+
+
+class MmapFlatIndex:
+    """Exact L2 index over a read-only memory-mapped base plus an in-heap delta.
+
+    The base is a float32 `.npy` snapshot opened with mmap, so worker
+    processes share its pages through the OS page cache and opening it is
+    constant time. Vectors added after the snapshot go to a small
+    IndexFlatL2 and are merged into search results.
+    """
+
+    def __init__(self, base: np.ndarray):
+        self.d = base.shape[1]
+        self._base = base
+        self._delta = faiss.IndexFlatL2(self.d)
+
+    @classmethod
+    def open(cls, path: str) -> "MmapFlatIndex":
+        return cls(np.load(path, mmap_mode="r"))
+
+    @property
+    def base_total(self) -> int:
+        return self._base.shape[0]
+
+    @property
+    def ntotal(self) -> int:
+        return self.base_total + self._delta.ntotal
+
+    def add(self, vectors: np.ndarray) -> None:
+        self._delta.add(vectors)
+
+    def search(self, queries: np.ndarray, k: int, params=None):
+        """Brute-force search both segments and merge the top k."""
+        parts_d, parts_i = [], []
+        if self.base_total:
+            distances, indices = faiss.knn(queries, self._base, min(k, self.base_total))
+            parts_d.append(distances)
+            parts_i.append(indices)
+        if self._delta.ntotal:
+            distances, indices = self._delta.search(queries, min(k, self._delta.ntotal))
+            parts_d.append(distances)
+            parts_i.append(np.where(indices >= 0, indices + self.base_total, -1))
+
+        distances = np.hstack(parts_d)
+        indices = np.hstack(parts_i)
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return (
+            np.take_along_axis(distances, order, axis=1),
+            np.take_along_axis(indices, order, axis=1),
+        )
+
+    def search_masked(self, queries: np.ndarray, k: int, mask: np.ndarray):
+        """Exact search over the vectors where mask is True.
+
+        The base is processed in blocks. Dense blocks are searched whole for
+        enough extra neighbours to expect k matches among them; if every
+        query got k, those are exactly its k nearest matches. Sparse blocks
+        (and dense ones that came up short) gather just their matching rows.
+        Either way the cost stays close to one pass over the base.
+        """
+        parts_d, parts_i = [], []
+        rows = max(SCAN_BLOCK_BYTES // (4 * self.d), 1)
+        for start in range(0, self.base_total, rows):
+            block_mask = mask[start:min(start + rows, self.base_total)]
+            matches = np.flatnonzero(block_mask)
+            if not len(matches):
+                continue
+            block_k = min(k, len(matches))
+            density = len(matches) / len(block_mask)
+            if density >= GATHER_DENSITY:
+                fetch = min(len(block_mask), int(2 * block_k / density) + 8)
+                distances, indices = faiss.knn(queries, self._base[start:start + len(block_mask)], fetch)
+                keep = block_mask[indices]
+                if (keep.sum(axis=1) >= block_k).all():
+                    order = np.argsort(~keep, axis=1, kind="stable")[:, :block_k]
+                    parts_d.append(np.take_along_axis(distances, order, axis=1))
+                    parts_i.append(start + np.take_along_axis(indices, order, axis=1))
+                    continue
+            vectors = np.ascontiguousarray(self._base[start + matches], dtype=np.float32)
+            distances, indices = faiss.knn(queries, vectors, block_k)
+            parts_d.append(distances)
+            parts_i.append(start + matches[indices])
+
+        delta_mask = mask[self.base_total:self.ntotal]
+        if delta_mask.any():
+            bits = np.packbits(delta_mask, bitorder="little")
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBitmap(bits))
+            distances, indices = self._delta.search(
+                queries, min(k, int(delta_mask.sum())), params=params
+            )
+            parts_d.append(distances)
+            parts_i.append(np.where(indices >= 0, indices + self.base_total, -1))
+
+        if not parts_d:
+            return (
+                np.full((len(queries), k), np.inf, dtype=np.float32),
+                np.full((len(queries), k), -1, dtype=np.int64),
+            )
+        distances = np.hstack(parts_d)
+        indices = np.hstack(parts_i)
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return (
+            np.take_along_axis(distances, order, axis=1),
+            np.take_along_axis(indices, order, axis=1),
+        )
+
+    def reconstruct_n(self, start: int, count: int) -> np.ndarray:
+        """Copy vectors [start, start + count) out of both segments."""
+        end = start + count
+        parts = []
+        if start < self.base_total:
+            parts.append(np.asarray(self._base[start:min(end, self.base_total)]))
+        if end > self.base_total:
+            delta_start = max(start - self.base_total, 0)
+            parts.append(self._delta.reconstruct_n(delta_start, end - self.base_total - delta_start))
+        if not parts:
+            return np.empty((0, self.d), dtype=np.float32)
+        return np.vstack(parts).astype(np.float32, copy=False)
+
+    def segments(self) -> List[np.ndarray]:
+        """Vector chunks for writing a snapshot: the mmap base and a copy of the delta."""
+        delta = self._delta.reconstruct_n(0, self._delta.ntotal) if self._delta.ntotal else None
+        return [self._base] + ([delta] if delta is not None else [])
+
+
+class MmapMetadata:
+    """Read-only texts stored as a UTF-8 blob plus an int64 offsets table.
+
+    Text i is blob[offsets[i]:offsets[i + 1]]. Both files are mmapped;
+    texts appended after the snapshot live in an in-memory tail list.
+    Supports the list operations VectorStore uses (len, [i], extend, iter).
+    """
+
+    def __init__(self, blob_path: Optional[str] = None, offsets_path: Optional[str] = None):
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._blob = b""
+        self._file = None
+        if offsets_path:
+            self._offsets = np.load(offsets_path, mmap_mode="r")
+        if blob_path and os.path.getsize(blob_path) > 0:
+            self._file = open(blob_path, "rb")
+            self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._tail: List[str] = []
+
+    @property
+    def base_total(self) -> int:
+        return len(self._offsets) - 1
+
+    def __len__(self) -> int:
+        return self.base_total + len(self._tail)
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if i < self.base_total:
+            return self._blob[int(self._offsets[i]):int(self._offsets[i + 1])].decode("utf-8")
+        return self._tail[i - self.base_total]
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def append(self, text: str) -> None:
+        self._tail.append(text)
+
+    def extend(self, texts: List[str]) -> None:
+        self._tail.extend(texts)
+
+    def segments(self):
+        """(base blob, base offsets, copy of tail) for writing a snapshot.
+
+        The blob is the read-only mmap itself, so capturing is O(tail).
+        """
+        return self._blob, self._offsets, list(self._tail)
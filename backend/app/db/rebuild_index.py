@@ -0,0 +1,121 @@
+"""Rebuild the vector store at a new dimension, quantization or index type.
+
+Usage (from backend/):
+    python -m app.db.rebuild_index --dim 768 [--quantization fp16]
+                                   [--index-type flat] [--reembed]
+
+Without --reembed, stored vectors are truncated to their first `dim`
+components and re-normalized. That is valid for Gemini's Matryoshka
+embeddings and needs no API calls. --reembed embeds the stored texts again,
+which is required when the old vectors come from a different model or have
+fewer dimensions than requested.
+
+With VECTOR_SHARDING set, every shard is read and the rebuilt vectors are
+sharded the same way.
+
+The previous index files are moved to data/vectors_backup_<timestamp>/.
+"""
+import argparse
+import gc
+import os
+import shutil
+import time
+
+import faiss
+import numpy as np
+
+from app.ai import embeddings
+from app.db import vector_store as vs
+from app.db.sharded_store import ShardedVectorStore
+
+CHUNK = 10_000
+
+
+def read_vectors(store: vs.VectorStore) -> np.ndarray:
+    """Copy every stored vector out of the index."""
+    index = store.index
+    ivf = faiss.try_extract_index_ivf(index) if isinstance(index, faiss.Index) else None
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def open_store(index_type: str, dim: int, quantization: str):
+    """An unloaded store as configured by VECTOR_SHARDING, all shards in this process."""
+    if vs.SHARDING == "none":
+        return vs.VectorStore(index_type, dim, quantization)
+    return ShardedVectorStore(index_type, dim, quantization, processes=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--dim", type=int, default=vs.EMBEDDING_DIM)
+    parser.add_argument("--quantization", default=vs.QUANTIZATION, choices=["none", "fp16", "int8"])
+    parser.add_argument("--index-type", default=vs.INDEX_TYPE, choices=["flat", "hnsw", "ivfpq"])
+    parser.add_argument("--reembed", action="store_true", help="embed stored texts again")
+    args = parser.parse_args()
+
+    source = open_store(vs.INDEX_TYPE, vs.EMBEDDING_DIM, vs.QUANTIZATION)
+    source.load_index()
+    shards = source.stores() if isinstance(source, ShardedVectorStore) else [source]
+    texts, attributes, lives = [], [], []
+    for shard in shards:
+        shard_texts = list(shard.metadata)
+        shard_attributes = shard.attributes.rows(0, len(shard_texts))
+        # Deleted vectors are dropped rather than carried over as tombstones
+        live = shard.ids.live_mask(len(shard_texts))
+        live = np.ones(len(shard_texts), dtype=bool) if live is None else live
+        texts += [text for text, keep in zip(shard_texts, live) if keep]
+        attributes += [row for row, keep in zip(shard_attributes, live) if keep]
+        lives.append(live)
+    source_dim = shards[0].index.d
+    print(f"Read {len(texts)} texts at dimension {source_dim}")
+
+    if args.reembed:
+        embeddings.EMBEDDING_DIM = args.dim
+        results = embeddings.embed_texts(texts)
+        kept = [
+            (emb, text, attrs)
+            for emb, text, attrs in zip(results, texts, attributes)
+            if emb is not None
+        ]
+        if len(kept) < len(texts):
+            print(f"Warning: {len(texts) - len(kept)} texts failed to embed and were dropped")
+        vectors = np.array([emb for emb, _, _ in kept], dtype=np.float32).reshape(-1, args.dim)
+        texts = [text for _, text, _ in kept]
+        attributes = [attrs for _, _, attrs in kept]
+    else:
+        if args.dim > source_dim:
+            parser.error(f"cannot grow vectors from {source_dim} to {args.dim}; use --reembed")
+        vectors = embeddings.normalize_rows(
+            np.vstack([read_vectors(shard)[live][:, : args.dim] for shard, live in zip(shards, lives)])
+        )
+
+    # Release mmaps on the old files before moving them
+    del source, shards
+    gc.collect()
+
+    backup_dir = os.path.join(vs.DATA_DIR, f"vectors_backup_{time.strftime('%Y%m%d%H%M%S')}")
+    os.makedirs(backup_dir)
+    for path in (vs.VECTOR_DIR, vs.INDEX_PATH, vs.METADATA_PATH):
+        if os.path.exists(path):
+            shutil.move(path, os.path.join(backup_dir, os.path.basename(path)))
+    print(f"Moved previous index files to {backup_dir}")
+
+    target = open_store(args.index_type, args.dim, args.quantization)
+    for start in range(0, len(texts), CHUNK):
+        target.add_vectors(
+            vectors[start:start + CHUNK], texts[start:start + CHUNK], attributes[start:start + CHUNK]
+        )
+    target.save_index()
+
+    print(f"Rebuilt index with {target.get_total_vectors()} vectors.")
+    print(
+        "Set these in .env to match: "
+        f"EMBEDDING_DIM={args.dim} VECTOR_QUANTIZATION={args.quantization} "
+        f"VECTOR_INDEX_TYPE={args.index_type}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,570 @@
+import functools
+import heapq
+import itertools
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.db.lexical_index import reciprocal_rank_fusion
+from app.db.vector_attributes import AttributeRow
+from app.db.vector_store import (
+    EMBEDDING_DIM,
+    HYBRID_DEPTH,
+    INDEX_TYPE,
+    MAINTENANCE_INTERVAL_SECONDS,
+    QUANTIZATION,
+    RETENTION_DAYS,
+    RETENTION_MAX_VECTORS,
+    SHARDING,
+    VECTOR_DIR,
+    VectorStore,
+    serve_store,
+)
+from app.utils.latency import LatencyTracker
+
+# "hash": a fixed number of writable shards, each text routed by its hash
+SHARD_COUNT = int(os.getenv("VECTOR_SHARDS", "4"))
+# "time": vectors go to the newest shard, which is sealed (read-only, memory-mapped)
+# and replaced once it holds this many; a batch may take it slightly past the limit
+SHARD_MAX_VECTORS = int(os.getenv("VECTOR_SHARD_MAX_VECTORS", "1000000"))
+# Serve shards from local worker processes (sealed shards, or every hash shard)
+SHARD_PROCESSES = os.getenv("VECTOR_SHARD_PROCESSES", "0") == "1"
+SHARD_PROCESS_THREADS = int(os.getenv("VECTOR_SHARD_PROCESS_THREADS", "4"))
+# Threads fanning a search out to the shards, shared by all requests
+SEARCH_THREADS = int(os.getenv("VECTOR_SEARCH_THREADS", str(os.cpu_count() or 4)))
+# Vector ids are (shard << SHARD_ID_BITS) | id within the shard, so shard 0 keeps
+# the ids of an unsharded store
+SHARD_ID_BITS = 40
+SHARD_DIR = re.compile(r"^shard-(\d+)$")
+
+# VectorStore methods a worker process answers
+_REMOTE_METHODS = {
+    "add_vectors", "search_similar_batch", "search_lexical", "search_candidates_batch",
+    "list_vectors", "delete", "delete_upload", "apply_retention", "delete_oldest",
+    "compact", "maybe_compact", "save_index", "clear", "get_total_vectors",
+    "live_count", "stats", "lexical_stats",
+}
+
+
+class ShardedVectorStore:
+    """VectorStore partitioned into shards that are searched in parallel.
+
+    Each shard is a complete VectorStore (index, metadata, attributes, BM25,
+    WAL and snapshots) in its own directory; shard 0 is the unsharded
+    store's directory, so switching sharding on keeps existing vectors and
+    ids. A search runs on every shard through a thread pool (FAISS releases
+    the GIL) and the per-shard top k are merged. BM25 scores use per-shard
+    document frequencies, which is close enough for ranking when shards are
+    large. Shards may live in local worker processes, which also takes
+    Python-side work off this process's GIL.
+    """
+
+    def __init__(
+        self,
+        index_type: str = INDEX_TYPE,
+        dim: int = EMBEDDING_DIM,
+        quantization: str = QUANTIZATION,
+        directory: str = VECTOR_DIR,
+        sharding: str = SHARDING,
+        shard_count: int = SHARD_COUNT,
+        max_vectors: int = SHARD_MAX_VECTORS,
+        processes: bool = SHARD_PROCESSES,
+        search_threads: int = SEARCH_THREADS,
+    ):
+        if sharding not in ("time", "hash"):
+            raise ValueError(f"Unknown VECTOR_SHARDING: {sharding}")
+        self.index_type = index_type
+        self.dim = dim
+        self.quantization = quantization
+        self.directory = directory
+        self.sharding = sharding
+        self.shard_count = max(1, shard_count)
+        self.max_vectors = max_vectors
+        self.processes = processes
+        self._lock = threading.RLock()  # routing of time-mode adds, and changes to the shard set
+        self._in_flight: Dict[int, int] = {}  # vectors being added per time shard
+        self._active_vectors = 0  # vectors routed to the newest time shard, landed or not
+        self._adds_done = threading.Condition(self._lock)
+        self._maintain_lock = threading.Lock()  # maintenance passes vs. sealing
+        self._pool = ThreadPoolExecutor(max(1, search_threads), thread_name_prefix="vector-shard")
+        self._sealing: List[threading.Thread] = []
+        self._maintenance: Optional[threading.Thread] = None
+        self._stop_maintenance = threading.Event()
+        self.search_latency = LatencyTracker()
+        # Called with the texts of deleted vectors, from any shard
+        self.on_delete: Optional[Callable[[List[str]], None]] = None
+        # Fresh in-memory shards until load_index(), like an unloaded VectorStore
+        self._shards: Dict[int, object] = {n: self._local(n, False) for n in self._initial()}
+
+    # -- shard set -----------------------------------------------------------
+
+    def _initial(self) -> List[int]:
+        return list(range(self.shard_count)) if self.sharding == "hash" else [0]
+
+    def _shard_directory(self, number: int) -> str:
+        return self.directory if number == 0 else os.path.join(self.directory, f"shard-{number:04d}")
+
+    def _discover(self) -> List[int]:
+        numbers = {0}
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                match = SHARD_DIR.match(name)
+                if match:
+                    numbers.add(int(match.group(1)))
+        if self.sharding == "hash":
+            numbers.update(self._initial())
+        return sorted(numbers)
+
+    def _local(self, number: int, read_only: bool) -> VectorStore:
+        store = VectorStore(
+            self.index_type, self.dim, self.quantization, self._shard_directory(number), read_only
+        )
+        store.on_delete = self._deleted
+        return store
+
+    def _open(self, number: int, sealed: bool):
+        """Load shard `number`, in a worker process if configured."""
+        if self.processes and (sealed or self.sharding == "hash"):
+            shard = _ShardProcess(
+                self._shard_directory(number), self.index_type, self.dim, self.quantization, sealed
+            )
+            shard.on_delete = self._deleted
+            return shard
+        store = self._local(number, sealed)
+        store.load_index()
+        return store
+
+    def stores(self) -> List:
+        """The shards in order: VectorStores, or proxies for those in worker processes."""
+        return list(self._shards.values())
+
+    def _deleted(self, texts: List[str]) -> None:
+        if self.on_delete is not None:
+            self.on_delete(texts)
+
+    def _items(self) -> List[Tuple[int, object]]:
+        return list(self._shards.items())
+
+    def _fan_out(self, call: Callable, shards: Optional[List] = None) -> List:
+        """call(shard) on every shard in parallel, results in shard order."""
+        shards = list(self._shards.values()) if shards is None else shards
+        if len(shards) == 1:
+            return [call(shards[0])]
+        return list(self._pool.map(call, shards))
+
+    # -- writes --------------------------------------------------------------
+
+    def add_vectors(
+        self,
+        vectors: List[List[float]],
+        texts: List[str],
+        attributes: Optional[List[AttributeRow]] = None,
+    ) -> int:
+        """Add vectors to the newest shard (time) or to each text's shard (hash)."""
+        if len(vectors) == 0:
+            return 0
+        if len(texts) != len(vectors):
+            raise ValueError(f"Expected one text per vector, got {len(texts)} for {len(vectors)}")
+        if attributes is not None and len(attributes) != len(vectors):
+            raise ValueError("Expected one attribute row per vector")
+        if self.sharding == "hash":
+            return self._add_hashed(np.asarray(vectors, dtype=np.float32), texts, attributes)
+
+        # Only routing holds the lock; the shard add itself runs outside it
+        with self._lock:
+            number, shard = self._items()[-1]
+            self._in_flight[number] = self._in_flight.get(number, 0) + len(texts)
+            self._active_vectors += len(texts)
+            if self._active_vectors >= self.max_vectors:
+                # Created now so that a restart still finds the full shard sealed
+                os.makedirs(self._shard_directory(number + 1), exist_ok=True)
+                self._shards[number + 1] = self._open(number + 1, False)
+                self._active_vectors = 0
+                thread = threading.Thread(target=self._seal, args=(number, shard), daemon=True)
+                self._sealing.append(thread)
+                thread.start()
+        try:
+            return shard.add_vectors(vectors, texts, attributes)
+        finally:
+            with self._lock:
+                self._in_flight[number] -= len(texts)
+                if not self._in_flight[number]:
+                    del self._in_flight[number]
+                    self._adds_done.notify_all()
+
+    def _add_hashed(self, vectors: np.ndarray, texts: List[str], attributes) -> int:
+        routes = np.array([zlib.crc32(text.encode("utf-8")) % self.shard_count for text in texts])
+        shards = self._shards
+        batches = []
+        for number in np.unique(routes).tolist():
+            rows = np.flatnonzero(routes == number)
+            batches.append((
+                shards[number],
+                vectors[rows],
+                [texts[i] for i in rows],
+                None if attributes is None else [attributes[i] for i in rows],
+            ))
+        return sum(self._fan_out(lambda batch: batch[0].add_vectors(*batch[1:]), batches))
+
+    def _seal(self, number: int, shard: VectorStore) -> None:
+        """Seal a full time shard once its adds in flight land; with worker processes, hand it to one."""
+        with self._lock:
+            while number in self._in_flight:
+                self._adds_done.wait()
+        with self._maintain_lock:
+            shard.seal()
+            if not self.processes:
+                return
+            # Under the store lock no delete can land between the worker's load and the swap
+            with self._lock:
+                remote = self._open(number, True)
+                remote.get_total_vectors()  # wait until it serves
+                self._shards[number] = remote
+            print(f"Vector shard {number} sealed and moved to a worker process")
+
+    def _route(self, ids: Iterable[int]) -> Dict[int, List[int]]:
+        routed: Dict[int, List[int]] = {}
+        for vector_id in ids:
+            routed.setdefault(int(vector_id) >> SHARD_ID_BITS, []).append(
+                int(vector_id) & ((1 << SHARD_ID_BITS) - 1)
+            )
+        return routed
+
+    def delete(self, ids: Iterable[int]) -> int:
+        """Delete vectors by id. Returns how many were deleted (unknown ids are ignored)."""
+        with self._lock:
+            return sum(
+                self._shards[number].delete(local)
+                for number, local in self._route(ids).items()
+                if number in self._shards
+            )
+
+    def delete_upload(self, upload_id: str) -> int:
+        """Delete every vector indexed by the given ingestion job."""
+        with self._lock:
+            return sum(self._fan_out(lambda shard: shard.delete_upload(upload_id)))
+
+    def apply_retention(
+        self,
+        max_age_days: float = RETENTION_DAYS,
+        max_vectors: int = RETENTION_MAX_VECTORS,
+        now: Optional[float] = None,
+    ) -> int:
+        """Age and count retention across all shards (see VectorStore.apply_retention).
+
+        The count limit is global: time shards lose their oldest vectors
+        first, hash shards give up their share of the excess.
+        """
+        now = time.time() if now is None else now
+        deleted = 0
+        with self._lock:
+            if max_age_days > 0:
+                deleted += sum(self._fan_out(lambda shard: shard.apply_retention(max_age_days, 0, now)))
+            if max_vectors > 0:
+                items = self._items()
+                live = self._fan_out(lambda shard: shard.live_count(), [shard for _, shard in items])
+                total = sum(live)
+                excess = total - max_vectors
+                for (_, shard), count in zip(items, live):
+                    if excess <= 0:
+                        break
+                    if self.sharding == "time":
+                        take = min(excess, count)  # oldest shards first
+                    else:
+                        take = min(excess, -(-(total - max_vectors) * count // total))  # share, rounded up
+                    excess -= take
+                    deleted += shard.delete_oldest(take)
+        return deleted
+
+    # -- searches ------------------------------------------------------------
+
+    def _search(self, call: Callable) -> List:
+        started = time.perf_counter()
+        results = self._fan_out(call)
+        self.search_latency.record(time.perf_counter() - started)
+        return results
+
+    def search_similar(
+        self,
+        query_vector: List[float],
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        **filters,
+    ) -> List[Tuple[str, float]]:
+        """Search every shard for the k most similar vectors (see VectorStore.search_similar)."""
+        return self.search_similar_batch([query_vector], k, nprobe, ef_search, **filters)[0]
+
+    def search_similar_batch(
+        self,
+        query_vectors: List[List[float]],
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        **filters,
+    ) -> List[List[Tuple[str, float]]]:
+        """search_similar for many queries; each shard runs one multi-row search."""
+        if not len(query_vectors):
+            return []
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        per_shard = self._search(
+            lambda shard: shard.search_similar_batch(queries, k, nprobe, ef_search, **filters)
+        )
+        return _merge(per_shard, k, heapq.nsmallest)
+
+    def search_lexical(self, query_text: str, k: int = 5, **filters) -> List[Tuple[str, float]]:
+        """BM25 keyword search over every shard (see VectorStore.search_lexical)."""
+        per_shard = self._search(lambda shard: [shard.search_lexical(query_text, k, **filters)])
+        return _merge(per_shard, k, heapq.nlargest)[0]
+
+    def search_hybrid(
+        self,
+        query_vector: List[float],
+        query_text: str,
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        **filters,
+    ) -> List[Tuple[str, float]]:
+        """Dense and BM25 rankings merged across shards, then fused (see VectorStore.search_hybrid)."""
+        return self.search_hybrid_batch([query_vector], [query_text], k, nprobe, ef_search, **filters)[0]
+
+    def search_hybrid_batch(
+        self,
+        query_vectors: List[List[float]],
+        query_texts: List[str],
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        **filters,
+    ) -> List[List[Tuple[str, float]]]:
+        """search_hybrid for many queries, one call per shard."""
+        if not len(query_vectors):
+            return []
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        depth = max(HYBRID_DEPTH, k)
+        per_shard = self._search(
+            lambda shard: shard.search_candidates_batch(queries, query_texts, depth, nprobe, ef_search, **filters)
+        )
+        dense = _merge([dense for dense, _ in per_shard], depth, heapq.nsmallest)
+        keyword = _merge([keyword for _, keyword in per_shard], depth, heapq.nlargest)
+        return [
+            reciprocal_rank_fusion([[text for text, _ in d], [text for text, _ in w]], k)
+            for d, w in zip(dense, keyword)
+        ]
+
+    def list_vectors(self, limit: int = 100, **filters) -> List[Dict]:
+        """Most recently added live vectors matching the filters, newest first."""
+        items = self._items()
+        per_shard = self._fan_out(lambda shard: shard.list_vectors(limit, **filters), [s for _, s in items])
+        rows = []
+        for (number, _), shard_rows in zip(reversed(items), reversed(per_shard)):
+            for row in shard_rows:
+                row["id"] = (number << SHARD_ID_BITS) | row["id"]
+                rows.append(row)
+        if self.sharding == "hash":
+            # No insertion order across hash shards; log time is the next best thing
+            rows.sort(key=lambda row: row["timestamp"] or "", reverse=True)
+        return rows[:limit]
+
+    # -- persistence and maintenance -------------------------------------------
+
+    def load_index(self) -> None:
+        """Open every shard found on disk, in parallel (sealed ones read-only)."""
+        with self._lock:
+            self.close()
+            numbers = self._discover()
+            active = numbers[-1] if self.sharding == "time" else None
+            sealed = [self.sharding == "time" and number != active for number in numbers]
+            opened = list(self._pool.map(self._open, numbers, sealed))
+            self._shards = dict(zip(numbers, opened))
+            self._active_vectors = opened[-1].get_total_vectors()
+            print(f"Opened {len(numbers)} vector shards ({self.sharding}) with {self.get_total_vectors()} vectors")
+
+    def save_index(self) -> None:
+        """Snapshot every shard, after any seal in progress."""
+        for thread in list(self._sealing):
+            thread.join()
+        self._sealing = [thread for thread in self._sealing if thread.is_alive()]
+        self._fan_out(lambda shard: shard.save_index())
+
+    def compact(self) -> int:
+        """Compact every shard with deleted vectors, one at a time."""
+        return sum(shard.compact() for _, shard in self._items())
+
+    def maintain(self) -> None:
+        """Retention across shards, then compaction of those with enough deleted."""
+        with self._maintain_lock:
+            deleted = self.apply_retention()
+            if deleted:
+                print(f"Vector retention deleted {deleted} vectors")
+            for _, shard in self._items():
+                shard.maybe_compact()
+            if self.sharding == "time":
+                self._drop_empty()
+
+    def _drop_empty(self) -> None:
+        """Remove sealed time shards that compaction has emptied."""
+        with self._lock:
+            for number, shard in self._items()[:-1]:
+                if number and not shard.get_total_vectors():
+                    del self._shards[number]
+                    shard.save_index()  # let the compaction's snapshot finish first
+                    if isinstance(shard, _ShardProcess):
+                        shard.close()
+                    shutil.rmtree(self._shard_directory(number), ignore_errors=True)
+                    print(f"Removed empty vector shard {number}")
+
+    def start_maintenance(self, interval: float = MAINTENANCE_INTERVAL_SECONDS) -> None:
+        """Run maintain() every `interval` seconds on a background thread (0 disables it)."""
+        if interval <= 0 or (self._maintenance is not None and self._maintenance.is_alive()):
+            return
+        self._stop_maintenance.clear()
+
+        def run() -> None:
+            while not self._stop_maintenance.wait(interval):
+                try:
+                    self.maintain()
+                except Exception as e:
+                    print(f"Vector maintenance failed: {e}")
+
+        self._maintenance = threading.Thread(target=run, name="vector-maintenance", daemon=True)
+        self._maintenance.start()
+
+    def stop_maintenance(self) -> None:
+        """Stop the maintenance thread, waiting for a pass in progress."""
+        self._stop_maintenance.set()
+        if self._maintenance is not None:
+            self._maintenance.join()
+            self._maintenance = None
+
+    def get_total_vectors(self) -> int:
+        """Return the total number of vectors in all shards."""
+        return sum(shard.get_total_vectors() for _, shard in self._items())
+
+    def stats(self) -> Dict:
+        items = self._items()
+        shards = self._fan_out(lambda shard: shard.stats(), [shard for _, shard in items])
+        return {
+            "vectors": sum(s["vectors"] for s in shards),
+            "deleted": sum(s["deleted"] for s in shards),
+            "compactions": sum(s["compactions"] for s in shards),
+            "last_compaction_seconds": max(s["last_compaction_seconds"] for s in shards),
+            "sharding": self.sharding,
+            "search_latency": self.search_latency.stats(),
+            "shards": [
+                {"shard": number, "process": isinstance(shard, _ShardProcess), **s}
+                for (number, shard), s in zip(items, shards)
+            ],
+        }
+
+    def lexical_stats(self) -> Dict[str, int]:
+        """BM25 index sizes summed over shards (a term in several shards counts once per shard)."""
+        shards = self._fan_out(lambda shard: shard.lexical_stats())
+        return {key: sum(s[key] for s in shards) for key in ("documents", "terms")}
+
+    def clear(self) -> None:
+        """Delete every shard and start over with empty ones."""
+        for thread in list(self._sealing):
+            thread.join()
+        with self._lock:
+            for number, shard in self._items():
+                shard.clear()
+                if isinstance(shard, _ShardProcess):
+                    shard.close()
+                if number:
+                    shutil.rmtree(self._shard_directory(number), ignore_errors=True)
+            self._shards = {number: self._open(number, False) for number in self._initial()}
+            self._active_vectors = 0
+
+    def close(self) -> None:
+        """Stop the worker processes (after save_index)."""
+        for _, shard in self._items():
+            if isinstance(shard, _ShardProcess):
+                shard.close()
+
+
+def _merge(per_shard: List[List[List[Tuple[str, float]]]], k: int, select) -> List[List[Tuple[str, float]]]:
+    """Per query, the best k hits of all shards; select is heapq.nsmallest or nlargest."""
+    return [
+        select(k, itertools.chain.from_iterable(rows), key=itemgetter(1))
+        for rows in zip(*per_shard)
+    ]
+
+
+class _ShardProcess:
+    """A shard served by a local worker process, called like a VectorStore.
+
+    Requests carry ids and the worker answers each on a thread of its own,
+    so a long call such as a compaction does not hold up searches; a
+    reader thread hands the replies back to the waiting callers.
+    """
+
+    def __init__(self, directory: str, index_type: str, dim: int, quantization: str, read_only: bool):
+        context = multiprocessing.get_context("spawn")
+        self._conn, child = context.Pipe()
+        self._process = context.Process(
+            target=serve_store,
+            args=(child, directory, index_type, dim, quantization, read_only, SHARD_PROCESS_THREADS),
+            name=f"vector-{os.path.basename(directory)}",
+            daemon=True,
+        )
+        self._process.start()
+        child.close()
+        self.on_delete: Optional[Callable[[List[str]], None]] = None
+        self._send_lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._request_ids = itertools.count()
+        self._closed = False
+        self._reader = threading.Thread(target=self._read_replies, daemon=True)
+        self._reader.start()
+
+    def call(self, method: str, *args, **kwargs):
+        future: Future = Future()
+        with self._send_lock:
+            if self._closed:
+                raise RuntimeError("Vector shard worker is not running")
+            request_id = next(self._request_ids)
+            self._pending[request_id] = future
+            self._conn.send((request_id, method, args, kwargs))
+        return future.result()
+
+    def __getattr__(self, name: str):
+        if name not in _REMOTE_METHODS:
+            raise AttributeError(name)
+        return functools.partial(self.call, name)
+
+    def _read_replies(self) -> None:
+        while True:
+            try:
+                request_id, ok, value, deleted = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            if deleted and self.on_delete is not None:
+                self.on_delete(deleted)
+            future = self._pending.pop(request_id)
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        with self._send_lock:
+            self._closed = True
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("Vector shard worker exited"))
+
+    def close(self) -> None:
+        with self._send_lock:
+            if not self._closed:
+                self._conn.send(None)
+        self._process.join(timeout=30)
+        self._reader.join(timeout=5)
@@ -0,0 +1,122 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Per-vector attributes as given to add_vectors: (epoch seconds, level code, source, upload id)
+AttributeRow = Tuple[Optional[float], int, Optional[str], Optional[str]]
+
+# Column layout; source and upload ids are dictionary-encoded (-1 if unknown)
+ATTRIBUTE_DTYPE = np.dtype([("ts", "<f8"), ("level", "i1"), ("source", "<i4"), ("upload", "<i4")])
+TERM_KINDS = ("source", "upload")
+UNKNOWN_ROW: AttributeRow = (None, 0, None, None)
+
+
+class VectorAttributes:
+    """Typed metadata columns parallel to the vectors of a VectorStore.
+
+    Row i describes vector i. Rows live in one growable structured array
+    (17 bytes each), so filters are vectorized comparisons producing a
+    boolean mask that the store turns into a FAISS ID selector.
+    """
+
+    def __init__(self, rows: Optional[np.ndarray] = None, terms: Optional[Dict[str, List[str]]] = None):
+        self._lock = threading.Lock()
+        rows = np.empty(0, dtype=ATTRIBUTE_DTYPE) if rows is None else rows
+        self._rows = np.array(rows, dtype=ATTRIBUTE_DTYPE)  # capacity may exceed _count
+        self._count = len(rows)
+        self._terms: Dict[str, List[str]] = {kind: list((terms or {}).get(kind, [])) for kind in TERM_KINDS}
+        self._term_ids: Dict[str, Dict[str, int]] = {
+            kind: {value: i for i, value in enumerate(values)} for kind, values in self._terms.items()
+        }
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _term_id(self, kind: str, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        ids = self._term_ids[kind]
+        term_id = ids.get(value)
+        if term_id is None:
+            term_id = ids[value] = len(self._terms[kind])
+            self._terms[kind].append(value)
+        return term_id
+
+    def extend(self, rows: List[AttributeRow]) -> None:
+        """Append one row per added vector."""
+        with self._lock:
+            needed = self._count + len(rows)
+            if needed > len(self._rows):
+                grown = np.empty(max(needed, 2 * len(self._rows), 1024), dtype=ATTRIBUTE_DTYPE)
+                grown[:self._count] = self._rows[:self._count]
+                self._rows = grown
+            block = self._rows[self._count:needed]
+            block["ts"] = [np.nan if row[0] is None else row[0] for row in rows]
+            block["level"] = [row[1] for row in rows]
+            block["source"] = [self._term_id("source", row[2]) for row in rows]
+            block["upload"] = [self._term_id("upload", row[3]) for row in rows]
+            self._count = needed
+
+    def truncate(self, count: int) -> None:
+        """Drop the rows past `count`, undoing an add that failed."""
+        with self._lock:
+            self._count = min(self._count, count)
+
+    def extend_unknown(self, count: int) -> None:
+        """Append rows for vectors stored without attributes."""
+        self.extend([UNKNOWN_ROW] * count)
+
+    def rows(self, start: int = 0, end: Optional[int] = None) -> List[AttributeRow]:
+        """Decode rows [start, end) back to AttributeRow tuples."""
+        terms = self._terms
+        return [
+            (
+                None if np.isnan(ts) else float(ts),
+                int(level),
+                terms["source"][source] if source >= 0 else None,
+                terms["upload"][upload] if upload >= 0 else None,
+            )
+            for ts, level, source, upload in self._rows[start:self._count if end is None else end].tolist()
+        ]
+
+    def capture(self) -> Tuple[np.ndarray, Dict[str, List[str]]]:
+        """Copy of the rows and dictionaries, for writing a snapshot."""
+        with self._lock:
+            return self._rows[:self._count].copy(), {kind: list(v) for kind, v in self._terms.items()}
+
+    def mask(
+        self,
+        count: int,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        min_level: int = 0,
+        source: Optional[str] = None,
+        upload_id: Optional[str] = None,
+    ) -> Optional[np.ndarray]:
+        """Boolean mask over the first `count` vectors, or None without filters.
+
+        Vectors with an unknown timestamp or level never match a time or
+        level filter.
+        """
+        if since is None and until is None and not min_level and source is None and upload_id is None:
+            return None
+        rows = self._rows[:count]
+        mask = np.ones(count, dtype=bool)
+        for kind, value in (("source", source), ("upload", upload_id)):
+            if value is not None:
+                term_id = self._term_ids[kind].get(value)
+                if term_id is None:
+                    return np.zeros(count, dtype=bool)
+                mask &= rows[kind] == term_id
+        if min_level:
+            mask &= rows["level"] >= min_level
+        with np.errstate(invalid="ignore"):
+            if since is not None:
+                mask &= rows["ts"] >= since
+            if until is not None:
+                mask &= rows["ts"] < until
+        return mask
+
+    def nbytes(self) -> int:
+        return self._count * ATTRIBUTE_DTYPE.itemsize
@@ -0,0 +1,104 @@
+import threading
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+
+class VectorIds:
+    """Stable ids and tombstones of the vectors of a VectorStore, by position.
+
+    Vector ids are assigned in insertion order and never reused, so they
+    increase with position and survive compaction, which only renumbers
+    positions. Deleted vectors stay in the index as tombstones (excluded
+    from every search through the filter mask) until the store compacts.
+    """
+
+    def __init__(
+        self,
+        ids: Optional[np.ndarray] = None,
+        next_id: Optional[int] = None,
+        deleted: Optional[np.ndarray] = None,
+    ):
+        self._lock = threading.Lock()
+        ids = np.empty(0, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        self._count = len(ids)
+        self._ids = ids.copy()  # capacity may exceed _count
+        self._deleted = np.zeros(len(ids), dtype=bool)
+        if deleted is not None:
+            self._deleted[deleted] = True
+        self.deleted_count = int(self._deleted.sum())
+        self.next_id = int(next_id) if next_id is not None else (int(ids[-1]) + 1 if len(ids) else 0)
+
+    @classmethod
+    def sequential(cls, count: int) -> "VectorIds":
+        """Ids 0..count-1, for stores persisted before vectors had ids."""
+        return cls(np.arange(count, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def extend(self, count: int) -> np.ndarray:
+        """Assign ids to `count` vectors appended to the store; returns them."""
+        with self._lock:
+            needed = self._count + count
+            if needed > len(self._ids):
+                capacity = max(needed, 2 * len(self._ids), 1024)
+                self._ids = np.resize(self._ids, capacity)
+                deleted = np.zeros(capacity, dtype=bool)
+                deleted[:self._count] = self._deleted[:self._count]
+                self._deleted = deleted
+            new = np.arange(self.next_id, self.next_id + count, dtype=np.int64)
+            self._ids[self._count:needed] = new
+            self._deleted[self._count:needed] = False
+            self._count = needed
+            self.next_id += count
+            return new
+
+    def ids(self, positions: np.ndarray) -> np.ndarray:
+        return self._ids[positions]
+
+    def positions(self, ids: Iterable[int]) -> np.ndarray:
+        """Positions of the given ids; unknown ids are skipped."""
+        ids = np.unique(np.asarray(list(ids), dtype=np.int64))
+        stored = self._ids[:self._count]
+        found = np.searchsorted(stored, ids)
+        valid = found < len(stored)
+        found, ids = found[valid], ids[valid]
+        return found[stored[found] == ids]
+
+    def delete(self, positions: np.ndarray) -> np.ndarray:
+        """Tombstone the vectors at `positions`; returns the positions newly deleted."""
+        with self._lock:
+            positions = np.asarray(positions, dtype=np.int64)
+            positions = positions[~self._deleted[positions]]
+            self._deleted[positions] = True
+            self.deleted_count += len(positions)
+            return positions
+
+    def live_mask(self, count: int) -> Optional[np.ndarray]:
+        """Mask of the undeleted vectors among the first `count`, or None if none are deleted."""
+        if not self.deleted_count:
+            return None
+        return ~self._deleted[:count]
+
+    def capture(self, count: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, int]:
+        """(ids, deleted positions, next id) of the first `count` vectors (default all)."""
+        with self._lock:
+            count = self._count if count is None else count
+            return (
+                self._ids[:count].copy(),
+                np.flatnonzero(self._deleted[:count]),
+                self.next_id,
+            )
+
+    def compacted(self, kept: np.ndarray, captured: int) -> "VectorIds":
+        """Ids after dropping every position below `captured` not in `kept`.
+
+        Positions from `captured` on (added during compaction) are kept;
+        tombstones set meanwhile carry over.
+        """
+        with self._lock:
+            positions = np.concatenate([kept, np.arange(captured, self._count, dtype=np.int64)])
+            return VectorIds(
+                self._ids[positions], self.next_id, np.flatnonzero(self._deleted[positions])
+            )
@@ -1,116 +1,995 @@
-import json
 import os
-from typing import List, Optional, Tuple
+import signal
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 import faiss
 import numpy as np
 
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+from app.db.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from app.db.mmap_store import MmapFlatIndex, is_flat
+from app.db.persistence import VectorPersistence
+from app.db.vector_attributes import UNKNOWN_ROW, AttributeRow, VectorAttributes
+from app.db.vector_ids import VectorIds
+from app.utils.log_parser import LEVELS, level_code, parse_timestamp
+from app.utils.rwlock import ReadWriteLock
+
+DATA_DIR = os.getenv(
+    "TRIAGE_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+)
+VECTOR_DIR = os.path.join(DATA_DIR, "vectors")  # WAL + snapshot generations
+# Pre-WAL single-file index, loaded when no snapshot exists yet
 INDEX_PATH = os.path.join(DATA_DIR, "faiss_index.bin")
 METADATA_PATH = os.path.join(DATA_DIR, "faiss_metadata.json")
 
-EMBEDDING_DIM = 3072  # Gemini gemini-embedding-001 dimension
+# Take a background snapshot (and start a new WAL) after this many adds
+SNAPSHOT_INTERVAL = int(os.getenv("VECTOR_SNAPSHOT_INTERVAL", "10000"))
+# Memory-map flat vectors and metadata so workers share pages and start fast
+USE_MMAP = os.getenv("VECTOR_MMAP", "1") != "0"
+VERIFY_CHECKSUMS = os.getenv("VECTOR_VERIFY_CHECKSUMS", "0") == "1"
+# Split the store into shards searched in parallel: "none", "time" or "hash"
+# (see app/db/sharded_store.py for the shard settings)
+SHARDING = os.getenv("VECTOR_SHARDING", "none").lower()
+
+# Gemini gemini-embedding-001 natively returns 3072 dimensions; 1536, 768 and
+# 256 are supported truncations. Must match EMBEDDING_DIM in app/ai/embeddings.py.
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "3072"))
+# Scalar quantization of stored vectors: "none" (float32), "fp16" or "int8"
+QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+
+# Index type: "flat" (exact), "hnsw" (graph ANN) or "ivfpq" (compressed ANN)
+INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat").lower()
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "1024"))
+IVF_PQ_M = int(os.getenv("IVF_PQ_M", "64"))  # sub-quantizers; must divide the dimension
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+# IVF-PQ trains once this many vectors have been collected in a flat index
+IVF_TRAIN_THRESHOLD = max(int(os.getenv("IVF_TRAIN_THRESHOLD", "50000")), 39 * IVF_NLIST)
+# Filtered HNSW searches matching at most this many vectors scan the graph's
+# stored vectors exactly instead of walking the graph with an ID selector
+FILTER_EXACT_MAX = int(os.getenv("VECTOR_FILTER_EXACT_MAX", "20000"))
+# Candidates taken from each ranking before hybrid rank fusion
+HYBRID_DEPTH = int(os.getenv("VECTOR_HYBRID_DEPTH", "50"))
+
+# Retention, applied by the background maintenance thread: delete vectors whose
+# log timestamp is older than this many days / beyond the newest this many (0 = off)
+RETENTION_DAYS = float(os.getenv("VECTOR_RETENTION_DAYS", "0"))
+RETENTION_MAX_VECTORS = int(os.getenv("VECTOR_RETENTION_MAX_VECTORS", "0"))
+# Compact (rebuild without deleted vectors) once this fraction of the index is deleted
+COMPACT_RATIO = float(os.getenv("VECTOR_COMPACT_RATIO", "0.2"))
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("VECTOR_MAINTENANCE_INTERVAL_SECONDS", "300"))
+COMPACT_CHUNK = 65536  # vectors copied into the compacted index per add
+
+
+SCALAR_QUANTIZERS = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+
+def build_index(
+    index_type: str, dim: int = EMBEDDING_DIM, quantization: str = QUANTIZATION
+) -> faiss.Index:
+    """Create an empty index of the given type.
+
+    IVF-PQ needs training data, so it starts life as a flat index and is
+    migrated by VectorStore once IVF_TRAIN_THRESHOLD vectors exist. With
+    fp16/int8 quantization, flat and HNSW indexes store 2x/4x smaller
+    codes; int8 learns per-dimension ranges from the first batch added.
+    """
+    if quantization not in ("none", *SCALAR_QUANTIZERS):
+        raise ValueError(f"Unknown VECTOR_QUANTIZATION: {quantization}")
+    qtype = SCALAR_QUANTIZERS.get(quantization)
+
+    if index_type == "hnsw":
+        if qtype is None:
+            index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        else:
+            index = faiss.IndexHNSWSQ(dim, qtype, HNSW_M)
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+    if index_type == "flat" and qtype is not None:
+        return faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_L2)
+    if index_type in ("flat", "ivfpq"):
+        return faiss.IndexFlatL2(dim)
+    raise ValueError(f"Unknown VECTOR_INDEX_TYPE: {index_type}")
+
+
+def train_ivfpq(vectors: np.ndarray, nlist: int = IVF_NLIST, pq_m: int = IVF_PQ_M) -> faiss.Index:
+    """Train an IVF-PQ index on `vectors` and add them to it."""
+    dim = vectors.shape[1]
+    nlist = min(nlist, max(1, len(vectors) // 39))
+    quantizer = faiss.IndexFlatL2(dim)
+    index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, 8)
+    index.train(vectors)
+    index.add(vectors)
+    index.nprobe = IVF_NPROBE
+    return index
+
+
+def search_params(
+    index: faiss.Index,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    selector: Optional[faiss.IDSelector] = None,
+) -> Optional[faiss.SearchParameters]:
+    """Per-query search parameters (None keeps index defaults).
+
+    `selector` restricts results to the selected ids inside the index.
+    """
+    if not isinstance(index, faiss.Index):
+        return None
+    if isinstance(index, faiss.IndexHNSW) and (ef_search or selector is not None):
+        return faiss.SearchParametersHNSW(efSearch=ef_search or index.hnsw.efSearch, sel=selector)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and (nprobe or selector is not None):
+        return faiss.SearchParametersIVF(nprobe=nprobe or ivf.nprobe, sel=selector)
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+
+def filtered_search(
+    index,
+    queries: np.ndarray,
+    k: int,
+    mask: np.ndarray,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Search only the vectors where mask is True.
+
+    The mask goes to FAISS as a bitmap ID selector, so non-matching vectors
+    are skipped during the search instead of over-fetching and
+    post-filtering, and no vectors are copied out of the index. Selective
+    filters (at most FILTER_EXACT_MAX matches) on HNSW scan the graph's
+    flat storage exactly instead, since a graph walk can miss sparse matches.
+    """
+    if isinstance(index, MmapFlatIndex):
+        return index.search_masked(queries, k, mask)
+    selector = faiss.IDSelectorBitmap(np.packbits(mask, bitorder="little"))
+    if isinstance(index, faiss.IndexHNSW) and int(mask.sum()) <= FILTER_EXACT_MAX:
+        storage = faiss.downcast_index(index.storage)
+        return storage.search(queries, k, params=faiss.SearchParameters(sel=selector))
+    return index.search(queries, k, params=search_params(index, nprobe, ef_search, selector))
+
+
+def _gather(index, positions: np.ndarray) -> np.ndarray:
+    """Vectors at the given (sorted) positions of a flat or HNSW index."""
+    if isinstance(index, MmapFlatIndex):
+        parts = []
+        for start in range(0, index.ntotal, COMPACT_CHUNK):
+            local = positions[(positions >= start) & (positions < start + COMPACT_CHUNK)] - start
+            if len(local):
+                parts.append(index.reconstruct_n(start, min(COMPACT_CHUNK, index.ntotal - start))[local])
+        return np.vstack(parts) if parts else np.empty((0, index.d), dtype=np.float32)
+    return index.reconstruct_batch(positions)
+
+
+def _compact_ivf(index: faiss.Index, kept: np.ndarray, captured: int) -> faiss.Index:
+    """Copy of an IVF index holding only the `kept` positions below `captured`, renumbered.
+
+    Removes entries from the inverted lists and rewrites their ids in
+    place, so the PQ codes are kept as they are instead of re-encoded.
+    """
+    compacted = faiss.clone_index(index)
+    keep = np.zeros(captured, dtype=bool)
+    keep[kept] = True
+    # Ids past the bitmap (added after the capture) are not selected, so they go too
+    compacted.remove_ids(faiss.IDSelectorNot(faiss.IDSelectorBitmap(np.packbits(keep, bitorder="little"))))
+    ivf = faiss.extract_index_ivf(compacted)
+    invlists = ivf.invlists
+    for list_no in range(ivf.nlist):
+        size = invlists.list_size(list_no)
+        if size:
+            ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+            ids[:] = np.searchsorted(kept, ids)
+    return compacted
 
 
 class VectorStore:
-    """FAISS vector store manager for incident embeddings."""
+    """FAISS vector store manager for incident embeddings.
+
+    Searches never take the store lock. They read one published view
+    (index, metadata, attributes, ids, lexical, count) that writers replace
+    in a single assignment, and only look at its first `count` vectors;
+    the parallel structures are append-only, so appends past `count` are
+    invisible until the next publish. The index itself is guarded by a
+    readers-writer lock held just for the FAISS add, never for disk writes.
+
+    A read-only store (a sealed shard) refuses adds and serves its snapshot
+    memory-mapped, whatever the index type; deletes and compaction still work.
+    """
 
-    def __init__(self):
-        self.index: Optional[faiss.IndexFlatL2] = None
-        self.metadata: List[str] = []  # Parallel list of log texts
+    def __init__(
+        self,
+        index_type: str = INDEX_TYPE,
+        dim: int = EMBEDDING_DIM,
+        quantization: str = QUANTIZATION,
+        directory: str = VECTOR_DIR,
+        read_only: bool = False,
+    ):
+        self.index_type = index_type
+        self.dim = dim
+        self.quantization = quantization
+        self.read_only = read_only
+        self.index: Optional[faiss.Index] = None
+        self.metadata: List[str] = []  # Parallel log texts (list or MmapMetadata)
+        self.attributes = VectorAttributes()  # Parallel typed columns for filtering
+        self.lexical = LexicalIndex()  # BM25 over the same texts
+        self.ids = VectorIds()  # Stable ids and tombstones by position
+        self._lock = threading.RLock()
+        self._index_lock = ReadWriteLock()  # FAISS adds vs searches of the same index
+        self._compact_lock = threading.Lock()
+        self._version = 0  # bumped whenever positions change (clear, load, migrate, compact)
+        self._published: Tuple = ()  # what searches see (see _publish)
+        self._pending: List[Tuple] = []  # adds waiting for the next group commit
+        self._pending_lock = threading.Lock()
+        self.commits = 0
+        self.committed_batches = 0
+        self._training: Optional[threading.Thread] = None
+        self._maintenance: Optional[threading.Thread] = None
+        self._stop_maintenance = threading.Event()
+        self.compactions = 0
+        self.last_compaction_seconds = 0.0
+        # Called with the texts of deleted vectors (e.g. to re-index their templates later)
+        self.on_delete: Optional[Callable[[List[str]], None]] = None
+        # Only the top-level store picks up the pre-WAL single-file index
+        legacy = (INDEX_PATH, METADATA_PATH) if directory == VECTOR_DIR else ("", "")
+        self._persistence = VectorPersistence(
+            directory, *legacy, USE_MMAP, VERIFY_CHECKSUMS, read_only=read_only
+        )
+        self._unsnapshotted = 0
         self._initialize()
 
     def _initialize(self):
         """Initialize a fresh FAISS index."""
-        self.index = faiss.IndexFlatL2(EMBEDDING_DIM)
+        self.index = build_index(self.index_type, self.dim, self.quantization)
         self.metadata = []
+        self.attributes = VectorAttributes()
+        self.lexical = LexicalIndex()
+        self.ids = VectorIds()
+        self._version += 1
+        self._publish()
+
+    def _publish(self) -> None:
+        """Make the current state visible to searches in one atomic swap.
+
+        Caller must hold self._lock (or be the constructor).
+        """
+        self._published = (
+            self.index, self.metadata, self.attributes, self.ids, self.lexical, self.index.ntotal
+        )
 
-    def add_vectors(self, vectors: List[List[float]], texts: List[str]) -> int:
-        """Add vectors and their associated text metadata to the index.
+    def _maybe_start_training(self) -> None:
+        """Kick off background IVF-PQ training once enough vectors are collected."""
+        if (
+            self.index_type != "ivfpq"
+            or not is_flat(self.index)
+            or self.index.ntotal < IVF_TRAIN_THRESHOLD
+            or (self._training is not None and self._training.is_alive())
+        ):
+            return
+        self._training = threading.Thread(target=self._train_and_migrate, daemon=True)
+        self._training.start()
 
+    def _train_and_migrate(self) -> None:
+        """Train IVF-PQ on the flat vectors, then swap it in.
+
+        Searches keep hitting the flat index while training runs; vectors
+        added in the meantime are copied over before the swap. The training
+        is tied to the store version rather than the index object: a
+        snapshot rebase swaps the flat index for a memory-mapped one holding
+        the same positions, so the migration still applies after it.
+        """
+        with self._lock:
+            flat, version = self.index, self._version
+            trained_count = flat.ntotal
+        print(f"Training IVF-PQ index on {trained_count} vectors...")
+        try:
+            with self._index_lock.read():
+                vectors = flat.reconstruct_n(0, trained_count)
+            ivf = train_ivfpq(vectors)
+        except Exception as e:
+            print(f"IVF-PQ training failed: {e}. Staying on flat index.")
+            return
+
+        with self._lock:
+            if self._version != version:
+                print("IVF-PQ migration abandoned: the store was cleared, reloaded or compacted")
+                return
+            current = self.index
+            if current.ntotal > trained_count:
+                ivf.add(current.reconstruct_n(trained_count, current.ntotal - trained_count))
+            self.index = ivf
+            self._version += 1
+            self._publish()
+            self._unsnapshotted = SNAPSHOT_INTERVAL  # retried on next add if deferred
+            self._snapshot()
+        print(f"Migrated to IVF-PQ index with {ivf.ntotal} vectors")
+
+    def add_vectors(
+        self,
+        vectors: List[List[float]],
+        texts: List[str],
+        attributes: Optional[List[AttributeRow]] = None,
+    ) -> int:
+        """Add vectors with their text metadata and optional filter attributes.
+
+        attributes holds one (epoch seconds, level code, source, upload id)
+        row per vector; any field may be None (level 0) when unknown.
+        Concurrent calls are group-committed: whichever caller gets the
+        store lock applies every queued batch with one FAISS add, one
+        publish and one WAL fsync, and the others return once theirs is in.
         Returns the number of vectors added.
         """
-        if not vectors:
+        if len(vectors) == 0:
             return 0
+        if self.read_only:
+            raise RuntimeError("Vector store is read-only")
+        # Checked before queueing: a bad batch would misalign every batch committed with it
+        if len(texts) != len(vectors):
+            raise ValueError(f"Expected one text per vector, got {len(texts)} for {len(vectors)}")
+        if not all(isinstance(text, str) for text in texts):
+            raise ValueError("Vector texts must be strings")
+        if attributes is not None and len(attributes) != len(vectors):
+            raise ValueError("Expected one attribute row per vector")
 
         np_vectors = np.array(vectors, dtype=np.float32)
 
         # Ensure correct dimensions
-        if np_vectors.shape[1] != EMBEDDING_DIM:
+        if np_vectors.ndim != 2 or np_vectors.shape[1] != self.index.d:
             raise ValueError(
-                f"Expected embedding dimension {EMBEDDING_DIM}, got {np_vectors.shape[1]}"
+                f"Expected embedding dimension {self.index.d}, got {np_vectors.shape[-1]}. "
+                "Rebuild the index with `python -m app.db.rebuild_index`."
             )
 
-        self.index.add(np_vectors)
-        self.metadata.extend(texts)
+        done = Future()
+        with self._pending_lock:
+            self._pending.append((np_vectors, texts, attributes, done))
+        with self._lock:
+            if not done.done():
+                self._commit_pending()
+        done.result()
+        return len(vectors)
 
-        # Auto-save after adding
-        self.save_index()
+    def _commit_pending(self) -> None:
+        """Apply, publish and log all queued adds as one batch; caller must hold self._lock."""
+        with self._pending_lock:
+            batches, self._pending = self._pending, []
+        try:
+            if self.read_only:
+                raise RuntimeError("Vector store is read-only")
+            np_vectors = batches[0][0] if len(batches) == 1 else np.vstack([batch[0] for batch in batches])
+            texts = [text for batch in batches for text in batch[1]]
+            attributes = None
+            if any(batch[2] is not None for batch in batches):
+                attributes = [
+                    row for batch in batches
+                    for row in (batch[2] if batch[2] is not None else [UNKNOWN_ROW] * len(batch[1]))
+                ]
 
-        return len(vectors)
+            # Nothing past the published count is visible, so the parallel structures
+            # can grow in any order; the steps that can fail come first, and a
+            # failed index add drops the attribute rows again so all stay aligned
+            attribute_count = len(self.attributes)
+            if attributes is None:
+                self.attributes.extend_unknown(len(texts))
+            else:
+                self.attributes.extend(attributes)
+            try:
+                with self._index_lock.write():
+                    if not getattr(self.index, "is_trained", True):
+                        self.index.train(np_vectors)  # int8 ranges from the first batch
+                    self.index.add(np_vectors)
+            except Exception:
+                self.attributes.truncate(attribute_count)
+                raise
+            self.ids.extend(len(texts))
+            self.metadata.extend(texts)
+            self.lexical.add(texts)
+            self._publish()
+            self.commits += 1
+            self.committed_batches += len(batches)
+
+            # Durable O(batch) append; full snapshots only every SNAPSHOT_INTERVAL
+            self._persistence.append(np_vectors, texts, attributes)
+            self._unsnapshotted += len(texts)
+            if self._unsnapshotted >= SNAPSHOT_INTERVAL:
+                self._snapshot()
+            self._maybe_start_training()
+        except Exception as e:
+            for batch in batches:
+                batch[3].set_exception(e)
+            return
+        for batch in batches:
+            batch[3].set_result(len(batch[1]))
+
+    def _mask(
+        self,
+        view: Tuple,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        min_level: Optional[str] = None,
+        source: Optional[str] = None,
+        upload_id: Optional[str] = None,
+    ) -> Optional[np.ndarray]:
+        """Attribute filter mask over the view's vectors, minus deleted ones."""
+        _, _, attributes, ids, _, count = view
+        mask = attributes.mask(
+            count,
+            since=_epoch(since),
+            until=_epoch(until),
+            min_level=_level(min_level),
+            source=source,
+            upload_id=upload_id,
+        )
+        live = ids.live_mask(count)
+        if live is None:
+            return mask
+        return live if mask is None else mask & live
+
+    def _dense_search(
+        self,
+        view: Tuple,
+        query_vectors: List[List[float]],
+        k: int,
+        mask: Optional[np.ndarray],
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """Per query, (vector id, distance) of the k nearest vectors allowed by mask.
+
+        All queries go to FAISS as one multi-row search over the view's
+        vectors; if the index has grown past them since, a mask keeps the
+        newer ones out.
+        """
+        index, count = view[0], view[5]
+        query_np = np.array(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1)
+        if query_np.shape[1] != index.d:
+            raise ValueError(
+                f"Query dimension {query_np.shape[1]} does not match index dimension {index.d}"
+            )
+        with self._index_lock.read():
+            if mask is None and index.ntotal > count:
+                mask = np.ones(count, dtype=bool)
+            if mask is None:
+                distances, indices = index.search(
+                    query_np, min(k, count), params=search_params(index, nprobe, ef_search)
+                )
+            else:
+                matches = int(mask.sum())
+                if not matches:
+                    return [[] for _ in query_vectors]
+                distances, indices = filtered_search(
+                    index, query_np, min(k, matches), mask, nprobe, ef_search
+                )
+        return [
+            [(int(idx), float(dist)) for idx, dist in zip(row_i, row_d) if idx >= 0]
+            for row_i, row_d in zip(indices, distances)
+        ]
+
+    @staticmethod
+    def _texts(metadata, hits: List[Tuple[int, float]]) -> List[Tuple[str, float]]:
+        return [(metadata[idx], score) for idx, score in hits]
 
     def search_similar(
-        self, query_vector: List[float], k: int = 5
+        self,
+        query_vector: List[float],
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        min_level: Optional[str] = None,
+        source: Optional[str] = None,
+        upload_id: Optional[str] = None,
     ) -> List[Tuple[str, float]]:
-        """Search for k most similar vectors.
+        """Search for k most similar vectors, optionally filtered by attributes.
 
+        `nprobe` (IVF) and `ef_search` (HNSW) trade recall for speed per query.
+        since/until are ISO timestamps; min_level is a level name. Vectors
+        without a timestamp or level never match those filters.
         Returns list of (text, distance) tuples.
         """
-        if self.index.ntotal == 0:
+        filters = dict(since=since, until=until, min_level=min_level, source=source, upload_id=upload_id)
+        return self.search_similar_batch([query_vector], k, nprobe, ef_search, **filters)[0]
+
+    def search_similar_batch(
+        self,
+        query_vectors: List[List[float]],
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        **filters,
+    ) -> List[List[Tuple[str, float]]]:
+        """search_similar for many queries in one multi-row FAISS search."""
+        view = self._published
+        metadata, count = view[1], view[5]
+        if count == 0 or not len(query_vectors):
+            return [[] for _ in query_vectors]
+        mask = self._mask(view, **filters)
+        hits = self._dense_search(view, query_vectors, k, mask, nprobe, ef_search)
+        return [self._texts(metadata, row) for row in hits]
+
+    def search_lexical(self, query_text: str, k: int = 5, **filters) -> List[Tuple[str, float]]:
+        """BM25 keyword search over the stored texts; no embedding needed.
+
+        Accepts the same filters as search_similar. Returns (text, score)
+        tuples, best first; texts sharing no token with the query are skipped.
+        """
+        view = self._published
+        _, metadata, _, _, lexical, count = view
+        if count == 0:
             return []
+        mask = self._mask(view, **filters)
+        ids, scores = lexical.search(query_text, k, mask, count)
+        return self._texts(metadata, list(zip(ids.tolist(), scores.tolist())))
 
-        k = min(k, self.index.ntotal)
-        query_np = np.array([query_vector], dtype=np.float32)
+    def search_hybrid(
+        self,
+        query_vector: List[float],
+        query_text: str,
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        **filters,
+    ) -> List[Tuple[str, float]]:
+        """Fuse dense and BM25 rankings with reciprocal rank fusion.
 
-        distances, indices = self.index.search(query_np, k)
+        Each side contributes its top HYBRID_DEPTH candidates, so exact
+        tokens (error codes, hosts, symbols) surface even when the
+        embedding ranks them low. Accepts the same filters as
+        search_similar. Returns (text, fused score) tuples, best first.
+        """
+        return self.search_hybrid_batch([query_vector], [query_text], k, nprobe, ef_search, **filters)[0]
 
+    def search_hybrid_batch(
+        self,
+        query_vectors: List[List[float]],
+        query_texts: List[str],
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        **filters,
+    ) -> List[List[Tuple[str, float]]]:
+        """search_hybrid for many queries; the dense side is one multi-row search."""
+        view = self._published
+        _, metadata, _, _, lexical, count = view
+        if count == 0 or not len(query_vectors):
+            return [[] for _ in query_vectors]
+        mask = self._mask(view, **filters)
+        depth = max(HYBRID_DEPTH, k)
+        dense = self._dense_search(view, query_vectors, depth, mask, nprobe, ef_search)
         results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.metadata) and idx >= 0:
-                results.append((self.metadata[idx], float(distances[0][i])))
-
+        for dense_hits, query_text in zip(dense, query_texts):
+            lexical_ids, _ = lexical.search(query_text, depth, mask, count)
+            fused = reciprocal_rank_fusion([[idx for idx, _ in dense_hits], lexical_ids.tolist()], k)
+            results.append(self._texts(metadata, fused))
         return results
 
-    def save_index(self) -> None:
-        """Persist FAISS index and metadata to disk."""
-        os.makedirs(DATA_DIR, exist_ok=True)
+    def search_candidates_batch(
+        self,
+        query_vectors: List[List[float]],
+        query_texts: List[str],
+        depth: int,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        **filters,
+    ) -> Tuple[List[List[Tuple[str, float]]], List[List[Tuple[str, float]]]]:
+        """Per query, the top `depth` dense (text, distance) and BM25 (text, score) hits.
 
-        if self.index is not None and self.index.ntotal > 0:
-            faiss.write_index(self.index, INDEX_PATH)
+        These are the two rankings search_hybrid_batch fuses; a sharded store
+        merges them across shards before fusing.
+        """
+        view = self._published
+        _, metadata, _, _, lexical, count = view
+        if count == 0 or not len(query_vectors):
+            return [[] for _ in query_vectors], [[] for _ in query_vectors]
+        mask = self._mask(view, **filters)
+        dense = self._dense_search(view, query_vectors, depth, mask, nprobe, ef_search)
+        keyword = []
+        for query_text in query_texts:
+            ids, scores = lexical.search(query_text, depth, mask, count)
+            keyword.append(self._texts(metadata, list(zip(ids.tolist(), scores.tolist()))))
+        return [self._texts(metadata, row) for row in dense], keyword
 
-            with open(METADATA_PATH, "w", encoding="utf-8") as f:
-                json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+    def _snapshot(self) -> None:
+        """Start a background snapshot; caller must hold self._lock.
 
-    def load_index(self) -> None:
-        """Load FAISS index and metadata from disk."""
-        if os.path.exists(INDEX_PATH) and os.path.exists(METADATA_PATH):
-            try:
-                self.index = faiss.read_index(INDEX_PATH)
+        If a snapshot is already being written, this one is deferred to the
+        next add (the counter is left as is).
+        """
+        captured_index = self.index
+        if self._persistence.snapshot_async(
+            self.index,
+            self.metadata,
+            on_commit=lambda generation, count: self._rebase(captured_index, generation, count),
+            attributes=self.attributes,
+            ids=self.ids,
+        ):
+            self._unsnapshotted = 0
 
-                with open(METADATA_PATH, "r", encoding="utf-8") as f:
-                    self.metadata = json.load(f)
+    def _rebase(self, captured_index, generation: int, captured_count: int) -> None:
+        """Swap heap-resident flat state for the just-written mmap snapshot.
 
-                print(f"Loaded FAISS index with {self.index.ntotal} vectors")
+        Vectors added while the snapshot was written are carried over into
+        the new in-heap delta. A read-only store swaps in any index type
+        (mapped by faiss). Runs on the snapshot writer thread.
+        """
+        if not (self._persistence.use_mmap and (is_flat(captured_index) or self.read_only)):
+            return
+        state = self._persistence.open_snapshot(generation)
+        if state is None:
+            return
+        index, metadata = state
+        with self._lock:
+            if self.index is not captured_index:
+                return  # Cleared, reloaded or migrated meanwhile
+            extra = self.index.ntotal - captured_count
+            if extra:
+                index.add(self.index.reconstruct_n(captured_count, extra))
+                metadata.extend([self.metadata[i] for i in range(captured_count, len(self.metadata))])
+            self.index, self.metadata = index, metadata
+            self._publish()
+
+    def save_index(self) -> None:
+        """Write a full snapshot of the index and metadata and wait for it."""
+        self._persistence.wait()
+        with self._lock:
+            if self._unsnapshotted:
+                self._snapshot()
+        self._persistence.wait()
+
+    def load_index(self) -> None:
+        """Load the latest snapshot and replay the write-ahead log."""
+        with self._lock:
+            try:
+                self.index, self.metadata, self.attributes, self.ids = self._persistence.load(
+                    lambda: build_index(self.index_type, self.dim, self.quantization)
+                )
+                self._version += 1
             except Exception as e:
                 print(f"Error loading FAISS index: {e}. Starting fresh.")
                 self._initialize()
-        else:
-            print("No existing FAISS index found. Starting fresh.")
-            self._initialize()
+                return
+            self._unsnapshotted = self._persistence.replayed
+            # The BM25 index is derived from the texts, so it is rebuilt rather than stored
+            self.lexical = LexicalIndex()
+            self.lexical.add(self.metadata)
+            self._publish()
+            if self.index.d != self.dim:
+                print(
+                    f"Warning: stored index has dimension {self.index.d} but EMBEDDING_DIM "
+                    f"is {self.dim}. Run `python -m app.db.rebuild_index --dim {self.dim} "
+                    "--reembed` to migrate it."
+                )
+            if self.index.ntotal:
+                print(f"Loaded FAISS index with {self.index.ntotal} vectors")
+                self._maybe_start_training()
+            else:
+                print("No existing FAISS index found. Starting fresh.")
+
+    def seal(self) -> None:
+        """Make the store read-only and serve it from a fresh memory-mapped snapshot."""
+        self._persistence.wait()
+        # A due IVF-PQ migration happens now: a read-only store gets no adds to retry it
+        with self._lock:
+            self._maybe_start_training()
+        if self._training is not None:
+            self._training.join()
+        with self._lock:
+            self.read_only = True
+            self._persistence.read_only = True
+            self._unsnapshotted = max(self._unsnapshotted, 1)
+        self.save_index()
 
     def get_total_vectors(self) -> int:
-        """Return the total number of vectors in the index."""
-        return self.index.ntotal if self.index else 0
+        """Return the number of vectors visible to searches."""
+        return self._published[5]
+
+    def live_count(self) -> int:
+        """Number of vectors that are not deleted."""
+        return self.get_total_vectors() - self.ids.deleted_count
+
+    # -- deletion, retention and compaction ---------------------------------
+
+    def _delete_positions(self, positions: np.ndarray) -> int:
+        """Tombstone vectors by position and log it; caller must hold self._lock."""
+        deleted = self.ids.delete(positions)
+        if len(deleted):
+            self._persistence.append_deletes(self.ids.ids(deleted).tolist())
+            if self.on_delete is not None:
+                self.on_delete([self.metadata[int(i)] for i in deleted])
+        return len(deleted)
+
+    def list_vectors(self, limit: int = 100, **filters) -> List[Dict]:
+        """Most recently added live vectors matching the filters, newest first.
+
+        Accepts the same filters as search_similar.
+        """
+        view = self._published
+        _, metadata, attributes, ids, _, count = view
+        mask = self._mask(view, **filters)
+        positions = np.arange(count) if mask is None else np.flatnonzero(mask)
+        result = []
+        for position in positions[::-1][:limit].tolist():
+            timestamp, level, source, upload_id = attributes.rows(position, position + 1)[0]
+            result.append({
+                "id": int(ids.ids(position)),
+                "text": metadata[position],
+                "timestamp": (
+                    datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp is not None else None
+                ),
+                "level": LEVELS[level - 1] if level else None,
+                "source": source,
+                "upload_id": upload_id,
+            })
+        return result
+
+    def delete(self, ids: Iterable[int]) -> int:
+        """Delete vectors by id. Returns how many were deleted (unknown ids are ignored).
+
+        Deleted vectors stop matching searches immediately; their space is
+        reclaimed by the next compaction.
+        """
+        with self._lock:
+            return self._delete_positions(self.ids.positions(ids))
+
+    def delete_upload(self, upload_id: str) -> int:
+        """Delete every vector indexed by the given ingestion job."""
+        with self._lock:
+            mask = self.attributes.mask(self.index.ntotal, upload_id=upload_id)
+            return self._delete_positions(np.flatnonzero(mask))
+
+    def apply_retention(
+        self,
+        max_age_days: float = RETENTION_DAYS,
+        max_vectors: int = RETENTION_MAX_VECTORS,
+        now: Optional[float] = None,
+    ) -> int:
+        """Delete vectors older than max_age_days (by log timestamp) and all but the
+        newest max_vectors live ones; 0 disables either. Vectors without a
+        timestamp are never aged out. Returns how many were deleted.
+        """
+        now = time.time() if now is None else now
+        deleted = 0
+        with self._lock:
+            count = self.index.ntotal
+            if max_age_days > 0:
+                # Vectors at or after the cutoff match; everything else with a timestamp is old
+                recent = self.attributes.mask(count, since=now - max_age_days * 86400)
+                dated = self.attributes.mask(count, since=float("-inf"))
+                deleted += self._delete_positions(np.flatnonzero(dated & ~recent))
+            if max_vectors > 0:
+                deleted += self.delete_oldest(self.live_count() - max_vectors)
+        return deleted
+
+    def delete_oldest(self, count: int) -> int:
+        """Delete the `count` earliest added live vectors."""
+        if count <= 0:
+            return 0
+        with self._lock:
+            live = self.ids.live_mask(self.index.ntotal)
+            positions = np.flatnonzero(live) if live is not None else np.arange(self.index.ntotal)
+            return self._delete_positions(positions[:count])
+
+    def compact(self) -> int:
+        """Rebuild the index, metadata and BM25 index without deleted vectors.
+
+        The copy is built without holding the store lock, so searches and
+        adds keep going against the current state; vectors added (or
+        deleted) meanwhile are carried over, and the new state is swapped
+        in under the lock in one step. A snapshot of it is started right
+        away. Returns the number of vectors removed (0 if there were no
+        tombstones or the store was cleared, reloaded or migrated meanwhile).
+        """
+        with self._compact_lock:
+            started = time.perf_counter()
+            with self._lock:
+                index, metadata, version = self.index, self.metadata, self._version
+                captured = index.ntotal
+                ids, tombstones, _ = self.ids.capture(captured)
+                if not len(tombstones):
+                    return 0
+                rows, terms = self.attributes.capture()
+            kept = np.setdiff1d(np.arange(captured, dtype=np.int64), tombstones)
+
+            if isinstance(index, faiss.Index) and faiss.try_extract_index_ivf(index) is not None:
+                with self._index_lock.read():
+                    compacted = _compact_ivf(index, kept, captured)
+            else:
+                kind = "hnsw" if isinstance(index, faiss.IndexHNSW) else "flat"
+                compacted = build_index(kind, index.d, self.quantization)
+                for start in range(0, len(kept), COMPACT_CHUNK):
+                    with self._index_lock.read():
+                        chunk = _gather(index, kept[start:start + COMPACT_CHUNK])
+                    if not compacted.is_trained:
+                        compacted.train(chunk)
+                    compacted.add(chunk)
+            texts = [metadata[int(i)] for i in kept]
+            attributes = VectorAttributes(rows[:captured][kept], terms)
+            lexical = LexicalIndex()
+            lexical.add(texts)
+
+            with self._lock:
+                if self._version != version:
+                    print("Vector compaction abandoned: the store changed underneath it")
+                    return 0
+                extra = self.index.ntotal - captured
+                if extra:
+                    added = [self.metadata[i] for i in range(captured, captured + extra)]
+                    compacted.add(self.index.reconstruct_n(captured, extra))
+                    texts.extend(added)
+                    attributes.extend(self.attributes.rows(captured, captured + extra))
+                    lexical.add(added)
+                self.ids = self.ids.compacted(kept, captured)
+                self.index, self.metadata, self.attributes, self.lexical = compacted, texts, attributes, lexical
+                self._version += 1
+                self._publish()
+                self.compactions += 1
+                self._unsnapshotted = max(self._unsnapshotted, SNAPSHOT_INTERVAL)
+                self._snapshot()
+
+            self.last_compaction_seconds = time.perf_counter() - started
+            removed = len(tombstones)
+            print(
+                f"Compacted vector index: removed {removed} deleted vectors, "
+                f"{compacted.ntotal} remain ({self.last_compaction_seconds:.1f}s)"
+            )
+            return removed
+
+    def maintain(self) -> None:
+        """One maintenance pass: apply retention, then compact if enough is deleted."""
+        deleted = self.apply_retention()
+        if deleted:
+            print(f"Vector retention deleted {deleted} vectors")
+        self.maybe_compact()
+
+    def maybe_compact(self) -> int:
+        """Compact if at least COMPACT_RATIO of the index is deleted."""
+        total = self.get_total_vectors()
+        if total and self.ids.deleted_count >= max(1, COMPACT_RATIO * total):
+            return self.compact()
+        return 0
+
+    def start_maintenance(self, interval: float = MAINTENANCE_INTERVAL_SECONDS) -> None:
+        """Run maintain() every `interval` seconds on a background thread (0 disables it)."""
+        if interval <= 0 or (self._maintenance is not None and self._maintenance.is_alive()):
+            return
+        self._stop_maintenance.clear()
+
+        def run() -> None:
+            while not self._stop_maintenance.wait(interval):
+                try:
+                    self.maintain()
+                except Exception as e:
+                    print(f"Vector maintenance failed: {e}")
+
+        self._maintenance = threading.Thread(target=run, name="vector-maintenance", daemon=True)
+        self._maintenance.start()
+
+    def stop_maintenance(self) -> None:
+        """Stop the maintenance thread, waiting for a pass in progress."""
+        self._stop_maintenance.set()
+        if self._maintenance is not None:
+            self._maintenance.join()
+            self._maintenance = None
+
+    def stats(self) -> Dict:
+        return {
+            "vectors": self.get_total_vectors(),
+            "deleted": self.ids.deleted_count,
+            "next_id": self.ids.next_id,
+            "compactions": self.compactions,
+            "last_compaction_seconds": round(self.last_compaction_seconds, 3),
+            "read_only": self.read_only,
+            "commits": self.commits,
+            "batches_per_commit": round(self.committed_batches / self.commits, 2) if self.commits else 0.0,
+        }
+
+    def lexical_stats(self) -> Dict[str, int]:
+        return self.lexical.stats()
 
     def clear(self) -> None:
         """Clear the index and metadata."""
-        self._initialize()
-        # Remove persisted files
-        if os.path.exists(INDEX_PATH):
-            os.remove(INDEX_PATH)
-        if os.path.exists(METADATA_PATH):
-            os.remove(METADATA_PATH)
+        while True:
+            # Never wait for the snapshot writer under the lock: its rebase takes
+            # the lock. A commit may start another snapshot before we get it.
+            self._persistence.wait()
+            with self._lock:
+                if self._persistence.writing():
+                    continue
+                self._initialize()
+                # Remove persisted files
+                self._persistence.clear()
+                self._unsnapshotted = 0
+                return
+
+
+def _epoch(timestamp: Optional[str]) -> Optional[float]:
+    if timestamp is None:
+        return None
+    epoch = parse_timestamp(timestamp)
+    if epoch is None:
+        raise ValueError(f"Invalid timestamp: {timestamp}")
+    return epoch
+
+
+def _level(level: Optional[str]) -> int:
+    if not level:
+        return 0
+    code = level_code(level)
+    if not code:
+        raise ValueError(f"Unknown level: {level}")
+    return code
+
+
+def serve_store(
+    conn,
+    directory: str,
+    index_type: str,
+    dim: int,
+    quantization: str,
+    read_only: bool,
+    threads: int,
+) -> None:
+    """Worker process entry point: load a store and answer method calls sent over `conn`.
+
+    Requests are (request id, method, args, kwargs) and are answered on a
+    pool of `threads`, so a compaction does not hold up searches. Replies
+    are (request id, ok, result or exception, texts deleted meanwhile);
+    None stops the worker. See ShardedVectorStore.
+    """
+    # Ctrl-C reaches the whole process group; the parent decides when to stop us
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    store = VectorStore(index_type, dim, quantization, directory, read_only)
+    deleted: List[str] = []
+    deleted_lock = threading.Lock()
+
+    def collect(texts: List[str]) -> None:
+        with deleted_lock:
+            deleted.extend(texts)
+
+    store.on_delete = collect
+    store.load_index()
+    send_lock = threading.Lock()
+
+    def handle(request_id: int, method: str, args, kwargs) -> None:
+        try:
+            ok, value = True, getattr(store, method)(*args, **kwargs)
+        except Exception as e:
+            ok, value = False, e
+        with deleted_lock:
+            texts = deleted[:]
+            deleted.clear()
+        with send_lock:
+            try:
+                conn.send((request_id, ok, value, texts))
+            except Exception as e:  # unpicklable result or exception
+                conn.send((request_id, False, RuntimeError(repr(e if ok else value)), texts))
+
+    with ThreadPoolExecutor(threads) as pool:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                break
+            if request is None:
+                break
+            pool.submit(handle, *request)
+    store.save_index()
 
 
 # Singleton instance
-vector_store = VectorStore()
+if SHARDING == "none":
+    vector_store = VectorStore()
+else:
+    # Imported last: the sharded store is built from this module's VectorStore
+    from app.db.sharded_store import ShardedVectorStore  # noqa: E402
+
+    vector_store = ShardedVectorStore()
@@ -9,10 +9,18 @@ from fastapi.responses import FileResponse
 
 load_dotenv()
 
+from app.db.log_columns import log_columns  # noqa: E402
 from app.db.vector_store import vector_store  # noqa: E402
-from app.routes.upload import router as upload_router  # noqa: E402
+from app.utils.preprocessing import template_miner  # noqa: E402
+from app.utils.storage import read_templates  # noqa: E402
+from app.routes.upload import ingest_jobs, router as upload_router  # noqa: E402
 from app.routes.analysis import router as analysis_router  # noqa: E402
 from app.routes.results import router as results_router  # noqa: E402
+from app.routes.metrics import router as metrics_router  # noqa: E402
+from app.routes.jobs import router as jobs_router  # noqa: E402
+from app.routes.logs import router as logs_router  # noqa: E402
+from app.routes.clusters import router as clusters_router  # noqa: E402
+from app.routes.vectors import router as vectors_router  # noqa: E402
 
 # Path to frontend build
 FRONTEND_DIR = os.path.join(
@@ -24,10 +32,20 @@ FRONTEND_DIR = os.path.join(
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: load FAISS index if it exists
+    # Startup: load the latest FAISS snapshot and replay the write-ahead log
     vector_store.load_index()
+    # Restore mined log templates so repeated lines keep deduplicating
+    template_miner.load(read_templates())
+    # Load structured log columns, parsing any logs stored before they existed
+    log_columns.load()
+    # Start ingestion workers and resume jobs interrupted by the last shutdown
+    ingest_jobs.start()
+    # Background retention and compaction of the vector index
+    vector_store.start_maintenance()
     yield
-    # Shutdown: save FAISS index
+    # Shutdown: pause running jobs at their next batch, then save FAISS index
+    ingest_jobs.stop()
+    vector_store.stop_maintenance()
     vector_store.save_index()
 
 
@@ -51,6 +69,11 @@ app.add_middleware(
 app.include_router(upload_router)
 app.include_router(analysis_router)
 app.include_router(results_router)
+app.include_router(metrics_router)
+app.include_router(jobs_router)
+app.include_router(logs_router)
+app.include_router(clusters_router)
+app.include_router(vectors_router)
 
 
 @app.get("/api/health")
@@ -8,6 +8,8 @@ class LogEntry(BaseModel):
     """Represents a single log entry."""
     timestamp: Optional[str] = None
     level: Optional[str] = None
+    service: Optional[str] = None
+    trace_id: Optional[str] = None
     message: str
 
 
@@ -32,9 +34,52 @@ class AnalysisResult(BaseModel):
     similar_incidents: Optional[List[str]] = None
     analysis: IncidentAnalysis
     created_at: str = Field(default_factory=lambda: datetime.now().isoformat())
+    cache_hit: Optional[str] = Field(
+        None, description="'exact' or 'semantic' when served from the analysis cache"
+    )
+
+
+class SimilarFilter(BaseModel):
+    """Restricts which indexed incidents count as similar."""
+    since: Optional[str] = Field(None, description="ISO timestamp, inclusive")
+    until: Optional[str] = Field(None, description="ISO timestamp, exclusive")
+    level: Optional[str] = Field(None, description="Minimum level, e.g. ERROR")
+    source: Optional[str] = Field(None, description="Service the incident was logged by")
+    upload_id: Optional[str] = Field(None, description="Ingestion job that indexed it")
 
 
 class AnalyzeRequest(BaseModel):
     """Request body for incident analysis."""
     logs: Optional[List[str]] = Field(None, description="Log messages to analyze")
     query: Optional[str] = Field(None, description="Incident description or query")
+    # Prefilters for stored logs (used when neither logs nor query is given)
+    level: Optional[str] = Field(None, description="Minimum level, e.g. WARNING")
+    service: Optional[str] = Field(None, description="Only logs from this service")
+    since: Optional[str] = Field(None, description="ISO timestamp, inclusive")
+    until: Optional[str] = Field(None, description="ISO timestamp, exclusive")
+    similar: Optional[SimilarFilter] = Field(None, description="Filters for similar incidents")
+    retrieval: Optional[str] = Field(
+        None, description="'dense', 'hybrid' or 'lexical' (default: RETRIEVAL_MODE)"
+    )
+
+
+class VectorDeleteRequest(BaseModel):
+    """Request body for deleting indexed vectors."""
+    ids: Optional[List[int]] = Field(None, description="Vector ids to delete")
+    upload_id: Optional[str] = Field(None, description="Delete every vector of this ingestion job")
+
+
+class BatchIncident(BaseModel):
+    """One incident of a batch analysis request."""
+    id: Optional[str] = Field(None, description="Caller reference, echoed in the result line")
+    logs: Optional[List[str]] = Field(None, description="Log messages to analyze")
+    query: Optional[str] = Field(None, description="Incident description or query")
+
+
+class BatchAnalyzeRequest(BaseModel):
+    """Request body for batch incident analysis."""
+    incidents: List[BatchIncident] = Field(..., description="Incidents to analyze")
+    similar: Optional[SimilarFilter] = Field(None, description="Filters for similar incidents")
+    retrieval: Optional[str] = Field(
+        None, description="'dense', 'hybrid' or 'lexical' (default: RETRIEVAL_MODE)"
+    )
@@ -1,17 +1,153 @@
+import asyncio
+import json
+import os
+import time
 import uuid
 from datetime import datetime
-from typing import List
+from typing import AsyncIterator, Awaitable, Dict, List, Optional, Tuple, TypeVar
 
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
-from app.ai.embeddings import generate_query_embedding
-from app.ai.llm_analysis import analyze_incident
+from app.ai.analysis_cache import ANALYSIS_CACHE_ENABLED, analysis_cache, incident_fingerprint
+from app.ai.embeddings import generate_query_embedding_async, generate_query_embeddings_batch_async
+from app.ai.llm_analysis import (
+    MODEL_NAME,
+    analyze_incident_async,
+    analyze_incident_stream,
+    is_fallback,
+)
+from app.db.log_columns import log_columns
 from app.db.vector_store import vector_store
-from app.models.incident import AnalysisResult, AnalyzeRequest
-from app.utils.storage import read_logs, save_result
+from app.models.incident import (
+    AnalysisResult,
+    AnalyzeRequest,
+    BatchAnalyzeRequest,
+    IncidentAnalysis,
+    SimilarFilter,
+)
+from app.utils.latency import LatencyTracker
+from app.utils.log_parser import level_code, parse_timestamp
+from app.utils.singleflight import AsyncSingleFlight
+from app.utils.storage import read_logs, save_result, store
 
 router = APIRouter(tags=["Analysis"])
 
+T = TypeVar("T")
+
+# Upper bound on a whole analysis (retrieval + LLM); exceeded requests get a 504
+ANALYSIS_TIMEOUT_SECONDS = float(os.getenv("ANALYSIS_TIMEOUT_SECONDS", "60"))
+
+# Similar-incident retrieval: "dense" (embeddings), "hybrid" (dense + BM25 fused
+# by reciprocal rank) or "lexical" (BM25 only, no embedding call)
+RETRIEVAL_MODES = ("dense", "hybrid", "lexical")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+# Dense and hybrid retrieval fall back to lexical when the query embedding
+# fails or takes longer than this
+QUERY_EMBEDDING_TIMEOUT_SECONDS = float(os.getenv("QUERY_EMBEDDING_TIMEOUT_SECONDS", "5"))
+
+# Batch analysis: incidents per request, and LLM calls in flight per batch
+BATCH_MAX_INCIDENTS = int(os.getenv("BATCH_MAX_INCIDENTS", "1000"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "16"))
+
+# Concurrent requests for the same incident fingerprint share one analysis
+analysis_flight = AsyncSingleFlight()
+
+# Streaming latencies: first byte (retrieval event), first LLM token, complete result
+stream_first_byte = LatencyTracker()
+stream_first_token = LatencyTracker()
+stream_total = LatencyTracker()
+# Similar-incident search latency per retrieval mode actually used
+retrieval_latency = {mode: LatencyTracker() for mode in RETRIEVAL_MODES}
+retrieval_counters = {"lexical_fallbacks": 0}
+# Batch analysis: time from request to each result line, and request/incident counts
+batch_result_latency = LatencyTracker()
+batch_counters = {"requests": 0, "incidents": 0, "errors": 0}
+
+
+async def _resolve_logs(request: AnalyzeRequest) -> List[str]:
+    """Logs from the request, or the most recent (matching) stored logs."""
+    if request.logs:
+        return request.logs
+    if request.query:
+        return [request.query]
+    if request.level or request.service or request.since or request.until:
+        # Prefilter on the structured columns, then fetch only the matches
+        try:
+            seqs = await run_in_threadpool(
+                log_columns.select,
+                min_level=request.level,
+                service=request.service,
+                since=request.since,
+                until=request.until,
+                limit=20,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        matched = await run_in_threadpool(store.logs_by_seq, seqs.tolist())
+        if not matched:
+            raise HTTPException(status_code=400, detail="No stored logs match the filters.")
+        return matched
+    # Use the most recent stored logs
+    stored_logs = await run_in_threadpool(read_logs, 20)  # Last 20 logs
+    if not stored_logs:
+        raise HTTPException(
+            status_code=400,
+            detail="No logs provided and no stored logs found. Upload logs first.",
+        )
+    return stored_logs
+
+
+def _similar_filters(similar: Optional[SimilarFilter]) -> Dict[str, str]:
+    """search_similar keyword filters from the request (empty when unfiltered)."""
+    if similar is None:
+        return {}
+    filters = {
+        "since": similar.since,
+        "until": similar.until,
+        "min_level": similar.level,
+        "source": similar.source,
+        "upload_id": similar.upload_id,
+    }
+    filters = {name: value for name, value in filters.items() if value}
+    for name in ("since", "until"):
+        if name in filters and parse_timestamp(filters[name]) is None:
+            raise HTTPException(status_code=400, detail=f"Invalid timestamp: {filters[name]}")
+    if "min_level" in filters and not level_code(filters["min_level"]):
+        raise HTTPException(status_code=400, detail=f"Unknown level: {filters['min_level']}")
+    return filters
+
+
+def _retrieval_mode(retrieval: Optional[str]) -> str:
+    mode = (retrieval or RETRIEVAL_MODE).lower()
+    if mode not in RETRIEVAL_MODES:
+        raise HTTPException(
+            status_code=400, detail=f"retrieval must be one of {', '.join(RETRIEVAL_MODES)}"
+        )
+    return mode
+
+
+def _fingerprint(logs: List[str], filters: Dict[str, str], mode: str) -> bytes:
+    # Filters and retrieval mode pick the similar incidents the analysis saw
+    scope = json.dumps({"filters": filters, "retrieval": mode}, sort_keys=True)
+    return incident_fingerprint(MODEL_NAME, logs, scope)
+
+
+def _semantic(filters: Dict[str, str], mode: str) -> bool:
+    """Whether near-identical (semantic) cache hits apply to this retrieval.
+
+    Cached query embeddings carry no scope, so only unfiltered retrieval in
+    the default mode stores them or looks them up.
+    """
+    return (
+        ANALYSIS_CACHE_ENABLED
+        and analysis_cache.semantic_distance > 0
+        and not filters
+        and mode == RETRIEVAL_MODE
+        and mode != "lexical"
+    )
+
 
 @router.post("/analyze_incident")
 async def analyze(request: AnalyzeRequest):
@@ -19,45 +155,140 @@ async def analyze(request: AnalyzeRequest):
 
     Flow:
     1. Retrieve logs (from request or storage)
-    2. Find similar incidents using FAISS
+    2. Find similar incidents using FAISS (optionally filtered)
     3. Send context to Gemini LLM
     4. Return structured analysis
     """
-    # Determine logs to analyze
-    logs: List[str] = []
+    logs = await _resolve_logs(request)
+    filters = _similar_filters(request.similar)
+    mode = _retrieval_mode(request.retrieval)
 
-    if request.logs:
-        logs = request.logs
-    elif request.query:
-        logs = [request.query]
+    fingerprint = _fingerprint(logs, filters, mode)
+    try:
+        result, coalesced = await asyncio.wait_for(
+            analysis_flight.do(fingerprint, lambda: _run_analysis(logs, fingerprint, filters, mode)),
+            timeout=ANALYSIS_TIMEOUT_SECONDS,
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail=f"Analysis timed out after {ANALYSIS_TIMEOUT_SECONDS:g} seconds",
+        )
+
+    if coalesced:
+        result = _own_copy(result, logs)
+
+    # Persist result
+    await run_in_threadpool(save_result, result.model_dump())
+
+    return result
+
+
+def _own_copy(result: AnalysisResult, logs: List[str]) -> AnalysisResult:
+    """Copy of an analysis shared with an identical in-flight request, as this caller's own record."""
+    return result.model_copy(
+        update={"id": str(uuid.uuid4()), "logs": logs, "created_at": datetime.now().isoformat()}
+    )
+
+
+async def _embed_query(query_text: str) -> Optional[List[float]]:
+    """Query embedding, or None if it fails or exceeds QUERY_EMBEDDING_TIMEOUT_SECONDS."""
+    try:
+        return await asyncio.wait_for(
+            generate_query_embedding_async(query_text), QUERY_EMBEDDING_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        print(
+            f"Warning: query embedding took over {QUERY_EMBEDDING_TIMEOUT_SECONDS:g}s; "
+            "using lexical retrieval"
+        )
+    except Exception as e:
+        print(f"Warning: query embedding failed: {e}")
+    return None
+
+
+def _search(
+    mode: str, query_text: str, query_embedding: Optional[List[float]], filters: Dict[str, str]
+) -> List[Tuple[str, float]]:
+    """Run one similar-incident search in the given retrieval mode."""
+    started = time.perf_counter()
+    if mode == "lexical":
+        results = vector_store.search_lexical(query_text, 5, **filters)
+    elif mode == "hybrid":
+        results = vector_store.search_hybrid(query_embedding, query_text, 5, **filters)
     else:
-        # Use the most recent stored logs
-        stored_logs = read_logs()
-        if stored_logs:
-            logs = stored_logs[-20:]  # Last 20 logs
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail="No logs provided and no stored logs found. Upload logs first.",
-            )
+        results = vector_store.search_similar(query_embedding, 5, **filters)
+    retrieval_latency[mode].record(time.perf_counter() - started)
+    return results
 
-    # Find similar incidents using FAISS
+
+async def _retrieve(
+    logs: List[str], fingerprint: bytes, filters: Dict[str, str], mode: str = RETRIEVAL_MODE
+) -> Tuple[Optional[AnalysisResult], Optional[List[float]], List[str]]:
+    """Check the analysis cache and find similar incidents.
+
+    Returns (cached result or None, query embedding to cache the analysis
+    under, similar incidents). Identical log sets (after masking timestamps
+    and ids) are served from the analysis cache; with semantic hits enabled,
+    so are near-identical ones (only for unfiltered retrieval in the default,
+    non-lexical mode; the embedding is None otherwise). Dense and hybrid
+    retrieval degrade to lexical when no query embedding is available.
+    """
+    if ANALYSIS_CACHE_ENABLED:
+        cached = await run_in_threadpool(analysis_cache.get, fingerprint)
+        if cached is not None:
+            return _cached_result(logs, cached, "exact"), None, []
+
+    # Create a combined query from logs
+    query_text = " ".join(logs[:5])  # Use first 5 logs for query
+    query_embedding = None
+    semantic = _semantic(filters, mode)
+    if mode != "lexical" and (semantic or vector_store.get_total_vectors() > 0):
+        query_embedding = await _embed_query(query_text)
+
+    if semantic and query_embedding is not None:
+        cached = await run_in_threadpool(analysis_cache.get_similar, query_embedding)
+        if cached is not None:
+            return _cached_result(logs, cached, "semantic"), None, []
+    if ANALYSIS_CACHE_ENABLED:
+        analysis_cache.record_miss()
+
+    # Find similar incidents (FAISS and/or BM25)
     similar_incidents = []
     if vector_store.get_total_vectors() > 0:
+        if mode != "lexical" and query_embedding is None:
+            mode = "lexical"
+            retrieval_counters["lexical_fallbacks"] += 1
         try:
-            # Create a combined query from logs
-            query_text = " ".join(logs[:5])  # Use first 5 logs for query
-            query_embedding = generate_query_embedding(query_text)
-            similar_results = vector_store.search_similar(query_embedding, k=5)
+            similar_results = await run_in_threadpool(
+                _search, mode, query_text, query_embedding, filters
+            )
             similar_incidents = [text for text, _ in similar_results]
         except Exception as e:
-            print(f"Warning: FAISS search failed: {e}")
+            print(f"Warning: similar incident search failed: {e}")
+
+    return None, query_embedding if semantic else None, similar_incidents
+
 
-    # Analyze with LLM
-    analysis = analyze_incident(logs, similar_incidents if similar_incidents else None)
+async def _finish(
+    logs: List[str],
+    fingerprint: bytes,
+    analysis: IncidentAnalysis,
+    similar_incidents: List[str],
+    query_embedding: Optional[List[float]],
+) -> AnalysisResult:
+    """Cache a fresh analysis and wrap it in an AnalysisResult."""
+    if ANALYSIS_CACHE_ENABLED and not is_fallback(analysis):
+        await run_in_threadpool(
+            analysis_cache.put,
+            fingerprint,
+            analysis.model_dump(),
+            similar_incidents or None,
+            query_embedding,
+        )
 
     # Build result
-    result = AnalysisResult(
+    return AnalysisResult(
         id=str(uuid.uuid4()),
         logs=logs,
         similar_incidents=similar_incidents if similar_incidents else None,
@@ -65,7 +296,282 @@ async def analyze(request: AnalyzeRequest):
         created_at=datetime.now().isoformat(),
     )
 
-    # Persist result
-    save_result(result.model_dump())
 
-    return result
+async def _run_analysis(
+    logs: List[str], fingerprint: bytes, filters: Dict[str, str], mode: str
+) -> AnalysisResult:
+    """Retrieve similar incidents and analyze with the LLM without blocking the event loop."""
+    cached, query_embedding, similar_incidents = await _retrieve(logs, fingerprint, filters, mode)
+    if cached is not None:
+        return cached
+    return await _analyze(logs, fingerprint, similar_incidents, query_embedding)
+
+
+async def _analyze(
+    logs: List[str],
+    fingerprint: bytes,
+    similar_incidents: List[str],
+    query_embedding: Optional[List[float]],
+) -> AnalysisResult:
+    """Analyze with the LLM once retrieval is done."""
+    analysis = await analyze_incident_async(logs, similar_incidents if similar_incidents else None)
+    return await _finish(logs, fingerprint, analysis, similar_incidents, query_embedding)
+
+
+def _cached_result(logs: List[str], cached, provenance: str) -> AnalysisResult:
+    analysis, similar_incidents, _ = cached
+    return AnalysisResult(
+        id=str(uuid.uuid4()),
+        logs=logs,
+        similar_incidents=similar_incidents,
+        analysis=IncidentAnalysis(**analysis),
+        created_at=datetime.now().isoformat(),
+        cache_hit=provenance,
+    )
+
+
+async def _until(deadline: float, awaitable: Awaitable[T]) -> T:
+    """Await `awaitable`, raising TimeoutError once the loop clock reaches `deadline`."""
+    async with asyncio.timeout_at(deadline):
+        return await awaitable
+
+
+def _sse(event: str, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+@router.post("/analyze_incident/stream")
+async def analyze_stream(request: AnalyzeRequest):
+    """Analyze an incident, streaming progress as Server-Sent Events.
+
+    Events, in order:
+    - similar: {"similar_incidents": [...]} as soon as retrieval finishes
+    - token: {"text": "..."} LLM output fragments as they arrive
+    - retry: {"reason": "..."} the streamed attempt failed; discard its tokens
+    - result: the validated AnalysisResult (also persisted)
+    - error: {"detail": "..."} on timeout
+    Cached analyses skip straight from similar to result.
+    """
+    logs = await _resolve_logs(request)
+    filters = _similar_filters(request.similar)
+    mode = _retrieval_mode(request.retrieval)
+    fingerprint = _fingerprint(logs, filters, mode)
+    started = time.perf_counter()
+
+    async def events() -> AsyncIterator[bytes]:
+        # The deadline covers retrieval and the LLM, not the yields: a slow
+        # client's backpressure must not count against the analysis
+        deadline = asyncio.get_running_loop().time() + ANALYSIS_TIMEOUT_SECONDS
+        try:
+            cached, query_embedding, similar_incidents = await _until(
+                deadline, _retrieve(logs, fingerprint, filters, mode)
+            )
+            if cached is not None:
+                similar_incidents = cached.similar_incidents or []
+            stream_first_byte.record(time.perf_counter() - started)
+            yield _sse("similar", {"similar_incidents": similar_incidents})
+
+            result = cached
+            if result is None:
+                first_token = True
+                stream = analyze_incident_stream(logs, similar_incidents or None)
+                try:
+                    while True:
+                        try:
+                            kind, value = await _until(deadline, anext(stream))
+                        except StopAsyncIteration:
+                            break
+                        if kind == "token":
+                            if first_token:
+                                stream_first_token.record(time.perf_counter() - started)
+                                first_token = False
+                            yield _sse("token", {"text": value})
+                        elif kind == "retry":
+                            yield _sse("retry", {"reason": value})
+                        else:
+                            result = await _until(
+                                deadline,
+                                _finish(logs, fingerprint, value, similar_incidents, query_embedding),
+                            )
+                finally:
+                    await stream.aclose()
+
+            await run_in_threadpool(save_result, result.model_dump())
+            stream_total.record(time.perf_counter() - started)
+            yield _sse("result", result.model_dump())
+        except TimeoutError:
+            yield _sse(
+                "error", {"detail": f"Analysis timed out after {ANALYSIS_TIMEOUT_SECONDS:g} seconds"}
+            )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _embed_queries(query_texts: List[str]) -> List[Optional[List[float]]]:
+    """Query embeddings in one batched call; all None on failure or timeout."""
+    try:
+        return await asyncio.wait_for(
+            generate_query_embeddings_batch_async(query_texts), QUERY_EMBEDDING_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        print(
+            f"Warning: batch query embedding took over {QUERY_EMBEDDING_TIMEOUT_SECONDS:g}s; "
+            "using lexical retrieval"
+        )
+    except Exception as e:
+        print(f"Warning: batch query embedding failed: {e}")
+    return [None] * len(query_texts)
+
+
+def _search_batch(
+    mode: str,
+    query_texts: Dict[int, str],
+    query_embeddings: Dict[int, List[float]],
+    filters: Dict[str, str],
+) -> Dict[int, List[str]]:
+    """Similar incidents for many queries: one multi-row dense search, BM25 for the rest."""
+    dense = [i for i in query_texts if mode != "lexical" and i in query_embeddings]
+    results: Dict[int, List[Tuple[str, float]]] = {}
+    if dense:
+        vectors = [query_embeddings[i] for i in dense]
+        if mode == "hybrid":
+            found = vector_store.search_hybrid_batch(vectors, [query_texts[i] for i in dense], 5, **filters)
+        else:
+            found = vector_store.search_similar_batch(vectors, 5, **filters)
+        results.update(zip(dense, found))
+    for i, query_text in query_texts.items():
+        if i not in results:
+            results[i] = vector_store.search_lexical(query_text, 5, **filters)
+    return {i: [text for text, _ in hits] for i, hits in results.items()}
+
+
+async def _retrieve_batch(
+    incidents: List[List[str]], fingerprints: List[bytes], filters: Dict[str, str], mode: str
+) -> List[Tuple[Optional[AnalysisResult], Optional[List[float]], List[str]]]:
+    """_retrieve for a whole batch, with one embedding call and one index search."""
+    cached: List[Optional[AnalysisResult]] = [None] * len(incidents)
+    if ANALYSIS_CACHE_ENABLED:
+        entries = await run_in_threadpool(lambda: [analysis_cache.get(fp) for fp in fingerprints])
+        for i, entry in enumerate(entries):
+            if entry is not None:
+                cached[i] = _cached_result(incidents[i], entry, "exact")
+
+    query_texts = {i: " ".join(logs[:5]) for i, logs in enumerate(incidents) if cached[i] is None}
+    query_embeddings: Dict[int, List[float]] = {}
+    semantic = _semantic(filters, mode)
+    if query_texts and mode != "lexical" and (semantic or vector_store.get_total_vectors() > 0):
+        vectors = await _embed_queries(list(query_texts.values()))
+        query_embeddings = {i: v for i, v in zip(query_texts, vectors) if v is not None}
+
+    if semantic and query_embeddings:
+        hits = await run_in_threadpool(
+            lambda: {i: analysis_cache.get_similar(v) for i, v in query_embeddings.items()}
+        )
+        for i, hit in hits.items():
+            if hit is not None:
+                cached[i] = _cached_result(incidents[i], hit, "semantic")
+                del query_texts[i]
+    if ANALYSIS_CACHE_ENABLED:
+        for _ in query_texts:
+            analysis_cache.record_miss()
+
+    similar: Dict[int, List[str]] = {}
+    if query_texts and vector_store.get_total_vectors() > 0:
+        if mode != "lexical":
+            retrieval_counters["lexical_fallbacks"] += sum(i not in query_embeddings for i in query_texts)
+        try:
+            similar = await run_in_threadpool(_search_batch, mode, query_texts, query_embeddings, filters)
+        except Exception as e:
+            print(f"Warning: batch similar incident search failed: {e}")
+
+    return [
+        (cached[i], query_embeddings.get(i) if semantic else None, similar.get(i, []))
+        for i in range(len(incidents))
+    ]
+
+
+@router.post("/analyze_incident/batch")
+async def analyze_batch(request: BatchAnalyzeRequest):
+    """Analyze many incidents, streaming one NDJSON line per incident as it finishes.
+
+    Retrieval is shared by the batch: one embedding call for all queries
+    and one multi-row index search. LLM analyses then run with at most
+    BATCH_LLM_CONCURRENCY in flight. Lines arrive in completion order as
+    {"index", "id", "result"} or, on timeout or failure, {"index", "id", "error"};
+    results are persisted like single analyses.
+    """
+    if not request.incidents:
+        raise HTTPException(status_code=400, detail="No incidents provided.")
+    if len(request.incidents) > BATCH_MAX_INCIDENTS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {BATCH_MAX_INCIDENTS} incidents per batch."
+        )
+    incidents = []
+    for i, incident in enumerate(request.incidents):
+        logs = incident.logs or ([incident.query] if incident.query else None)
+        if not logs:
+            raise HTTPException(status_code=400, detail=f"Incident {i} has neither logs nor query.")
+        incidents.append(logs)
+    filters = _similar_filters(request.similar)
+    mode = _retrieval_mode(request.retrieval)
+    fingerprints = [_fingerprint(logs, filters, mode) for logs in incidents]
+    started = time.perf_counter()
+    batch_counters["requests"] += 1
+    batch_counters["incidents"] += len(incidents)
+
+    async def analyze_one(
+        i: int, similar_incidents: List[str], query_embedding: Optional[List[float]], slots: asyncio.Semaphore
+    ) -> Tuple[int, Optional[AnalysisResult], Optional[str]]:
+        logs, fingerprint = incidents[i], fingerprints[i]
+        try:
+            async with slots:
+                result, coalesced = await asyncio.wait_for(
+                    analysis_flight.do(
+                        fingerprint, lambda: _analyze(logs, fingerprint, similar_incidents, query_embedding)
+                    ),
+                    timeout=ANALYSIS_TIMEOUT_SECONDS,
+                )
+        except asyncio.TimeoutError:
+            return i, None, f"Analysis timed out after {ANALYSIS_TIMEOUT_SECONDS:g} seconds"
+        except Exception as e:
+            return i, None, f"Analysis failed: {e}"
+        return i, _own_copy(result, logs) if coalesced else result, None
+
+    async def line(i: int, result: Optional[AnalysisResult], error: Optional[str]) -> bytes:
+        body = {"index": i, "id": request.incidents[i].id}
+        if result is not None:
+            await run_in_threadpool(save_result, result.model_dump())
+            body["result"] = result.model_dump()
+        else:
+            batch_counters["errors"] += 1
+            body["error"] = error
+        batch_result_latency.record(time.perf_counter() - started)
+        return (json.dumps(body) + "\n").encode("utf-8")
+
+    async def lines() -> AsyncIterator[bytes]:
+        tasks = []
+        try:
+            retrieved = await _retrieve_batch(incidents, fingerprints, filters, mode)
+            slots = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+            for i, (cached, query_embedding, similar_incidents) in enumerate(retrieved):
+                if cached is None:
+                    tasks.append(asyncio.create_task(analyze_one(i, similar_incidents, query_embedding, slots)))
+            for i, (cached, _, _) in enumerate(retrieved):
+                if cached is not None:
+                    yield await line(i, cached, None)
+            for finished in asyncio.as_completed(tasks):
+                yield await line(*await finished)
+        finally:
+            # Client went away: stop analyses nobody will read
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Query
+
+from app.ai.clustering import incident_clusters
+
+router = APIRouter(tags=["Clusters"])
+
+
+@router.get("/clusters")
+async def get_clusters(
+    limit: int = Query(50, ge=1, le=1000),
+    min_lines: int = Query(1, ge=1, description="Hide clusters with fewer lines"),
+):
+    """Return the open incident clusters of the current window, largest first."""
+    return {
+        "window_seconds": incident_clusters.window_seconds,
+        "clusters": incident_clusters.active(limit, min_lines),
+        "stats": incident_clusters.stats(),
+    }
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.utils.jobs import job_view
+from app.utils.storage import get_job
+
+router = APIRouter(tags=["Jobs"])
+
+
+@router.get("/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """Return an ingestion job's status, progress, throughput and failures."""
+    job = await run_in_threadpool(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
@@ -0,0 +1,34 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+
+from app.db.log_columns import log_columns
+from app.utils.log_parser import parse_log_entries
+from app.utils.storage import store
+
+router = APIRouter(tags=["Logs"])
+
+
+@router.get("/logs")
+async def get_logs(
+    level: Optional[str] = Query(None, description="Minimum level, e.g. WARNING"),
+    service: Optional[str] = None,
+    trace_id: Optional[str] = None,
+    since: Optional[str] = Query(None, description="ISO timestamp, inclusive"),
+    until: Optional[str] = Query(None, description="ISO timestamp, exclusive"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Return the most recent stored logs matching the filters as structured entries."""
+    try:
+        seqs = await run_in_threadpool(
+            log_columns.select,
+            min_level=level, service=service, since=since, until=until, trace_id=trace_id, limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    messages = await run_in_threadpool(store.logs_by_seq, seqs.tolist())
+    return {
+        "logs": await run_in_threadpool(parse_log_entries, messages),
+        "services": log_columns.services(),
+    }
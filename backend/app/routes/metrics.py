@@ -0,0 +1,52 @@
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+
+from app.ai.analysis_cache import analysis_cache
+from app.ai.clustering import incident_clusters
+from app.ai.embedding_cache import embedding_cache
+from app.ai.embeddings import inflight as embedding_flight
+from app.ai.prompts import prompt_metrics
+from app.db.log_columns import log_columns
+from app.db.vector_store import vector_store
+from app.routes.analysis import (
+    analysis_flight,
+    batch_counters,
+    batch_result_latency,
+    retrieval_counters,
+    retrieval_latency,
+    stream_first_byte,
+    stream_first_token,
+    stream_total,
+)
+from app.routes.upload import ingest_jobs
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/api/metrics")
+async def get_metrics():
+    """Return runtime counters for caches and pipelines."""
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "coalescing": {
+            "analysis": analysis_flight.stats(),
+            "embeddings": embedding_flight.stats(),
+        },
+        "ingest_jobs": await run_in_threadpool(ingest_jobs.stats),
+        "log_columns": log_columns.stats(),
+        "vector_store": vector_store.stats(),
+        "clustering": incident_clusters.stats(),
+        "retrieval": {
+            **{mode: tracker.stats() for mode, tracker in retrieval_latency.items()},
+            **retrieval_counters,
+            "lexical_index": vector_store.lexical_stats(),
+        },
+        "prompts": prompt_metrics.stats(),
+        "batch": {**batch_counters, "time_to_result": batch_result_latency.stats()},
+        "streaming": {
+            "time_to_first_byte": stream_first_byte.stats(),
+            "time_to_first_token": stream_first_token.stats(),
+            "time_to_result": stream_total.stats(),
+        },
+    }
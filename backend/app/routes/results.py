@@ -1,27 +1,50 @@
-from fastapi import APIRouter
+from typing import Optional
+
+from fastapi import APIRouter, Query
+from fastapi.concurrency import run_in_threadpool
 
 from app.db.vector_store import vector_store
-from app.utils.storage import read_results
+from app.utils.storage import get_result, query_results
 
 router = APIRouter(tags=["Results"])
 
 
 @router.get("/results")
-async def get_results():
-    """Return all stored analysis results."""
-    results = read_results()
+async def get_results(
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    severity_level: Optional[str] = None,
+    recommended_owner: Optional[str] = None,
+    created_after: Optional[str] = Query(None, description="ISO timestamp, inclusive"),
+    created_before: Optional[str] = Query(None, description="ISO timestamp, exclusive"),
+    summary_only: bool = Query(False, description="Omit logs and similar incidents"),
+):
+    """Return a page of stored analysis results, newest first.
+
+    `total` (matching results) is only counted for the first page.
+    """
+    results, next_cursor, total = await run_in_threadpool(
+        query_results,
+        cursor=cursor,
+        limit=limit,
+        severity_level=severity_level,
+        recommended_owner=recommended_owner,
+        created_after=created_after,
+        created_before=created_before,
+        summary_only=summary_only,
+    )
     return {
         "results": results,
-        "total": len(results),
-        "total_vectors": vector_store.get_total_vectors(),
+        "total": total,
+        "next_cursor": next_cursor,
+        "total_vectors": await run_in_threadpool(vector_store.get_total_vectors),
     }
 
 
 @router.get("/results/{result_id}")
 async def get_result_by_id(result_id: str):
     """Return a specific analysis result by ID."""
-    results = read_results()
-    for result in results:
-        if result.get("id") == result_id:
-            return result
-    return {"error": "Result not found"}
+    result = await run_in_threadpool(get_result, result_id)
+    if result is None:
+        return {"error": "Result not found"}
+    return result
@@ -1,113 +1,341 @@
+import itertools
 import json
-from typing import Optional
+import os
+import queue
+import shutil
+import threading
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple
 
 from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 
-from app.ai.embeddings import generate_embeddings_batch
+from app.ai.clustering import CLUSTERING_ENABLED, incident_clusters
+from app.ai.embeddings import cached_embeddings, generate_embeddings_batch
+from app.db.log_columns import log_columns
 from app.db.vector_store import vector_store
 from app.models.incident import LogUploadRequest
+from app.utils.jobs import JobContext, JobQueue, job_view
+from app.utils.log_parser import parse_fields
 from app.utils.preprocessing import (
-    clean_text,
-    parse_csv_logs,
-    parse_text_logs,
-    sanitize_input,
+    STREAM_CHUNK_BYTES,
+    LogTemplate,
+    batched,
+    iter_upload_logs,
+    normalize_messages,
+    template_miner,
     validate_file_content,
 )
-from app.utils.storage import read_json, save_logs
+from app.utils.storage import BUNDLED_DATA_DIR, read_json, save_templates
 
 router = APIRouter(tags=["Upload"])
 
+# Streaming uploads: lines per ingest batch and batches parsed ahead of indexing
+INGEST_BATCH_LINES = int(os.getenv("INGEST_BATCH_LINES", "5000"))
+INGEST_QUEUE_BATCHES = int(os.getenv("INGEST_QUEUE_BATCHES", "2"))
+# Background workers processing queued upload jobs
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
 
-@router.post("/upload_logs")
-async def upload_logs(
-    request: Optional[LogUploadRequest] = None,
-    file: Optional[UploadFile] = File(None),
-):
-    """Upload logs for processing.
+# Called after each streamed batch with (batch, templates, num_added, num_failed)
+BatchCallback = Callable[[List[str], List[LogTemplate], int, int], None]
 
-    Accepts:
-    - JSON body with list of log strings
-    - CSV file upload
-    - Text file upload
+
+def index_templates(
+    templates: List[LogTemplate], upload_id: Optional[str] = None
+) -> Tuple[int, int, Dict[int, List[float]]]:
+    """Embed one representative line per not-yet-indexed template and add it to FAISS.
+
+    Each vector is tagged with the representative's timestamp, level and
+    service and with upload_id, so searches can filter on them.
+    Returns (num_added, num_failed, embeddings by template id). Templates
+    are claimed from the miner first, so templates another job is currently
+    indexing are skipped here. Failed templates stay unindexed and are
+    retried the next time one of their lines arrives.
     """
-    logs = []
+    pending = template_miner.claim_unindexed(templates)
+    if not pending:
+        return 0, 0, {}
+    indexed = []
+    try:
+        embeddings = generate_embeddings_batch([t.representative for t in pending])
+        embedded = [(t, emb) for t, emb in zip(pending, embeddings) if emb is not None]
+        if embedded:
+            attributes = []
+            for template, _ in embedded:
+                timestamp, level, service, _ = parse_fields(template.representative)
+                attributes.append((timestamp, level, service, upload_id))
+            vector_store.add_vectors(
+                [emb for _, emb in embedded], [t.representative for t, _ in embedded], attributes
+            )
+            indexed = [t for t, _ in embedded]
+    finally:
+        template_miner.release_indexing(pending, indexed)
+    return len(embedded), len(pending) - len(embedded), {t.id: emb for t, emb in embedded}
 
-    # Handle file upload
-    if file:
-        content = await file.read()
-        content_str = content.decode("utf-8", errors="ignore")
 
-        if not validate_file_content(content_str):
-            raise HTTPException(status_code=400, detail="Invalid or empty file content")
+def _unindex_templates(texts: List[str]) -> None:
+    """Vectors were deleted: let their templates be embedded again when their lines recur."""
+    changed = template_miner.mark_unindexed(texts)
+    if changed:
+        save_templates([t.to_dict() for t in changed])
 
-        content_str = sanitize_input(content_str)
 
-        if file.filename and file.filename.endswith(".csv"):
-            logs = parse_csv_logs(content_str)
-        elif file.filename and file.filename.endswith(".json"):
-            try:
-                parsed = json.loads(content_str)
-                if isinstance(parsed, list):
-                    logs = [clean_text(str(item)) for item in parsed if item]
-                else:
-                    raise HTTPException(
-                        status_code=400, detail="JSON file must contain a list of logs"
-                    )
-            except json.JSONDecodeError:
-                raise HTTPException(status_code=400, detail="Invalid JSON file")
-        else:
-            # Treat as plain text
-            logs = parse_text_logs(content_str)
+vector_store.on_delete = _unindex_templates
 
-    # Handle JSON body
-    elif request and request.logs:
-        logs = [clean_text(sanitize_input(log)) for log in request.logs if log.strip()]
 
-    if not logs:
-        raise HTTPException(status_code=400, detail="No valid logs provided")
+def cluster_templates(batch: List[Tuple[LogTemplate, int]], vectors: Dict[int, List[float]]) -> None:
+    """Feed a batch's (template, lines) pairs to the incident clusters.
+
+    Indexed templates outside every open cluster and not embedded in this
+    batch take their stored embedding from the embedding cache; they are
+    never sent to the embedding API again, so ones missing from the cache
+    are counted as unclustered.
+    """
+    missing = [
+        t for t in incident_clusters.unplaced([t for t, _ in batch]) if t.indexed and t.id not in vectors
+    ]
+    if missing:
+        embeddings = cached_embeddings([t.representative for t in missing])
+        vectors = {**vectors, **{t.id: emb for t, emb in zip(missing, embeddings) if emb is not None}}
+    incident_clusters.add(batch, vectors)
 
-    # Store logs
-    save_logs(logs)
 
-    # Generate embeddings and add to FAISS
+def _ingest_batch(
+    logs: List[str], upload_id: Optional[str] = None
+) -> Tuple[List[LogTemplate], int, int]:
+    """Store one batch with its parsed columns, mine templates and index new ones.
+
+    Returns (touched templates, num_added, num_failed).
+    """
+    log_columns.append_logs(logs)
+    counted = template_miner.add_logs_counted(logs)
+    templates = [template for template, _ in counted]
+
+    vectors = {}
     try:
-        embeddings = generate_embeddings_batch(logs)
-        num_added = vector_store.add_vectors(embeddings, logs)
+        num_added, num_failed, vectors = index_templates(templates, upload_id)
     except Exception as e:
         # Logs are saved but embeddings failed - still return success
         print(f"Warning: Embedding generation failed: {e}")
-        num_added = 0
+        num_added, num_failed = 0, sum(1 for t in templates if not t.indexed)
+
+    if CLUSTERING_ENABLED:
+        try:
+            cluster_templates(counted, vectors)
+        except Exception as e:
+            print(f"Warning: incident clustering failed: {e}")
+
+    save_templates([t.to_dict() for t in templates])
+    return templates, num_added, num_failed
 
+
+def _summary(logs_received: int, templates_matched: int, num_added: int, num_failed: int) -> Dict:
     return {
         "status": "success",
-        "logs_received": len(logs),
+        "logs_received": logs_received,
+        "templates_matched": templates_matched,
         "embeddings_stored": num_added,
+        "embeddings_failed": num_failed,
+        "total_templates": len(template_miner.templates),
         "total_vectors": vector_store.get_total_vectors(),
     }
 
 
-@router.post("/upload_demo_logs")
-async def upload_demo_logs():
-    """Load pre-built demo logs for quick demonstration."""
-    demo_logs = read_json("demo_logs.json")
+def ingest_logs(logs: List[str]) -> Dict:
+    """Store raw logs, mine templates and index new templates."""
+    templates, num_added, num_failed = _ingest_batch(logs)
+    return _summary(len(logs), len(templates), num_added, num_failed)
 
-    if not demo_logs:
-        raise HTTPException(status_code=404, detail="Demo logs not found")
 
-    # Store logs
-    save_logs(demo_logs)
+def ingest_stream(
+    logs: Iterable[str],
+    batch_size: int = INGEST_BATCH_LINES,
+    on_batch: Optional[BatchCallback] = None,
+    upload_id: Optional[str] = None,
+) -> Dict:
+    """Ingest an unbounded stream of log lines in fixed-size batches.
+
+    A reader thread parses ahead into a queue of at most INGEST_QUEUE_BATCHES
+    batches while this thread stores, embeds and indexes, so parsing and
+    embedding overlap and memory stays bounded regardless of input size.
+    Parse errors are re-raised here; batches before the error stay ingested.
+    on_batch(batch, templates, num_added, num_failed) runs after each batch;
+    an exception from it stops the stream. New vectors are tagged with upload_id.
+    """
+    batches: "queue.Queue" = queue.Queue(maxsize=INGEST_QUEUE_BATCHES)
+    stop = threading.Event()
+    done = object()
+
+    def read():
+        try:
+            for batch in batched(logs, batch_size):
+                while not stop.is_set():
+                    try:
+                        batches.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            item = done
+        except Exception as e:
+            item = e
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    reader = threading.Thread(target=read, name="ingest-reader", daemon=True)
+    reader.start()
 
-    # Generate embeddings and add to FAISS
+    received = added = failed = num_batches = 0
+    touched = set()
     try:
-        embeddings = generate_embeddings_batch(demo_logs)
-        num_added = vector_store.add_vectors(embeddings, demo_logs)
-    except Exception as e:
-        print(f"Warning: Embedding generation failed: {e}")
-        num_added = 0
+        while True:
+            batch = batches.get()
+            if batch is done:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            templates, num_added, num_failed = _ingest_batch(batch, upload_id)
+            received += len(batch)
+            added += num_added
+            failed += num_failed
+            num_batches += 1
+            touched.update(t.id for t in templates)
+            if on_batch:
+                on_batch(batch, templates, num_added, num_failed)
+    finally:
+        stop.set()
+        reader.join()
+
+    summary = _summary(received, len(touched), added, failed)
+    summary["batches"] = num_batches
+    return summary
+
+
+def run_ingest_job(context: JobContext) -> Dict:
+    """Job handler: stream a stored upload through ingest_stream, reporting progress.
+
+    Resumed jobs skip the lines already ingested. A crash between ingesting a
+    batch and reporting it re-ingests that batch on resume.
+    """
+    job = context.job
+    already_done = job.get("logs_received", 0)
+    template_ids = set(job.get("template_ids", []))
+
+    with open(job["source_path"], "rb") as f:
+
+        def on_batch(batch, templates, num_added, num_failed):
+            template_ids.update(t.id for t in templates)
+            for template in templates:
+                if not template.indexed:
+                    context.fail_item(template.representative, "embedding failed")
+            context.report(
+                logs_received=job.get("logs_received", 0) + len(batch),
+                batches=job.get("batches", 0) + 1,
+                embeddings_stored=job.get("embeddings_stored", 0) + num_added,
+                embeddings_failed=job.get("embeddings_failed", 0) + num_failed,
+                template_ids=sorted(template_ids),
+                bytes_read=f.tell(),
+            )
+
+        logs = itertools.islice(iter_upload_logs(f, job.get("filename")), already_done, None)
+        ingest_stream(logs, on_batch=on_batch, upload_id=job["id"])
 
+    if not job.get("logs_received"):
+        raise ValueError("No valid logs provided")
     return {
-        "status": "success",
-        "logs_received": len(demo_logs),
-        "embeddings_stored": num_added,
+        "bytes_read": job["bytes_total"],
+        "total_templates": len(template_miner.templates),
         "total_vectors": vector_store.get_total_vectors(),
     }
+
+
+# Singleton instance
+ingest_jobs = JobQueue(run_ingest_job, workers=INGEST_WORKERS)
+
+
+def parse_upload(content: bytes) -> List[str]:
+    """Decode and parse an uploaded JSON array of logs (buffered; size-capped)."""
+    content_str = content.decode("utf-8", errors="ignore")
+
+    if not validate_file_content(content_str):
+        raise HTTPException(status_code=400, detail="Invalid or empty file content")
+
+    try:
+        parsed = json.loads(content_str)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON file")
+    if not isinstance(parsed, list):
+        raise HTTPException(status_code=400, detail="JSON file must contain a list of logs")
+    return normalize_messages(str(item) for item in parsed if item)
+
+
+def submit_file(fileobj: BinaryIO, filename: Optional[str]) -> Dict:
+    """Copy an upload to the job directory in chunks and queue it for ingestion."""
+    path = JobQueue.new_upload_path(".upload")
+    with open(path, "wb") as out:
+        shutil.copyfileobj(fileobj, out, STREAM_CHUNK_BYTES)
+    return ingest_jobs.submit(path, filename)
+
+
+def submit_logs(logs: List[str]) -> Dict:
+    """Queue an in-memory list of log lines for ingestion."""
+    path = JobQueue.new_upload_path(".log")
+    with open(path, "w", encoding="utf-8") as out:
+        for log in logs:
+            # The job normalizes each line again when it reads the file
+            out.write(str(log).replace("\n", " ") + "\n")
+    return ingest_jobs.submit(path)
+
+
+@router.post("/upload_logs", status_code=202)
+async def upload_logs(
+    request: Optional[LogUploadRequest] = None,
+    file: Optional[UploadFile] = File(None),
+):
+    """Upload logs for processing.
+
+    Accepts:
+    - JSON body with list of log strings
+    - CSV, NDJSON (.ndjson/.jsonl) or text file upload, optionally gzipped,
+      of any size
+    - JSON file upload with a list of logs (up to 1 MB)
+
+    Returns a queued ingestion job immediately; poll GET /jobs/{id} for progress.
+    """
+    logs = []
+
+    # Handle file upload
+    if file:
+        if not (file.filename and file.filename.endswith(".json")):
+            # Text, CSV and NDJSON (optionally gzipped) are parsed by the worker
+            job = await run_in_threadpool(submit_file, file.file, file.filename)
+            return job_view(job)
+        content = await file.read()
+        # Decoding, sanitizing and parsing are CPU-bound; keep them off the event loop
+        logs = await run_in_threadpool(parse_upload, content)
+
+    # Handle JSON body
+    elif request and request.logs:
+        logs = normalize_messages(request.logs)
+
+    if not logs:
+        raise HTTPException(status_code=400, detail="No valid logs provided")
+
+    job = await run_in_threadpool(submit_logs, logs)
+    return job_view(job)
+
+
+@router.post("/upload_demo_logs", status_code=202)
+async def upload_demo_logs():
+    """Load pre-built demo logs for quick demonstration (as a background job)."""
+    demo_logs = read_json("demo_logs.json", BUNDLED_DATA_DIR)
+
+    if not demo_logs:
+        raise HTTPException(status_code=404, detail="Demo logs not found")
+
+    job = await run_in_threadpool(submit_logs, demo_logs)
+    return job_view(job)
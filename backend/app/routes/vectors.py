@@ -0,0 +1,52 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+
+from app.db.vector_store import vector_store
+from app.models.incident import VectorDeleteRequest
+
+router = APIRouter(tags=["Vectors"])
+
+
+@router.get("/vectors")
+async def list_vectors(
+    upload_id: Optional[str] = None,
+    source: Optional[str] = None,
+    level: Optional[str] = Query(None, description="Minimum level, e.g. ERROR"),
+    since: Optional[str] = Query(None, description="ISO timestamp, inclusive"),
+    until: Optional[str] = Query(None, description="ISO timestamp, exclusive"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Return the most recently indexed vectors matching the filters, with their ids."""
+    try:
+        vectors = vector_store.list_vectors(
+            limit, since=since, until=until, min_level=level, source=source, upload_id=upload_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"vectors": vectors, "stats": vector_store.stats()}
+
+
+@router.delete("/vectors")
+async def delete_vectors(request: VectorDeleteRequest):
+    """Delete vectors by id and/or by ingestion job.
+
+    Deleted vectors stop matching searches immediately; the background
+    maintenance task reclaims their space by compacting the index.
+    """
+    if not request.ids and not request.upload_id:
+        raise HTTPException(status_code=400, detail="Provide ids or upload_id.")
+    deleted = 0
+    if request.ids:
+        deleted += await run_in_threadpool(vector_store.delete, request.ids)
+    if request.upload_id:
+        deleted += await run_in_threadpool(vector_store.delete_upload, request.upload_id)
+    return {"deleted": deleted, "stats": vector_store.stats()}
+
+
+@router.post("/vectors/compact")
+async def compact_vectors():
+    """Rebuild the index without deleted vectors now instead of waiting for maintenance."""
+    removed = await run_in_threadpool(vector_store.compact)
+    return {"removed": removed, "stats": vector_store.stats()}
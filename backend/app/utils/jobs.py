@@ -0,0 +1,161 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from app.utils.storage import DATA_DIR, store
+
+UPLOAD_DIR = os.path.join(DATA_DIR, "uploads")
+# Per-item failures kept on a job record; the counters still cover all of them
+MAX_JOB_FAILURES = 100
+
+QUEUED, RUNNING, COMPLETED, FAILED = "queued", "running", "completed", "failed"
+
+
+class JobInterrupted(Exception):
+    """Raised from a progress report when the queue is shutting down."""
+
+
+class JobContext:
+    """Handle passed to a job handler for reporting progress and failures."""
+
+    def __init__(self, job_queue: "JobQueue", job: Dict):
+        self._queue = job_queue
+        self.job = job
+        self._resumed_at = time.monotonic()
+        self._elapsed = job.get("elapsed_seconds", 0.0)
+
+    def elapsed(self) -> float:
+        """Active run time across restarts, in seconds."""
+        return self._elapsed + time.monotonic() - self._resumed_at
+
+    def fail_item(self, item: str, error: str) -> None:
+        """Record a per-item failure (kept up to MAX_JOB_FAILURES)."""
+        failures = self.job.setdefault("failures", [])
+        if len(failures) < MAX_JOB_FAILURES:
+            failures.append({"item": item[:500], "error": error})
+
+    def report(self, **counters) -> None:
+        """Persist progress counters; raises JobInterrupted during shutdown."""
+        self.job.update(counters)
+        self.job["elapsed_seconds"] = self.elapsed()
+        self.job["updated_at"] = datetime.now().isoformat()
+        store.save_job(self.job)
+        if self._queue.stopping.is_set():
+            raise JobInterrupted()
+
+
+class JobQueue:
+    """Persistent background job queue with a fixed pool of worker threads.
+
+    Jobs are rows in the SQLite `jobs` table, so queued and interrupted jobs
+    survive a restart: start() re-enqueues every job that had not finished,
+    and handlers resume from the progress they last reported.
+    """
+
+    def __init__(self, handler: Callable[[JobContext], Dict], workers: int = 2):
+        self.handler = handler
+        self.workers = workers
+        self.stopping = threading.Event()
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """Start the workers and resume unfinished jobs."""
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        self.stopping.clear()
+        resumed = store.jobs_with_status([QUEUED, RUNNING])
+        for job in resumed:
+            self._queue.put(job["id"])
+        if resumed:
+            print(f"Resuming {len(resumed)} unfinished ingestion job(s)")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Ask running jobs to pause at their next progress report and join the workers."""
+        self.stopping.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        self._threads = []
+
+    def submit(self, source_path: str, filename: Optional[str] = None) -> Dict:
+        """Create a job for a file already written to source_path and enqueue it."""
+        job = {
+            "id": str(uuid.uuid4()),
+            "status": QUEUED,
+            "filename": filename,
+            "source_path": source_path,
+            "bytes_total": os.path.getsize(source_path),
+            "created_at": datetime.now().isoformat(),
+        }
+        store.save_job(job)
+        self._queue.put(job["id"])
+        return job
+
+    @staticmethod
+    def new_upload_path(suffix: str = "") -> str:
+        """Path under UPLOAD_DIR for a new job's source file."""
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        return os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}{suffix}")
+
+    def _work(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            if job_id is None or self.stopping.is_set():
+                return
+            job = store.get_job(job_id)
+            if job is None or job["status"] in (COMPLETED, FAILED):
+                continue
+            self._run(job)
+
+    def _run(self, job: Dict) -> None:
+        job["status"] = RUNNING
+        job.setdefault("started_at", datetime.now().isoformat())
+        store.save_job(job)
+        context = JobContext(self, job)
+        try:
+            job.update(self.handler(context))
+            job["status"] = COMPLETED
+        except JobInterrupted:
+            # Resumed from the last reported progress on next start
+            job["status"] = QUEUED
+            store.save_job(job)
+            return
+        except Exception as e:
+            print(f"Ingestion job {job['id']} failed: {e}")
+            job["status"] = FAILED
+            job["error"] = str(e)
+        job["elapsed_seconds"] = context.elapsed()
+        job["finished_at"] = datetime.now().isoformat()
+        store.save_job(job)
+        try:
+            os.remove(job["source_path"])
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs currently waiting and running."""
+        return store.count_jobs([QUEUED, RUNNING])
+
+
+def job_view(job: Dict) -> Dict:
+    """Public representation of a job with derived progress and throughput."""
+    view = {k: v for k, v in job.items() if k not in ("source_path", "template_ids")}
+    view["templates_matched"] = len(job.get("template_ids", []))
+    elapsed = job.get("elapsed_seconds") or 0.0
+    view["lines_per_second"] = round(job.get("logs_received", 0) / elapsed, 1) if elapsed else 0.0
+    total = job.get("bytes_total") or 0
+    if job["status"] == COMPLETED:
+        view["progress"] = 1.0
+    else:
+        view["progress"] = round(min(job.get("bytes_read", 0) / total, 1.0), 4) if total else 0.0
+    return view
@@ -0,0 +1,33 @@
+import threading
+from collections import deque
+from typing import Dict
+
+import numpy as np
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies with percentile summaries."""
+
+    def __init__(self, window: int = 1000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Return count plus p50/p95/max in milliseconds over the window."""
+        with self._lock:
+            samples = np.array(self._samples) * 1000
+        if not len(samples):
+            return {"count": self.count, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        p50, p95 = np.percentile(samples, [50, 95])
+        return {
+            "count": self.count,
+            "p50_ms": round(float(p50), 1),
+            "p95_ms": round(float(p95), 1),
+            "max_ms": round(float(samples.max()), 1),
+        }
@@ -0,0 +1,165 @@
+import json
+import re
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.models.incident import LogEntry
+
+# Canonical levels in increasing severity; code 0 means "unknown"
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+LEVEL_CODES = {name: code for code, name in enumerate(LEVELS, 1)}
+LEVEL_ALIASES = {
+    "TRACE": "DEBUG", "DEBUG": "DEBUG", "DBG": "DEBUG",
+    "INFO": "INFO", "NOTICE": "INFO", "INF": "INFO",
+    "WARN": "WARNING", "WARNING": "WARNING", "WRN": "WARNING",
+    "ERROR": "ERROR", "ERR": "ERROR", "SEVERE": "ERROR",
+    "CRITICAL": "CRITICAL", "CRIT": "CRITICAL", "FATAL": "CRITICAL",
+    "ALERT": "CRITICAL", "EMERG": "CRITICAL", "EMERGENCY": "CRITICAL", "PANIC": "CRITICAL",
+}
+
+ISO_TIMESTAMP = re.compile(
+    r"^\s*\[?(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?)\]?"
+)
+# "Feb  6 09:15:23 host program[pid]: message" (the <PRI> prefix is stripped by sanitizing)
+SYSLOG_HEADER = re.compile(
+    r"^\s*([A-Z][a-z]{2} +\d{1,2} \d{2}:\d{2}:\d{2}) (\S+) ([A-Za-z][\w./-]*)(?:\[\d+\])?: "
+)
+LEVEL_WORD = re.compile(
+    r"\b(TRACE|DEBUG|DBG|INFO|NOTICE|WARN(?:ING)?|ERR(?:OR)?|SEVERE|CRIT(?:ICAL)?|FATAL|ALERT|EMERG(?:ENCY)?|PANIC)\b"
+)
+BRACKET_SERVICE = re.compile(r"\[([A-Za-z][\w.-]*)\]")
+KEY_VALUE = re.compile(r"([A-Za-z_][\w.-]*)=(\"[^\"]*\"|'[^']*'|[^\s,;]+)")
+# W3C traceparent: version-traceid-parentid-flags
+TRACEPARENT = re.compile(r"\b[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}\b")
+
+TIMESTAMP_KEYS = ("timestamp", "@timestamp", "time", "ts", "datetime")
+LEVEL_KEYS = ("level", "severity", "lvl", "loglevel", "log.level")
+SERVICE_KEYS = ("service", "service.name", "app", "application", "component", "svc", "logger")
+TRACE_KEYS = ("trace_id", "traceid", "trace", "trace.id", "x-trace-id", "dd.trace_id")
+MESSAGE_KEYS = ("message", "msg", "log")
+
+# (epoch seconds or None, level code, service, trace id)
+ParsedFields = Tuple[Optional[float], int, Optional[str], Optional[str]]
+
+
+def parse_timestamp(value: str) -> Optional[float]:
+    """ISO 8601 or syslog timestamp to epoch seconds (naive times are UTC)."""
+    try:
+        if value[:4].isdigit():
+            parsed = datetime.fromisoformat(value.replace(",", ".").replace("Z", "+00:00"))
+        else:
+            # Syslog omits the year
+            parsed = datetime.strptime(f"{datetime.now().year} {value}", "%Y %b %d %H:%M:%S")
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def level_code(value: Optional[str]) -> int:
+    """Code of a level name or alias (case-insensitive); 0 if unknown."""
+    if not value:
+        return 0
+    return LEVEL_CODES.get(LEVEL_ALIASES.get(value.upper(), ""), 0)
+
+
+def _first(fields: Dict[str, str], keys: Tuple[str, ...]) -> Optional[str]:
+    for key in keys:
+        value = fields.get(key)
+        if value:
+            return str(value)
+    return None
+
+
+def _parse_json(line: str) -> Optional[ParsedFields]:
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    fields = {str(k).lower(): v for k, v in record.items() if isinstance(v, (str, int, float))}
+    timestamp = _first(fields, TIMESTAMP_KEYS)
+    return (
+        parse_timestamp(timestamp) if timestamp else None,
+        level_code(_first(fields, LEVEL_KEYS)),
+        _first(fields, SERVICE_KEYS),
+        _first(fields, TRACE_KEYS),
+    )
+
+
+def parse_fields(line: str) -> ParsedFields:
+    """Extract (timestamp, level code, service, trace id) from one log line.
+
+    Recognizes JSON objects, ISO-timestamped lines ("2024-01-01 12:00:00 ERROR
+    [Service] ..."), syslog headers and key=value pairs anywhere in the line.
+    Explicit key=value fields win over positional guesses.
+    """
+    if line.startswith("{"):
+        parsed = _parse_json(line)
+        if parsed is not None:
+            return parsed
+
+    timestamp = service = trace_id = None
+    body = line
+    match = ISO_TIMESTAMP.match(line)
+    if match:
+        timestamp = parse_timestamp(match.group(1))
+        body = line[match.end():]
+    else:
+        match = SYSLOG_HEADER.match(line)
+        if match:
+            timestamp = parse_timestamp(match.group(1))
+            service = match.group(3)
+            body = line[match.end():]
+
+    fields: Dict[str, str] = {}
+    if "=" in body:
+        fields = {k.lower(): v.strip("\"'") for k, v in KEY_VALUE.findall(body)}
+
+    level = level_code(_first(fields, LEVEL_KEYS))
+    if not level:
+        match = LEVEL_WORD.search(body)
+        level = level_code(match.group(1)) if match else 0
+
+    service = _first(fields, SERVICE_KEYS) or service
+    if service is None and "[" in body:
+        match = BRACKET_SERVICE.search(body)
+        service = match.group(1) if match else None
+
+    trace_id = _first(fields, TRACE_KEYS)
+    if trace_id is None and "-" in body:
+        match = TRACEPARENT.search(body)
+        trace_id = match.group(1) if match else None
+
+    if timestamp is None and fields:
+        value = _first(fields, TIMESTAMP_KEYS)
+        timestamp = parse_timestamp(value) if value else None
+    return timestamp, level, service, trace_id
+
+
+def parse_log_entry(line: str) -> LogEntry:
+    """Parse one line into a LogEntry."""
+    timestamp, level, service, trace_id = parse_fields(line)
+    message = line
+    if line.startswith("{"):
+        try:
+            record = json.loads(line)
+            message = str(_first({k.lower(): v for k, v in record.items()}, MESSAGE_KEYS) or line)
+        except (ValueError, AttributeError):
+            pass
+    return LogEntry(
+        timestamp=(
+            datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp is not None else None
+        ),
+        level=LEVELS[level - 1] if level else None,
+        service=service,
+        trace_id=trace_id,
+        message=message,
+    )
+
+
+def parse_log_entries(lines: Iterable[str]) -> List[LogEntry]:
+    """Parse lines into LogEntry objects."""
+    return [parse_log_entry(line) for line in lines]
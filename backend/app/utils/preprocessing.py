@@ -1,42 +1,81 @@
+import codecs
 import csv
 import io
+import itertools
+import json
+import os
 import re
-from typing import List
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+MAX_MESSAGE_CHARS = 5000
+
+# Precompiled once; line-local so they can run over a whole chunk of lines
+WHITESPACE_PATTERN = re.compile(r"\s+")
+SCRIPT_PATTERN = re.compile(r"<script[^>]*>.*?</script>", re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r"<[^>]+>")
+# Sanitizing pass for normalize_lines: script blocks, tags and null bytes in one sweep
+CHUNK_STRIP_PATTERN = re.compile(r"<script[^>\n]*>[^\n]*?</script>|<[^>\n]+>|\x00", re.IGNORECASE)
+
+# Worker processes for normalizing large uploads; 0 or 1 normalizes in-process
+NORMALIZE_PROCESSES = int(os.getenv("NORMALIZE_PROCESSES", "0"))
 
 
 def clean_text(text: str) -> str:
     """Clean and sanitize a log message."""
     # Remove excessive whitespace
-    text = re.sub(r"\s+", " ", text.strip())
+    text = WHITESPACE_PATTERN.sub(" ", text.strip())
     # Remove null bytes
     text = text.replace("\x00", "")
     # Limit length
-    if len(text) > 5000:
-        text = text[:5000]
+    if len(text) > MAX_MESSAGE_CHARS:
+        text = text[:MAX_MESSAGE_CHARS]
     return text
 
 
+def normalize_lines(text: str, sanitize: bool = True) -> List[str]:
+    """Clean (and optionally sanitize) every line of a chunk in one batch.
+
+    Equivalent to clean_text(sanitize_input(line)) per line, dropping empty
+    lines, but strips tags and null bytes with a single regex sweep over the
+    whole chunk and collapses whitespace with str.split instead of a regex.
+    Tags and script blocks are matched within a line.
+    """
+    if sanitize:
+        if "<" in text:
+            text = CHUNK_STRIP_PATTERN.sub("", text)
+        elif "\x00" in text:
+            text = text.replace("\x00", "")
+    elif "\x00" in text:
+        text = text.replace("\x00", "")
+    return [
+        " ".join(words)[:MAX_MESSAGE_CHARS]
+        for words in map(str.split, text.split("\n"))
+        if words
+    ]
+
+
+def normalize_messages(messages: Iterable[str], sanitize: bool = True) -> List[str]:
+    """normalize_lines over separate messages (embedded newlines become spaces)."""
+    return normalize_lines("\n".join(m.replace("\n", " ") for m in messages), sanitize)
+
+
 def parse_csv_logs(csv_content: str) -> List[str]:
     """Parse CSV content and extract log messages."""
-    logs = []
     reader = csv.reader(io.StringIO(csv_content))
-    for row in reader:
-        if row:
-            # Join all columns as a single log message
-            message = " | ".join(col.strip() for col in row if col.strip())
-            if message:
-                logs.append(clean_text(message))
-    return logs
+    # Join all columns as a single log message
+    messages = (" | ".join(col.strip() for col in row if col.strip()) for row in reader if row)
+    return normalize_messages(messages, sanitize=False)
 
 
 def parse_text_logs(text_content: str) -> List[str]:
     """Parse plain text logs (one per line)."""
-    logs = []
-    for line in text_content.strip().split("\n"):
-        cleaned = clean_text(line)
-        if cleaned:
-            logs.append(cleaned)
-    return logs
+    return normalize_lines(text_content, sanitize=False)
 
 
 def validate_file_content(content: str, max_size: int = 1_000_000) -> bool:
@@ -51,7 +90,384 @@ def validate_file_content(content: str, max_size: int = 1_000_000) -> bool:
 def sanitize_input(text: str) -> str:
     """Sanitize user input to prevent injection."""
     # Remove potential script tags
-    text = re.sub(r"<script[^>]*>.*?</script>", "", text, flags=re.IGNORECASE | re.DOTALL)
+    text = SCRIPT_PATTERN.sub("", text)
     # Remove HTML tags
-    text = re.sub(r"<[^>]+>", "", text)
+    text = TAG_PATTERN.sub("", text)
     return text.strip()
+
+
+# Streaming ingestion: bytes read per chunk and the longest line kept before truncation
+STREAM_CHUNK_BYTES = 1 << 20
+MAX_LINE_CHARS = 64_000
+GZIP_MAGIC = b"\x1f\x8b"
+NDJSON_MESSAGE_FIELDS = ("message", "msg", "log")
+# Parsed CSV/NDJSON messages normalized together
+MESSAGE_BLOCK_SIZE = 2000
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _normalize_pool(processes: int) -> ProcessPoolExecutor:
+    """Lazily start the shared normalization pool ("spawn": safe in threaded servers)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(processes, mp_context=get_context("spawn"))
+        return _pool
+
+
+def _ordered_map(fn: Callable, items: Iterable, pool: ProcessPoolExecutor, window: int) -> Iterator:
+    """pool.map that keeps at most `window` items in flight (Executor.map reads all input)."""
+    pending: deque = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def normalize_blocks(
+    blocks: Iterable[str], processes: Optional[int] = None, sanitize: bool = True
+) -> Iterator[str]:
+    """Normalize chunks of lines, in order, across worker processes if configured."""
+    processes = NORMALIZE_PROCESSES if processes is None else processes
+    if processes > 1:
+        fn = normalize_lines if sanitize else _normalize_unsanitized
+        results = _ordered_map(fn, blocks, _normalize_pool(processes), 2 * processes)
+    else:
+        results = (normalize_lines(block, sanitize) for block in blocks)
+    for lines in results:
+        yield from lines
+
+
+def _normalize_unsanitized(text: str) -> List[str]:
+    return normalize_lines(text, sanitize=False)
+
+
+def iter_file_chunks(fileobj: BinaryIO, chunk_size: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """Read a binary file in fixed-size chunks."""
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_decompressed(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Transparently gunzip a chunk stream if it starts with the gzip magic bytes.
+
+    Output per step is capped at STREAM_CHUNK_BYTES so highly compressed
+    input cannot expand in memory; concatenated gzip members are supported.
+    """
+    chunks = iter(chunks)
+    first = next(chunks, b"")
+    if not first.startswith(GZIP_MAGIC):
+        if first:
+            yield first
+        yield from chunks
+        return
+
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    for chunk in itertools.chain([first], chunks):
+        data = chunk
+        while True:
+            if decompressor.eof and data:
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)  # next member
+            out = decompressor.decompress(data, STREAM_CHUNK_BYTES)
+            if out:
+                yield out
+            data = decompressor.unused_data if decompressor.eof else decompressor.unconsumed_tail
+            if not data and len(out) < STREAM_CHUNK_BYTES:
+                break
+    if not decompressor.eof:
+        raise ValueError("Truncated gzip stream")
+
+
+def iter_text_blocks(chunks: Iterable[bytes], max_line: int = MAX_LINE_CHARS) -> Iterator[str]:
+    """Decode UTF-8 chunks into blocks of whole lines without holding the whole text.
+
+    Each block ends at a line boundary. Lines longer than max_line are
+    truncated so a file without newlines cannot grow the buffer without bound.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    buffer = ""
+    overflow = False
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        end = buffer.rfind("\n")
+        if end != -1:
+            block, buffer = buffer[:end], buffer[end + 1:]
+            if overflow:
+                # Drop the rest of the truncated line
+                block = block[block.find("\n") + 1:] if "\n" in block else ""
+                overflow = False
+            if block:
+                yield block
+        if len(buffer) > max_line:
+            if not overflow:
+                yield buffer[:max_line]
+            buffer, overflow = "", True
+    buffer += decoder.decode(b"", final=True)
+    if buffer and not overflow:
+        yield buffer[:max_line]
+
+
+def iter_lines(chunks: Iterable[bytes], max_line: int = MAX_LINE_CHARS) -> Iterator[str]:
+    """Decode UTF-8 chunks and split them into lines (see iter_text_blocks)."""
+    for block in iter_text_blocks(chunks, max_line):
+        yield from block.split("\n")
+
+
+def iter_text_logs(blocks: Iterable[str]) -> Iterator[str]:
+    """Streaming parse_text_logs: sanitize and clean blocks of lines."""
+    return normalize_blocks(blocks)
+
+
+def _message_blocks(messages: Iterable[str]) -> Iterator[str]:
+    """Join parsed messages into newline-separated blocks for normalize_blocks."""
+    for group in batched(messages, MESSAGE_BLOCK_SIZE):
+        yield "\n".join(m.replace("\n", " ") for m in group)
+
+
+def iter_csv_logs(lines: Iterable[str]) -> Iterator[str]:
+    """Streaming parse_csv_logs over an iterable of lines."""
+    # csv needs the line endings back to handle quoted multi-line fields
+    rows = csv.reader(line + "\n" for line in lines)
+    messages = (" | ".join(col.strip() for col in row if col.strip()) for row in rows)
+    return normalize_blocks(_message_blocks(m for m in messages if m))
+
+
+def _ndjson_messages(lines: Iterable[str]) -> Iterator[str]:
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            raise ValueError(f"Invalid JSON on line {number}")
+        if isinstance(item, dict):
+            message = next((item[f] for f in NDJSON_MESSAGE_FIELDS if item.get(f)), None)
+            item = message if message is not None else json.dumps(item, separators=(",", ":"))
+        if item:
+            yield str(item)
+
+
+def iter_ndjson_logs(lines: Iterable[str]) -> Iterator[str]:
+    """Parse newline-delimited JSON: strings, or objects with a message field.
+
+    Objects without a known message field are kept as compact JSON.
+    """
+    return normalize_blocks(_message_blocks(_ndjson_messages(lines)))
+
+
+def iter_upload_logs(fileobj: BinaryIO, filename: Optional[str]) -> Iterator[str]:
+    """Stream cleaned log lines out of an uploaded file of any supported format.
+
+    Handles plain text, CSV and NDJSON (.ndjson/.jsonl), each optionally
+    gzip-compressed. Sanitizing is applied per line.
+    """
+    name = (filename or "").lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    blocks = iter_text_blocks(iter_decompressed(iter_file_chunks(fileobj)))
+    if name.endswith(".csv"):
+        return iter_csv_logs(line for block in blocks for line in block.split("\n"))
+    if name.endswith((".ndjson", ".jsonl")):
+        return iter_ndjson_logs(line for block in blocks for line in block.split("\n"))
+    return iter_text_logs(blocks)
+
+
+def batched(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    """Group an iterable into lists of at most `size` items."""
+    batch: List[str] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Variable tokens masked before template mining, applied in order
+TEMPLATE_MASKS = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"), "<TS>"),
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<UUID>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), "<IP>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b|\b[0-9a-fA-F]{16,}\b"), "<HEX>"),
+    (re.compile(r"(?<![A-Za-z])-?\d+(?:\.\d+)?"), "<NUM>"),
+]
+LEADING_TIMESTAMP = re.compile(r"^\s*(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2})")
+WILDCARD = "<*>"
+
+
+def mask_variables(text: str) -> str:
+    """Replace timestamps, ids, IPs and numbers with placeholder tokens."""
+    for pattern, placeholder in TEMPLATE_MASKS:
+        text = pattern.sub(placeholder, text)
+    return text
+
+
+class LogTemplate:
+    """A mined log template with occurrence statistics."""
+
+    __slots__ = ("id", "tokens", "representative", "count", "first_seen", "last_seen", "indexed")
+
+    def __init__(self, template_id: int, tokens: List[str], representative: str, seen: str):
+        self.id = template_id
+        self.tokens = tokens
+        self.representative = representative
+        self.count = 0
+        self.first_seen = seen
+        self.last_seen = seen
+        self.indexed = False
+
+    @property
+    def template(self) -> str:
+        return " ".join(self.tokens)
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "template": self.template,
+            "representative": self.representative,
+            "count": self.count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "indexed": self.indexed,
+        }
+
+
+class TemplateMiner:
+    """Drain-style online log template miner.
+
+    Lines are masked, tokenized and routed through a fixed-depth tree keyed
+    by token count and leading tokens. Within a leaf, a line joins the most
+    similar template if enough positions match; differing positions become
+    wildcards. Otherwise it starts a new template.
+    """
+
+    def __init__(self, depth: int = 2, similarity_threshold: float = 0.5, max_children: int = 100):
+        self.depth = depth
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.templates: Dict[int, LogTemplate] = {}
+        self._tree: Dict[int, Dict] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._indexing: Set[int] = set()  # template ids an ingest job is embedding right now
+
+    def _leaf(self, tokens: List[str]) -> List[LogTemplate]:
+        node = self._tree.setdefault(len(tokens), {})
+        for token in tokens[: self.depth]:
+            if any(ch.isdigit() for ch in token) or token.startswith("<"):
+                token = WILDCARD
+            elif token not in node and len(node) >= self.max_children:
+                token = WILDCARD
+            node = node.setdefault(token, {})
+        return node.setdefault(None, [])
+
+    def _similarity(self, template: List[str], tokens: List[str]) -> float:
+        matches = sum(1 for a, b in zip(template, tokens) if a == b or a == WILDCARD)
+        return matches / len(tokens) if tokens else 1.0
+
+    def _match(self, tokens: List[str]) -> Tuple[List[LogTemplate], Optional[LogTemplate]]:
+        leaf = self._leaf(tokens)
+        best, best_score = None, self.similarity_threshold
+        for candidate in leaf:
+            score = self._similarity(candidate.tokens, tokens)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return leaf, best
+
+    def add_log(self, line: str, seen: Optional[str] = None) -> Tuple[LogTemplate, bool]:
+        """Assign a line to a template. Returns (template, created)."""
+        match = LEADING_TIMESTAMP.match(line)
+        seen = seen or (match.group(1).replace(" ", "T") if match else datetime.now().isoformat())
+        tokens = mask_variables(line).split() or [WILDCARD]
+
+        with self._lock:
+            leaf, template = self._match(tokens)
+            created = template is None
+            if created:
+                template = LogTemplate(self._next_id, tokens, line, seen)
+                self._next_id += 1
+                self.templates[template.id] = template
+                leaf.append(template)
+            else:
+                template.tokens = [
+                    a if a == b else WILDCARD for a, b in zip(template.tokens, tokens)
+                ]
+            template.count += 1
+            template.first_seen = min(template.first_seen, seen)
+            template.last_seen = max(template.last_seen, seen)
+        return template, created
+
+    def add_logs(self, lines: List[str]) -> List[LogTemplate]:
+        """Mine a batch of lines; returns the distinct templates they touched."""
+        return [template for template, _ in self.add_logs_counted(lines)]
+
+    def add_logs_counted(self, lines: List[str]) -> List[Tuple[LogTemplate, int]]:
+        """add_logs, with how many of the lines each touched template received."""
+        touched: Dict[int, List] = {}
+        for line in lines:
+            template, _ = self.add_log(line)
+            entry = touched.get(template.id)
+            if entry is None:
+                touched[template.id] = [template, 1]
+            else:
+                entry[1] += 1
+        return [(template, count) for template, count in touched.values()]
+
+    def claim_unindexed(self, templates: Iterable[LogTemplate]) -> List[LogTemplate]:
+        """Reserve the unindexed templates no other job is indexing; returns them.
+
+        The caller must hand them back with release_indexing(), so a template
+        seen by two concurrent ingest jobs is embedded and indexed once.
+        """
+        with self._lock:
+            claimed = [t for t in templates if not t.indexed and t.id not in self._indexing]
+            self._indexing.update(t.id for t in claimed)
+        return claimed
+
+    def release_indexing(self, claimed: List[LogTemplate], indexed: List[LogTemplate]) -> None:
+        """End a claim: mark `indexed` as indexed; the rest can be claimed again."""
+        with self._lock:
+            for template in indexed:
+                template.indexed = True
+            self._indexing.difference_update(t.id for t in claimed)
+
+    def mark_unindexed(self, representatives: Iterable[str]) -> List[LogTemplate]:
+        """Flag templates whose vectors were deleted so their next line re-indexes them.
+
+        Returns the templates changed.
+        """
+        representatives = set(representatives)
+        with self._lock:
+            changed = [
+                t for t in self.templates.values() if t.indexed and t.representative in representatives
+            ]
+            for template in changed:
+                template.indexed = False
+        return changed
+
+    def load(self, records: List[Dict]) -> None:
+        """Restore templates previously exported with LogTemplate.to_dict()."""
+        with self._lock:
+            self.templates.clear()
+            self._tree.clear()
+            for record in records:
+                tokens = record["template"].split()
+                template = LogTemplate(record["id"], tokens, record["representative"], record["first_seen"])
+                template.count = record["count"]
+                template.last_seen = record["last_seen"]
+                template.indexed = bool(record["indexed"])
+                self.templates[template.id] = template
+                self._leaf(tokens).append(template)
+                self._next_id = max(self._next_id, template.id + 1)
+
+
+# Singleton instance
+template_miner = TemplateMiner()
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable, List, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls across threads.
+
+    The first caller for a key runs the work; callers arriving while it is
+    in flight wait on the same future and share its result or exception.
+    Nothing is cached once the call completes.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def _claim(self, keys: Sequence[Hashable]) -> Tuple[List[Hashable], Dict[Hashable, Future]]:
+        """Split keys into ones this caller now owns and futures of ones in flight."""
+        owned, waiting = [], {}
+        with self._lock:
+            for key in keys:
+                self.calls += 1
+                future = self._calls.get(key)
+                if future is None:
+                    self._calls[key] = Future()
+                    owned.append(key)
+                else:
+                    waiting[key] = future
+                    self.coalesced += 1
+        return owned, waiting
+
+    def _settle(self, key: Hashable, result=None, error: BaseException = None) -> None:
+        with self._lock:
+            future = self._calls.pop(key)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do_many(
+        self, keys: Sequence[Hashable], fn: Callable[[List[Hashable]], List[T]]
+    ) -> Dict[Hashable, T]:
+        """Run fn(owned_keys) -> results for keys nobody else is computing.
+
+        Keys must be distinct. Returns a result per key; waiting on another
+        caller's key re-raises that caller's exception.
+        """
+        owned, waiting = self._claim(keys)
+        results: Dict[Hashable, T] = {}
+        if owned:
+            try:
+                values = fn(owned)
+            except BaseException as e:
+                for key in owned:
+                    self._settle(key, error=e)
+                raise
+            for key, value in zip(owned, values):
+                self._settle(key, value)
+                results[key] = value
+        for key, future in waiting.items():
+            results[key] = future.result()
+        return results
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """Run fn() unless an identical call is in flight, then share its result."""
+        return self.do_many([key], lambda owned: [fn()])[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """Coalesce concurrent identical coroutine calls on one event loop.
+
+    The shared work runs as its own task and waiters are shielded, so a
+    caller that is cancelled (e.g. by a request timeout) does not cancel
+    the call for the others.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every waiter has gone
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Await fn() or an identical in-flight call; returns (result, coalesced)."""
+        self.calls += 1
+        task = self._tasks.get(key)
+        coalesced = task is not None
+        if coalesced:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task), coalesced
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._tasks)}
@@ -1,8 +1,77 @@
 import json
 import os
-from typing import Any, Dict, List
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+# Files shipped with the app (demo logs, legacy JSON history)
+BUNDLED_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+# Where runtime state is written; override to run isolated instances or load tests
+DATA_DIR = os.getenv("TRIAGE_DATA_DIR", BUNDLED_DATA_DIR)
+DB_PATH = os.path.join(DATA_DIR, "triage.db")
+
+# Legacy JSON files imported once into the database on first start
+LEGACY_LOGS_FILE = "logs.json"
+LEGACY_RESULTS_FILE = "results.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    seq INTEGER PRIMARY KEY,
+    message TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    created_at TEXT,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS templates (
+    id INTEGER PRIMARY KEY,
+    template TEXT NOT NULL,
+    representative TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    first_seen TEXT,
+    last_seen TEXT,
+    indexed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS log_segments (
+    first_seq INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL,
+    columns BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS log_terms (
+    kind TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at TEXT,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Filterable result columns, extracted from the result body on insert
+RESULT_COLUMNS = {
+    "severity_level": "$.analysis.severity_level",
+    "recommended_owner": "$.analysis.recommended_owner",
+}
+
+RESULT_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_results_severity ON results (severity_level, seq);
+CREATE INDEX IF NOT EXISTS idx_results_owner ON results (recommended_owner, seq);
+CREATE INDEX IF NOT EXISTS idx_results_created_at ON results (created_at);
+"""
+
+# Heavy fields dropped from results in the summary projection
+RESULT_DETAIL_FIELDS = ("logs", "similar_incidents")
 
 
 def ensure_data_dir():
@@ -10,9 +79,9 @@ def ensure_data_dir():
     os.makedirs(DATA_DIR, exist_ok=True)
 
 
-def read_json(filename: str) -> Any:
+def read_json(filename: str, directory: str = DATA_DIR) -> Any:
     """Read data from a JSON file in the data directory."""
-    filepath = os.path.join(DATA_DIR, filename)
+    filepath = os.path.join(directory, filename)
     if not os.path.exists(filepath):
         return []
     with open(filepath, "r", encoding="utf-8") as f:
@@ -27,30 +96,392 @@ def write_json(filename: str, data: Any) -> None:
         json.dump(data, f, indent=2, ensure_ascii=False)
 
 
-def append_to_json_list(filename: str, items: List[Any]) -> None:
-    """Append items to a JSON list file."""
-    existing = read_json(filename)
-    if not isinstance(existing, list):
-        existing = []
-    existing.extend(items)
-    write_json(filename, existing)
+def open_sqlite(db_path: str) -> sqlite3.Connection:
+    """Open a SQLite connection in WAL mode, creating parent directories."""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SQLiteStore:
+    """Append-only log and result store backed by SQLite in WAL mode.
+
+    Appends touch only the new rows, tail reads walk the primary key
+    backwards, and WAL lets readers proceed while a writer commits.
+    Each thread gets its own connection; writes are serialized.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, legacy_dir: Optional[str] = DATA_DIR):
+        self.db_path = db_path
+        self.legacy_dir = legacy_dir
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, creating the schema on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+
+        conn = open_sqlite(self.db_path)
+        self._local.conn = conn
+
+        with self._init_lock:
+            if not self._initialized:
+                conn.executescript(SCHEMA)
+                self._migrate_results(conn)
+                self._import_legacy(conn)
+                self._initialized = True
+        return conn
+
+    def _migrate_results(self, conn: sqlite3.Connection) -> None:
+        """Add and backfill the filter columns on databases created without them."""
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+        with conn:
+            for column, path in RESULT_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE results ADD COLUMN {column} TEXT")
+                    conn.execute(
+                        f"UPDATE results SET {column} = json_extract(body, ?)", (path,)
+                    )
+            conn.executescript(RESULT_INDEXES)
+
+    def _import_legacy(self, conn: sqlite3.Connection) -> None:
+        """Import logs.json/results.json once so existing history is kept."""
+        if self.legacy_dir is None:
+            return
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+            return
+
+        def load(filename: str) -> List[Any]:
+            path = os.path.join(self.legacy_dir, filename)
+            if not os.path.exists(path):
+                return []
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: could not import {filename}: {e}")
+                return []
+            return data if isinstance(data, list) else []
+
+        with conn:
+            conn.executemany(
+                "INSERT INTO logs (message) VALUES (?)",
+                ((str(log),) for log in load(LEGACY_LOGS_FILE)),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO results "
+                "(id, created_at, severity_level, recommended_owner, body) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    self._result_row(r)
+                    for r in load(LEGACY_RESULTS_FILE)
+                    if isinstance(r, dict) and r.get("id")
+                ),
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_imported', '1')")
+
+    def append_logs(
+        self,
+        logs: List[str],
+        encode_columns: Optional[Callable[[int], Tuple[bytes, List[Tuple[str, int, str]]]]] = None,
+    ) -> Optional[int]:
+        """Append a batch of log messages in a single transaction.
+
+        Returns the seq of the first appended log. If given, encode_columns
+        (first_seq) -> (segment blob, dictionary terms used) is called inside
+        the transaction so the structured columns commit with the logs.
+        """
+        if not logs:
+            return None
+        conn = self._connect()
+        with self._write_lock, conn:
+            conn.executemany("INSERT INTO logs (message) VALUES (?)", ((log,) for log in logs))
+            # Rows of one executemany get consecutive seqs
+            first_seq = conn.execute("SELECT last_insert_rowid()").fetchone()[0] - len(logs) + 1
+            if encode_columns is not None:
+                blob, terms = encode_columns(first_seq)
+                conn.execute(
+                    "INSERT INTO log_segments (first_seq, count, columns) VALUES (?, ?, ?)",
+                    (first_seq, len(logs), blob),
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO log_terms (kind, id, value) VALUES (?, ?, ?)", terms
+                )
+        return first_seq
+
+    def add_log_segment(
+        self, first_seq: int, count: int, blob: bytes, terms: List[Tuple[str, int, str]]
+    ) -> None:
+        """Store structured columns for logs that already exist (backfill)."""
+        conn = self._connect()
+        with self._write_lock, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO log_segments (first_seq, count, columns) VALUES (?, ?, ?)",
+                (first_seq, count, blob),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO log_terms (kind, id, value) VALUES (?, ?, ?)", terms
+            )
+
+    def read_log_segments(self) -> List[Tuple[int, int, bytes]]:
+        """Return all (first_seq, count, columns blob) segments in seq order."""
+        return self._connect().execute(
+            "SELECT first_seq, count, columns FROM log_segments ORDER BY first_seq"
+        ).fetchall()
+
+    def read_log_terms(self) -> List[Tuple[str, int, str]]:
+        """Return the dictionary terms used by the encoded log columns."""
+        return self._connect().execute("SELECT kind, id, value FROM log_terms").fetchall()
+
+    def iter_logs_between(self, start_seq: int, end_seq: int, batch: int = 10_000):
+        """Yield lists of (seq, message) with start_seq <= seq < end_seq, in order."""
+        conn = self._connect()
+        while True:
+            rows = conn.execute(
+                "SELECT seq, message FROM logs WHERE seq >= ? AND seq < ? ORDER BY seq LIMIT ?",
+                (start_seq, end_seq, batch),
+            ).fetchall()
+            if not rows:
+                return
+            yield rows
+            start_seq = rows[-1][0] + 1
+
+    def logs_by_seq(self, seqs: List[int]) -> List[str]:
+        """Return the messages of the given seqs, in seq order."""
+        conn = self._connect()
+        messages = []
+        for start in range(0, len(seqs), 500):
+            chunk = [int(seq) for seq in seqs[start:start + 500]]
+            placeholders = ",".join("?" * len(chunk))
+            messages.extend(
+                row[0]
+                for row in conn.execute(
+                    f"SELECT message FROM logs WHERE seq IN ({placeholders}) ORDER BY seq", chunk
+                )
+            )
+        return messages
+
+    def tail_logs(self, limit: Optional[int] = None) -> List[str]:
+        """Return the most recent `limit` logs (all if None), oldest first."""
+        conn = self._connect()
+        if limit is None:
+            rows = conn.execute("SELECT message FROM logs ORDER BY seq").fetchall()
+            return [row[0] for row in rows]
+        rows = conn.execute(
+            "SELECT message FROM logs ORDER BY seq DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [row[0] for row in reversed(rows)]
+
+    def count_logs(self) -> int:
+        """Return the number of stored logs."""
+        return self._connect().execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+
+    def upsert_templates(self, templates: List[Dict]) -> None:
+        """Insert or update mined log templates."""
+        if not templates:
+            return
+        conn = self._connect()
+        with self._write_lock, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO templates "
+                "(id, template, representative, count, first_seen, last_seen, indexed) "
+                "VALUES (:id, :template, :representative, :count, :first_seen, :last_seen, :indexed)",
+                templates,
+            )
 
+    def read_templates(self) -> List[Dict]:
+        """Return all mined log templates."""
+        conn = self._connect()
+        cursor = conn.execute(
+            "SELECT id, template, representative, count, first_seen, last_seen, indexed "
+            "FROM templates ORDER BY id"
+        )
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
-def read_logs() -> List[str]:
-    """Read all stored log messages."""
-    return read_json("logs.json")
+    @staticmethod
+    def _result_row(result: Dict) -> tuple:
+        analysis = result.get("analysis") or {}
+        return (
+            result["id"],
+            result.get("created_at"),
+            analysis.get("severity_level"),
+            analysis.get("recommended_owner"),
+            json.dumps(result, ensure_ascii=False),
+        )
+
+    def append_result(self, result: Dict) -> None:
+        """Append a single analysis result, indexing its id and filter columns."""
+        conn = self._connect()
+        with self._write_lock, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results "
+                "(id, created_at, severity_level, recommended_owner, body) "
+                "VALUES (?, ?, ?, ?, ?)",
+                self._result_row(result),
+            )
+
+    def get_result(self, result_id: str) -> Optional[Dict]:
+        """Look up a single result by id through the unique index."""
+        row = self._connect().execute(
+            "SELECT body FROM results WHERE id = ?", (result_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query_results(
+        self,
+        cursor: Optional[int] = None,
+        limit: int = 50,
+        severity_level: Optional[str] = None,
+        recommended_owner: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        summary_only: bool = False,
+    ) -> Tuple[List[Dict], Optional[int], Optional[int]]:
+        """Return one page of results, newest first.
+
+        `cursor` is the `next_cursor` returned by the previous page.
+        Returns (results, next_cursor, total_matching). The total costs a
+        count over every match, so it is only computed for the first page
+        (None for later ones).
+        """
+        clauses, params = [], []
+        if severity_level:
+            clauses.append("severity_level = ?")
+            params.append(severity_level)
+        if recommended_owner:
+            clauses.append("recommended_owner = ?")
+            params.append(recommended_owner)
+        if created_after:
+            clauses.append("created_at >= ?")
+            params.append(created_after)
+        if created_before:
+            clauses.append("created_at < ?")
+            params.append(created_before)
+
+        conn = self._connect()
+        where = " AND ".join(clauses) or "1"
+        total = None
+        if cursor is None:
+            total = conn.execute(f"SELECT COUNT(*) FROM results WHERE {where}", params).fetchone()[0]
+        else:
+            where += " AND seq < ?"
+            params.append(cursor)
+        rows = conn.execute(
+            f"SELECT seq, body FROM results WHERE {where} ORDER BY seq DESC LIMIT ?",
+            params + [limit + 1],
+        ).fetchall()
+
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        results = []
+        for _, body in rows[:limit]:
+            result = json.loads(body)
+            if summary_only:
+                for field in RESULT_DETAIL_FIELDS:
+                    result.pop(field, None)
+            results.append(result)
+        return results, next_cursor, total
+
+    def tail_results(self, limit: Optional[int] = None) -> List[Dict]:
+        """Return the most recent `limit` results (all if None), oldest first."""
+        conn = self._connect()
+        if limit is None:
+            rows = conn.execute("SELECT body FROM results ORDER BY seq").fetchall()
+            return [json.loads(row[0]) for row in rows]
+        rows = conn.execute(
+            "SELECT body FROM results ORDER BY seq DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    def save_job(self, job: Dict) -> None:
+        """Insert or update an ingestion job record."""
+        conn = self._connect()
+        with self._write_lock, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, status, created_at, body) VALUES (?, ?, ?, ?)",
+                (job["id"], job["status"], job.get("created_at"), json.dumps(job)),
+            )
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Return the job with the given id, or None."""
+        row = self._connect().execute("SELECT body FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def jobs_with_status(self, statuses: List[str]) -> List[Dict]:
+        """Return jobs in any of the given statuses, oldest first."""
+        placeholders = ",".join("?" * len(statuses))
+        rows = self._connect().execute(
+            f"SELECT body FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at",
+            statuses,
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def count_jobs(self, statuses: List[str]) -> Dict[str, int]:
+        """Number of jobs in each of the given statuses (0 if none)."""
+        placeholders = ",".join("?" * len(statuses))
+        rows = self._connect().execute(
+            f"SELECT status, COUNT(*) FROM jobs WHERE status IN ({placeholders}) GROUP BY status",
+            statuses,
+        ).fetchall()
+        counts = dict(rows)
+        return {status: counts.get(status, 0) for status in statuses}
+
+
+# Singleton instance
+store = SQLiteStore()
+
+
+def read_logs(limit: Optional[int] = None) -> List[str]:
+    """Read stored log messages, optionally only the last `limit`."""
+    return store.tail_logs(limit)
 
 
 def save_logs(logs: List[str]) -> None:
     """Save log messages (append to existing)."""
-    append_to_json_list("logs.json", logs)
+    store.append_logs(logs)
 
 
-def read_results() -> List[Dict]:
-    """Read all stored analysis results."""
-    return read_json("results.json")
+def read_results(limit: Optional[int] = None) -> List[Dict]:
+    """Read stored analysis results, optionally only the last `limit`."""
+    return store.tail_results(limit)
 
 
 def save_result(result: Dict) -> None:
     """Save a single analysis result."""
-    append_to_json_list("results.json", [result])
+    store.append_result(result)
+
+
+def save_templates(templates: List[Dict]) -> None:
+    """Persist mined log templates and their occurrence counts."""
+    store.upsert_templates(templates)
+
+
+def read_templates() -> List[Dict]:
+    """Read all mined log templates."""
+    return store.read_templates()
+
+
+def get_result(result_id: str) -> Optional[Dict]:
+    """Return the analysis result with the given id, or None."""
+    return store.get_result(result_id)
+
+
+def query_results(**filters) -> Tuple[List[Dict], Optional[int], Optional[int]]:
+    """Return a filtered page of analysis results (see SQLiteStore.query_results)."""
+    return store.query_results(**filters)
+
+
+def save_job(job: Dict) -> None:
+    """Insert or update an ingestion job record."""
+    store.save_job(job)
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """Return the ingestion job with the given id, or None."""
+    return store.get_job(job_id)
@@ -0,0 +1,68 @@
+"""Batch incident analysis against a loop of single /analyze_incident calls.
+
+Usage (from backend/):
+    python -m benchmarks.bench_batch [incidents] [llm_latency_ms] [embedding_latency_ms]
+
+Runs the app in-process with fake embedding and LLM backends (caches off)
+and triages two equal sets of incidents: one request at a time, as a client
+script would, and as one /analyze_incident/batch request. The batch
+shares a single embedding call and index search, then overlaps
+BATCH_LLM_CONCURRENCY LLM calls. httpx's ASGI transport buffers the
+response, so only whole-batch time is measured here.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ["TRIAGE_DATA_DIR"] = tempfile.mkdtemp(prefix="triage_batch_")
+os.environ["EMBEDDING_BACKEND"] = "fake"
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["FAKE_LLM_LATENCY_MS"] = sys.argv[2] if len(sys.argv) > 2 else "200"
+os.environ["FAKE_EMBEDDING_LATENCY_MS"] = sys.argv[3] if len(sys.argv) > 3 else "50"
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "0")
+os.environ.setdefault("ANALYSIS_CACHE_ENABLED", "0")
+
+import httpx  # noqa: E402  (benchmark-only dependency)
+
+from app.main import app  # noqa: E402
+from app.routes.upload import ingest_logs  # noqa: E402
+
+
+def incident(i: int) -> str:
+    # Numbers are masked out of fingerprints; letters keep incidents distinct
+    tag = "".join(chr(ord("a") + int(digit)) for digit in str(i))
+    return f"ERROR payment timeout in shard {tag}"
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    ingest_logs([f"ERROR [Service{i % 20}] failure code={i}" for i in range(200)])
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        start = time.perf_counter()
+        for i in range(count):
+            response = await client.post("/analyze_incident", json={"query": incident(i)})
+            response.raise_for_status()
+        looped = time.perf_counter() - start
+
+        # Distinct from the loop's incidents so nothing is coalesced or cached
+        body = {"incidents": [{"id": str(i), "query": incident(count + i)} for i in range(count)]}
+        start = time.perf_counter()
+        response = await client.post("/analyze_incident/batch", json=body)
+        response.raise_for_status()
+        lines = [json.loads(raw) for raw in response.text.splitlines() if raw]
+        batched = time.perf_counter() - start
+        errors = sum("error" in line for line in lines)
+
+    print(f"{'mode':<8} {'incidents/s':>12} {'total s':>8}")
+    print(f"{'loop':<8} {count / looped:>12.1f} {looped:>8.2f}")
+    print(f"{'batch':<8} {count / batched:>12.1f} {batched:>8.2f}")
+    print(f"\nspeedup {looped / batched:.1f}x, {len(lines)} lines, {errors} errors")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
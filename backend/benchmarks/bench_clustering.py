@@ -0,0 +1,68 @@
+"""Throughput and purity of incremental incident clustering during an alert storm.
+
+Usage (from backend/):
+    python -m benchmarks.bench_clustering [lines] [templates] [incidents] [dim]
+
+Simulates ingest batches of 5000 lines drawn Zipf-like from `templates`
+mined templates, which appear gradually, each belonging to one of
+`incidents` underlying incidents (Gaussian blobs of embeddings). Reports
+clustering throughput on one core, per-batch latency, the number of
+clusters formed and their purity (fraction of templates that share their
+cluster's majority incident).
+"""
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from app.ai.clustering import IncidentClusters
+from app.utils.preprocessing import LogTemplate
+
+BATCH_LINES = 5000
+
+
+def main():
+    num_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    num_templates = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    num_incidents = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    dim = int(sys.argv[4]) if len(sys.argv) > 4 else 768
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((num_incidents, dim)).astype(np.float32)
+    labels = rng.integers(0, num_incidents, num_templates)
+    vectors = centers[labels] + 0.3 * rng.standard_normal((num_templates, dim)).astype(np.float32)
+    templates = [
+        LogTemplate(i, [f"t{i}"], f"2024-01-01T00:00:00Z ERROR [svc-{labels[i]}] event {i}", "")
+        for i in range(num_templates)
+    ]
+    weights = 1.0 / np.arange(1, num_templates + 1)
+
+    clusters = IncidentClusters(window_seconds=3600)
+    elapsed = 0.0
+    num_batches = num_lines // BATCH_LINES
+    for b in range(num_batches):
+        # Templates come into existence over the first half of the storm
+        live = max(1, min(num_templates, int(num_templates * 2 * (b + 1) / num_batches)))
+        p = weights[:live] / weights[:live].sum()
+        counts = np.bincount(rng.choice(live, BATCH_LINES, p=p), minlength=live)
+        batch = [(templates[i], int(counts[i])) for i in np.flatnonzero(counts)]
+        batch_vectors = {t.id: vectors[t.id] for t, _ in batch}
+        start = time.perf_counter()
+        clusters.add(batch, batch_vectors, now=1000.0 + b)
+        elapsed += time.perf_counter() - start
+
+    purity = []
+    for cluster in clusters._clusters:
+        members = Counter(labels[t] for t in cluster.members)
+        purity.append((members.most_common(1)[0][1], sum(members.values())))
+    stats = clusters.stats()
+    print(f"{num_batches * BATCH_LINES} lines, {num_templates} templates, {num_incidents} incidents, dim {dim}")
+    print(f"clustering: {num_batches * BATCH_LINES / elapsed:,.0f} lines/s "
+          f"(batch p50 {stats['batch_latency']['p50_ms']} ms, p95 {stats['batch_latency']['p95_ms']} ms)")
+    print(f"clusters: {stats['active_clusters']}, purity "
+          f"{sum(m for m, _ in purity) / sum(n for _, n in purity):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Stress a vector store with parallel uploads and searches.
+
+Usage (from backend/):
+    python -m benchmarks.bench_concurrency [index_type] [dim] [writers] [readers] [seconds] [preload]
+
+Preloads `preload` random unit vectors, then measures search throughput
+and latency with `readers` threads, first alone and then while `writers`
+threads keep adding batches (which also triggers WAL appends, background
+snapshots and, for flat, the swap to the memory-mapped snapshot). Every
+search queries a vector whose add had already returned, so an exact (flat)
+store must return that vector's own text at distance ~0; with any index
+type each hit's distance is checked against the vector its text belongs
+to. Any mismatch (a dropped hit or a text paired with the wrong vector)
+is counted as an error.
+"""
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app.db.vector_store import VectorStore
+
+BATCH = 256
+K = 5
+
+
+def unit_vectors(rng: np.random.Generator, count: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def run(store: VectorStore, known: Dict[str, np.ndarray], texts: List[str], writers: int,
+        readers: int, seconds: float, dim: int, exact: bool) -> Dict:
+    """Run readers (and writers, if any) for `seconds`; returns the counters."""
+    lock = threading.Lock()  # guards `texts`, the list of committed texts
+    stop = threading.Event()
+    counters = {"searches": 0, "added": 0, "errors": 0, "latencies": []}
+
+    def writer(n: int) -> None:
+        rng = np.random.default_rng(1000 + n)
+        batch = 0
+        while not stop.is_set():
+            vectors = unit_vectors(rng, BATCH, dim)
+            names = [f"writer {n} batch {batch} vector {i}" for i in range(BATCH)]
+            for name, vector in zip(names, vectors):
+                known[name] = vector
+            store.add_vectors(vectors, names)
+            with lock:
+                texts.extend(names)
+                counters["added"] += BATCH
+            batch += 1
+
+    def reader(n: int) -> None:
+        rng = np.random.default_rng(n)
+        latencies, errors, searches = [], 0, 0
+        while not stop.is_set():
+            with lock:
+                name = texts[int(rng.integers(len(texts)))]
+            query = known[name]
+            started = time.perf_counter()
+            hits = store.search_similar(query, K)
+            latencies.append(time.perf_counter() - started)
+            searches += 1
+            if not hits or (exact and (hits[0][0] != name or hits[0][1] > 1e-3)):
+                errors += 1
+                continue
+            for text, distance in hits:
+                if abs(float(((known[text] - query) ** 2).sum()) - distance) > 1e-3:
+                    errors += 1
+                    break
+        with lock:
+            counters["searches"] += searches
+            counters["errors"] += errors
+            counters["latencies"].extend(latencies)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return counters
+
+
+def report(label: str, counters: Dict, seconds: float) -> None:
+    latencies = np.array(counters["latencies"]) * 1000
+    print(
+        f"{label:<16} {counters['searches'] / seconds:>9.1f} {np.percentile(latencies, 50):>8.2f} "
+        f"{np.percentile(latencies, 95):>8.2f} {counters['added'] / seconds:>9.1f} {counters['errors']:>7}"
+    )
+
+
+def main():
+    index_type = sys.argv[1] if len(sys.argv) > 1 else "flat"
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    writers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    readers = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+    seconds = float(sys.argv[5]) if len(sys.argv) > 5 else 10.0
+    preload = int(sys.argv[6]) if len(sys.argv) > 6 else 50_000
+
+    store = VectorStore(index_type, dim, "none", tempfile.mkdtemp(prefix="triage_concurrency_"))
+    store.load_index()
+    rng = np.random.default_rng(0)
+    vectors = unit_vectors(rng, preload, dim)
+    texts = [f"preload vector {i}" for i in range(preload)]
+    known = dict(zip(texts, vectors))
+    for start in range(0, preload, 10_000):
+        store.add_vectors(vectors[start:start + 10_000], texts[start:start + 10_000])
+    store.save_index()
+
+    print(f"{index_type}, dim {dim}, {preload} preloaded, {readers} readers, "
+          f"{writers} writers x {BATCH}-vector batches, {seconds:.0f}s each")
+    print(f"{'':<16} {'search/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'adds/s':>9} {'errors':>7}")
+    exact = index_type == "flat"
+    report("searches only", run(store, known, texts, 0, readers, seconds, dim, exact), seconds)
+    report("with uploads", run(store, known, texts, writers, readers, seconds, dim, exact), seconds)
+    stats = store.stats()
+    print(f"{stats['vectors']} vectors, {stats['commits']} commits, "
+          f"{stats['batches_per_commit']} batches per commit")
+    store.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Memory, search latency and recall@5 at reduced dimensions and quantization.
+
+Usage (from backend/):
+    python -m benchmarks.bench_dimensions [num_vectors] [num_queries] [texts.json]
+
+Recall is measured against exact float32 search at 3072 dimensions. By
+default the vectors are synthetic, with variance decaying across dimensions
+the way Matryoshka embeddings concentrate information in leading
+components. Pass a JSON list of texts to embed real data with the
+configured backend instead (needs GEMINI_API_KEY).
+"""
+import json
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from app.ai import embeddings
+from app.db.vector_store import build_index
+
+K = 5
+DIMS = (3072, 768, 256)
+QUANTIZATIONS = ("none", "fp16", "int8")
+
+
+def synthetic(n: int, rng: np.random.Generator) -> np.ndarray:
+    scale = (1.0 / np.sqrt(1.0 + np.arange(3072) / 64.0)).astype(np.float32)
+    centers = rng.standard_normal((max(n // 100, 10), 3072)).astype(np.float32) * scale
+    labels = rng.integers(0, len(centers), n)
+    noise = 0.5 * rng.standard_normal((n, 3072)).astype(np.float32) * scale
+    return embeddings.normalize_rows(centers[labels] + noise)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = np.random.default_rng(0)
+
+    if len(sys.argv) > 3:
+        with open(sys.argv[3], "r", encoding="utf-8") as f:
+            texts = json.load(f)
+        vectors = [v for v in embeddings.embed_texts(texts) if v is not None]
+        data = embeddings.normalize_rows(np.array(vectors, dtype=np.float32))
+        num_queries = min(num_queries, len(data) // 5)
+    else:
+        data = synthetic(n, rng)
+
+    picks = rng.choice(len(data), num_queries, replace=False)
+    queries = embeddings.normalize_rows(
+        data[picks] + 0.01 * rng.standard_normal((num_queries, data.shape[1])).astype(np.float32)
+    )
+    _, truth = faiss.knn(queries, data, K)
+
+    print(f"{'dim':>5} {'quant':>6} {'memory MB':>10} {'ms/query':>9} {'recall@5':>9}")
+    for dim in DIMS:
+        base = embeddings.normalize_rows(data[:, :dim])
+        q = embeddings.normalize_rows(queries[:, :dim])
+        for quantization in QUANTIZATIONS:
+            index = build_index("flat", dim, quantization)
+            if not index.is_trained:
+                index.train(base)
+            index.add(base)
+
+            start = time.perf_counter()
+            _, found = index.search(q, K)
+            ms = (time.perf_counter() - start) * 1000 / num_queries
+
+            recall = np.mean([len(set(f) & set(t)) / K for f, t in zip(found, truth)])
+            memory = len(faiss.serialize_index(index)) / 1e6
+            print(f"{dim:>5} {quantization:>6} {memory:>10.1f} {ms:>9.3f} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
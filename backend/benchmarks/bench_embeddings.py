@@ -0,0 +1,36 @@
+"""Embedding pipeline throughput against the local fake backend.
+
+Usage (from backend/):
+    python -m benchmarks.bench_embeddings [num_texts] [latency_ms]
+
+latency_ms simulates the per-call round-trip of the Gemini API.
+"""
+import os
+import sys
+import time
+
+from app.ai import embeddings
+
+
+def main():
+    num_texts = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    os.environ["FAKE_EMBEDDING_LATENCY_MS"] = sys.argv[2] if len(sys.argv) > 2 else "200"
+    embeddings.set_embedding_backend(embeddings.fake_backend)
+
+    texts = [f"ERROR [OrderService] Order execution timeout id={i}" for i in range(num_texts)]
+
+    print(f"{'batch':>6} {'concurrency':>12} {'texts/s':>10} {'failed':>7}")
+    for batch_size in (1, 100):
+        for concurrency in (1, 4, 16):
+            sample = texts if batch_size > 1 else texts[: min(num_texts, 100)]
+            start = time.perf_counter()
+            result = embeddings.embed_texts(
+                sample, batch_size=batch_size, concurrency=concurrency
+            )
+            elapsed = time.perf_counter() - start
+            failed = sum(1 for vector in result if vector is None)
+            print(f"{batch_size:>6} {concurrency:>12} {len(sample) / elapsed:>10.0f} {failed:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Latency and recall of metadata-filtered vector search at several selectivities.
+
+Usage (from backend/):
+    python -m benchmarks.bench_filtered_search [num_vectors] [dim] [num_queries]
+
+Fills a VectorStore in a temporary data directory with clustered vectors
+tagged with a timestamp (90 days), level, one of 50 sources and one of 100
+upload ids, then compares each filter against unfiltered search. Recall is
+measured against exact search over the matching vectors. "post-filter" is
+the naive alternative: fetch 20x k unfiltered neighbours and drop the ones
+that do not match.
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+os.environ["TRIAGE_DATA_DIR"] = tempfile.mkdtemp(prefix="triage_filter_")
+os.environ.setdefault("VECTOR_SNAPSHOT_INTERVAL", "1000000000")
+
+import faiss  # noqa: E402
+import numpy as np  # noqa: E402
+
+from app.db.vector_store import VectorStore  # noqa: E402
+from benchmarks.bench_vector_index import clustered_vectors  # noqa: E402
+
+K = 5
+DAY = 86400.0
+NOW = 1.72e9
+
+
+def iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+def filters(ts, level, source, upload):
+    """name -> (search_similar keyword filters, matching mask)."""
+    return {
+        "none": ({}, np.ones(len(ts), dtype=bool)),
+        "level>=WARNING": ({"min_level": "WARNING"}, level >= 3),
+        "last 30 days": ({"since": iso(NOW - 30 * DAY)}, ts >= NOW - 30 * DAY),
+        "source": ({"source": "service-7"}, source == 7),
+        "upload": ({"upload_id": "upload-42"}, upload == 42),
+        "source+7 days": (
+            {"source": "service-7", "since": iso(NOW - 7 * DAY)},
+            (source == 7) & (ts >= NOW - 7 * DAY),
+        ),
+    }
+
+
+def run(store: VectorStore, data: np.ndarray, queries: np.ndarray, cases, label: str) -> None:
+    print(f"\n{label}")
+    print(f"{'filter':<16} {'matches':>9} {'ms/query':>9} {'recall@5':>9} {'post-filter recall':>19}")
+    for name, (kwargs, mask) in cases.items():
+        ids = np.flatnonzero(mask)
+
+        start = time.perf_counter()
+        found = [store.search_similar(q, K, **kwargs) for q in queries]
+        elapsed = (time.perf_counter() - start) / len(queries) * 1000
+
+        _, truth = faiss.knn(queries, data[ids], K)
+        truth_texts = [{f"v{ids[i]}" for i in row} for row in truth]
+        recall = np.mean([len({t for t, _ in f} & t) / K for f, t in zip(found, truth_texts)])
+
+        post = []
+        for q, t in zip(queries, truth_texts):
+            over = store.search_similar(q, 20 * K)
+            kept = [text for text, _ in over if mask[int(text[1:])]][:K]
+            post.append(len(set(kept) & t) / K)
+        print(f"{name:<16} {len(ids):>9} {elapsed:>9.2f} {recall:>9.3f} {np.mean(post):>19.3f}")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 768
+    num_queries = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+
+    rng = np.random.default_rng(0)
+    data = clustered_vectors(n, dim, rng)
+    queries = data[rng.choice(n, num_queries, replace=False)]
+    ts = NOW - rng.uniform(0, 90 * DAY, n)
+    level = rng.choice([1, 2, 3, 4, 5], n, p=[0.1, 0.4, 0.25, 0.2, 0.05])
+    source = rng.integers(0, 50, n)
+    upload = rng.integers(0, 100, n)
+    attributes = list(zip(
+        ts.tolist(),
+        level.tolist(),
+        [f"service-{i}" for i in source],
+        [f"upload-{i}" for i in upload],
+    ))
+    cases = filters(ts, level, source, upload)
+    texts = [f"v{i}" for i in range(n)]
+
+    for index_type in ("flat", "hnsw"):
+        store = VectorStore(index_type, dim)
+        store._persistence.directory = tempfile.mkdtemp(dir=os.environ["TRIAGE_DATA_DIR"])
+        for start in range(0, n, 10_000):
+            store.add_vectors(
+                data[start:start + 10_000], texts[start:start + 10_000], attributes[start:start + 10_000]
+            )
+        run(store, data, queries, cases, f"{index_type} (heap)")
+        if index_type == "flat":
+            # Snapshot, then reopen as the memory-mapped index used in production
+            store.save_index()
+            store.load_index()
+            run(store, data, queries, cases, "flat (mmap)")
+
+
+if __name__ == "__main__":
+    main()
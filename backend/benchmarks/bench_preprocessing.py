@@ -0,0 +1,90 @@
+"""Lines per second of log normalization for text, CSV, NDJSON and JSON inputs.
+
+Usage (from backend/):
+    python -m benchmarks.bench_preprocessing [num_lines] [processes]
+
+"per-line" is the previous approach, clean_text(sanitize_input(line)) on
+each line; "chunked" is the batched engine used by uploads. With processes
+> 1, the text input is also normalized across a process pool.
+"""
+import io
+import json
+import sys
+import time
+
+from app.utils import preprocessing
+from app.utils.preprocessing import clean_text, sanitize_input
+
+
+def make_lines(n: int):
+    return [
+        f"2024-03-01T12:{i % 60:02d}:{i % 60:02d}Z ERROR  [OrderService]\tOrder {i} "
+        f"execution timeout <b>venue=LSE</b> latency_ms={i % 997}   user=trader{i % 50}"
+        for i in range(n)
+    ]
+
+
+def per_line(lines):
+    out = []
+    for line in lines:
+        cleaned = clean_text(sanitize_input(line))
+        if cleaned:
+            out.append(cleaned)
+    return out
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    lines = make_lines(n)
+    inputs = {
+        "text": ("incident.log", "\n".join(lines).encode()),
+        "csv": ("incident.csv", "\n".join(f'{i},ERROR,"{line}"' for i, line in enumerate(lines)).encode()),
+        "ndjson": ("incident.ndjson", "\n".join(json.dumps({"message": line}) for line in lines).encode()),
+    }
+
+    print(f"{'input':>8} {'engine':>16} {'lines/s':>12}")
+    baseline, elapsed = timed(lambda: per_line(lines))
+    print(f"{'lines':>8} {'per-line':>16} {n / elapsed:>12,.0f}")
+    chunked, elapsed = timed(lambda: preprocessing.normalize_messages(lines))
+    assert chunked == baseline
+    print(f"{'lines':>8} {'chunked':>16} {n / elapsed:>12,.0f}")
+
+    for name, (filename, data) in inputs.items():
+        result, elapsed = timed(
+            lambda: list(preprocessing.iter_upload_logs(io.BytesIO(data), filename))
+        )
+        assert len(result) == n, (name, len(result))
+        print(f"{name:>8} {'stream':>16} {n / elapsed:>12,.0f}")
+
+    # JSON arrays are parsed whole (size-capped) and normalized in one batch
+    array = json.dumps(lines)
+    _, elapsed = timed(
+        lambda: preprocessing.normalize_messages(str(item) for item in json.loads(array) if item)
+    )
+    print(f"{'json':>8} {'chunked':>16} {n / elapsed:>12,.0f}")
+
+    if processes > 1:
+        list(preprocessing.normalize_blocks(["warm up"], processes))  # start the pool
+        # Smaller blocks so every worker gets several
+        text = inputs["text"][1].decode()
+        step = max(len(text) // (processes * 8), 1)
+        pieces, start = [], 0
+        while start < len(text):
+            end = text.find("\n", start + step)
+            end = len(text) if end == -1 else end
+            pieces.append(text[start:end])
+            start = end + 1
+        result, elapsed = timed(lambda: list(preprocessing.normalize_blocks(pieces, processes)))
+        assert len(result) == n
+        print(f"{'text':>8} {f'{processes} processes':>16} {n / elapsed:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
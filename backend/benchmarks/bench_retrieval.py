@@ -0,0 +1,105 @@
+"""Latency of dense, hybrid and lexical similar-incident retrieval.
+
+Usage (from backend/):
+    python -m benchmarks.bench_retrieval [num_texts] [dim] [embedding_latency_ms]
+
+Indexes synthetic log lines carrying error codes, hostnames and symbols
+with the fake embedding backend, then queries with the code and host of
+a random line. "search" is the in-process search alone; "end to end" adds
+the query embedding call (simulated with embedding_latency_ms), which
+lexical retrieval skips. hit@5 is the fraction of queries whose source
+line is in the top 5; fake embeddings carry no meaning, so dense hits
+here only show how much the lexical side contributes to hybrid.
+"""
+import os
+import sys
+import tempfile
+import time
+
+os.environ["TRIAGE_DATA_DIR"] = tempfile.mkdtemp(prefix="triage_retrieval_")
+os.environ["EMBEDDING_BACKEND"] = "fake"
+os.environ["EMBEDDING_CACHE_ENABLED"] = "0"
+os.environ.setdefault("VECTOR_SNAPSHOT_INTERVAL", "1000000000")
+
+import numpy as np  # noqa: E402
+
+from app.ai import embeddings  # noqa: E402
+from app.db.vector_store import VectorStore  # noqa: E402
+
+K = 5
+SYMBOLS = ["AAPL", "MSFT", "TSLA", "BTC/USD", "ETH/USD", "EUR/GBP", "NVDA", "AMZN"]
+MESSAGES = [
+    "order rejected by risk engine",
+    "connection reset by peer",
+    "settlement batch timed out",
+    "market data feed stale",
+    "matching engine queue backlog",
+]
+
+
+def make_texts(n: int, rng: np.random.Generator):
+    texts = []
+    for i in range(n):
+        texts.append(
+            f"ERROR [{rng.choice(['orders', 'risk', 'payments', 'gateway'])}] "
+            f"{MESSAGES[i % len(MESSAGES)]} symbol={SYMBOLS[i % len(SYMBOLS)]} "
+            f"code=ERR-{1000 + i % 9000} host=node-{i // 7:05d}.prod"
+        )
+    return texts
+
+
+def percentile_ms(samples, p):
+    return float(np.percentile(samples, p) * 1000)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 768
+    embedding_ms = sys.argv[3] if len(sys.argv) > 3 else "150"
+    embeddings.EMBEDDING_DIM = dim
+
+    rng = np.random.default_rng(0)
+    texts = make_texts(n, rng)
+    store = VectorStore("flat", dim)
+    store._persistence.directory = os.path.join(os.environ["TRIAGE_DATA_DIR"], "vectors")
+    start = time.perf_counter()
+    for offset in range(0, n, 10_000):
+        chunk = texts[offset:offset + 10_000]
+        store.add_vectors(embeddings.generate_embeddings_batch(chunk), chunk)
+    print(f"Indexed {n} texts in {time.perf_counter() - start:.1f}s "
+          f"({store.lexical.stats()['terms']} BM25 terms)")
+
+    targets = rng.choice(n, 200, replace=False)
+    queries = []
+    for i in targets:
+        code, host = texts[i].split("code=")[1].split(" host=")
+        queries.append((int(i), f"{code} on {host}"))
+
+    os.environ["FAKE_EMBEDDING_LATENCY_MS"] = embedding_ms
+    print(f"\n{'mode':<9} {'search p50':>11} {'search p95':>11} {'e2e p50':>9} {'hit@5':>7}")
+    for mode in ("dense", "hybrid", "lexical"):
+        search_times, total_times, hits = [], [], 0
+        for target, query in queries:
+            started = time.perf_counter()
+            vector = None
+            if mode != "lexical":
+                vector = embeddings.generate_query_embedding(query)
+            searched = time.perf_counter()
+            if mode == "dense":
+                results = store.search_similar(vector, K)
+            elif mode == "hybrid":
+                results = store.search_hybrid(vector, query, K)
+            else:
+                results = store.search_lexical(query, K)
+            finished = time.perf_counter()
+            search_times.append(finished - searched)
+            total_times.append(finished - started)
+            hits += texts[target] in {text for text, _ in results}
+        print(
+            f"{mode:<9} {percentile_ms(search_times, 50):>9.2f}ms {percentile_ms(search_times, 95):>9.2f}ms "
+            f"{percentile_ms(total_times, 50):>7.1f}ms {hits / len(queries):>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Search latency and throughput of a sharded vector store by shard count.
+
+Usage (from backend/):
+    python -m benchmarks.bench_shards [vectors] [dim] [shard_counts] [processes] [clients]
+
+Builds a hash-sharded flat store of `vectors` random unit vectors once per
+shard count (comma-separated, default 1,2,4,8), then measures single-query
+latency with one client and queries per second with `clients` concurrent
+client threads. With processes=1 every shard runs in its own worker
+process. Speedups need as many free cores as shards: on a single core the
+fan-out only adds overhead.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from app.db.vector_store import VectorStore  # noqa: F401  (import before the sharded store)
+from app.db.sharded_store import ShardedVectorStore
+
+CHUNK = 50_000
+LATENCY_QUERIES = 200
+THROUGHPUT_SECONDS = 5.0
+
+
+def build(vectors: np.ndarray, shards: int, processes: bool) -> ShardedVectorStore:
+    store = ShardedVectorStore(
+        "flat", vectors.shape[1], "none", tempfile.mkdtemp(prefix="triage_shards_"),
+        "hash", shards, processes=processes, search_threads=max(shards, os.cpu_count() or 1),
+    )
+    store.load_index()
+    for start in range(0, len(vectors), CHUNK):
+        chunk = vectors[start:start + CHUNK]
+        store.add_vectors(chunk, [f"vector {i}" for i in range(start, start + len(chunk))])
+    store.save_index()
+    return store
+
+
+def latency(store: ShardedVectorStore, queries: np.ndarray) -> np.ndarray:
+    timings = []
+    for query in queries[:LATENCY_QUERIES]:
+        start = time.perf_counter()
+        store.search_similar(query, 5)
+        timings.append(time.perf_counter() - start)
+    return np.array(timings) * 1000
+
+
+def throughput(store: ShardedVectorStore, queries: np.ndarray, clients: int) -> float:
+    done = [0] * clients
+    deadline = time.perf_counter() + THROUGHPUT_SECONDS
+
+    def client(n: int) -> None:
+        i = n
+        while time.perf_counter() < deadline:
+            store.search_similar(queries[i % len(queries)], 5)
+            done[n] += 1
+            i += clients
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(done) / THROUGHPUT_SECONDS
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    shard_counts = [int(n) for n in (sys.argv[3] if len(sys.argv) > 3 else "1,2,4,8").split(",")]
+    processes = len(sys.argv) > 4 and sys.argv[4] == "1"
+    clients = int(sys.argv[5]) if len(sys.argv) > 5 else 8
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.choice(count, 1000, replace=False)]
+
+    print(f"{count} vectors, dim {dim}, {os.cpu_count()} cpus, "
+          f"{'worker processes' if processes else 'in-process shards'}, {clients} clients")
+    print(f"{'shards':>6} {'p50 ms':>8} {'p95 ms':>8} {'qps':>8} {'speedup':>8}")
+    baseline = None
+    for shards in shard_counts:
+        store = build(vectors, shards, processes)
+        store.search_similar(queries[0], 5)  # warm up
+        timings = latency(store, queries)
+        qps = throughput(store, queries, clients)
+        baseline = baseline or qps
+        print(f"{shards:>6} {np.percentile(timings, 50):>8.2f} {np.percentile(timings, 95):>8.2f} "
+              f"{qps:>8.1f} {qps / baseline:>7.2f}x")
+        store.clear()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
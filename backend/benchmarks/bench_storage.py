@@ -0,0 +1,45 @@
+"""Append latency of the log store as history grows.
+
+Usage (from backend/):
+    python -m benchmarks.bench_storage [total_lines] [batch_size]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from app.utils.storage import SQLiteStore
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    report_every = max(total // 10, batch_size)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStore(db_path=os.path.join(tmp, "bench.db"), legacy_dir=None)
+        batch = [
+            f"2026-02-06 09:15:23 ERROR [OrderService] Order execution timeout id={i}"
+            for i in range(batch_size)
+        ]
+
+        print(f"{'history':>12} {'append ms/batch':>16} {'tail(20) ms':>12}")
+        written = 0
+        window = []
+        while written < total:
+            start = time.perf_counter()
+            store.append_logs(batch)
+            window.append(time.perf_counter() - start)
+            written += batch_size
+
+            if written % report_every == 0:
+                start = time.perf_counter()
+                store.tail_logs(20)
+                tail_ms = (time.perf_counter() - start) * 1000
+                avg_ms = sum(window) / len(window) * 1000
+                print(f"{written:>12,} {avg_ms:>16.2f} {tail_ms:>12.3f}")
+                window = []
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Recall@5, QPS and memory of the index types against exact Flat search.
+
+Usage (from backend/):
+    python -m benchmarks.bench_vector_index [num_vectors] [dim] [num_queries]
+"""
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from app.db.vector_store import build_index, search_params, train_ivfpq
+
+K = 5
+
+
+def clustered_vectors(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    """Gaussian blobs, closer to real log embeddings than uniform noise."""
+    centers = rng.standard_normal((max(n // 200, 10), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), n)
+    return centers[labels] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def measure(index, queries, truth, params=None):
+    start = time.perf_counter()
+    _, found = index.search(queries, K, params=params)
+    qps = len(queries) / (time.perf_counter() - start)
+    recall = np.mean([len(set(f) & set(t)) / K for f, t in zip(found, truth)])
+    memory_mb = len(faiss.serialize_index(index)) / 1e6
+    return recall, qps, memory_mb
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 768
+    num_queries = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+
+    rng = np.random.default_rng(0)
+    data = clustered_vectors(n, dim, rng)
+    picks = rng.choice(n, num_queries, replace=False)
+    queries = data[picks] + 0.05 * rng.standard_normal((num_queries, dim)).astype(np.float32)
+
+    flat = build_index("flat", dim)
+    flat.add(data)
+    _, truth = flat.search(queries, K)
+
+    print(f"{'index':<18} {'recall@5':>9} {'QPS':>10} {'memory MB':>10}")
+    recall, qps, memory = measure(flat, queries, truth)
+    print(f"{'flat':<18} {recall:>9.3f} {qps:>10.0f} {memory:>10.1f}")
+
+    hnsw = build_index("hnsw", dim)
+    hnsw.add(data)
+    for ef in (16, 64, 256):
+        recall, qps, memory = measure(hnsw, queries, truth, search_params(hnsw, ef_search=ef))
+        print(f"{f'hnsw ef={ef}':<18} {recall:>9.3f} {qps:>10.0f} {memory:>10.1f}")
+
+    ivfpq = train_ivfpq(data, nlist=int(4 * np.sqrt(n)), pq_m=dim // 8)
+    for nprobe in (4, 16, 64):
+        recall, qps, memory = measure(ivfpq, queries, truth, search_params(ivfpq, nprobe=nprobe))
+        print(f"{f'ivfpq nprobe={nprobe}':<18} {recall:>9.3f} {qps:>10.0f} {memory:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Settings are read at import time: point the app at scratch storage and the
+# offline backends before any test imports it
+os.environ.setdefault("TRIAGE_DATA_DIR", tempfile.mkdtemp(prefix="triage_tests_"))
+os.environ.setdefault("EMBEDDING_BACKEND", "fake")
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("ANALYSIS_CACHE_ENABLED", "0")
@@ -0,0 +1,38 @@
+"""Analysis cache keys: what makes two analyses share an entry."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.ai.analysis_cache import AnalysisCache
+from app.main import app
+from app.routes import analysis
+
+LOGS = ["2024-01-01T00:00:00 ERROR [payments] upstream timeout after 30s"]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis, "ANALYSIS_CACHE_ENABLED", True)
+    monkeypatch.setattr(analysis, "analysis_cache", AnalysisCache(str(tmp_path / "analysis_cache.db")))
+    with TestClient(app) as client:
+        yield client
+
+
+def analyze(client: TestClient, logs, retrieval: str):
+    response = client.post("/analyze_incident", json={"logs": logs, "retrieval": retrieval})
+    assert response.status_code == 200
+    return response.json()["cache_hit"]
+
+
+def test_fingerprint_scope_covers_filters_and_mode():
+    reordered = LOGS[::-1] + LOGS
+    assert analysis._fingerprint(LOGS, {}, "dense") == analysis._fingerprint(reordered, {}, "dense")
+    assert analysis._fingerprint(LOGS, {}, "dense") != analysis._fingerprint(LOGS, {}, "hybrid")
+    assert analysis._fingerprint(LOGS, {}, "dense") != analysis._fingerprint(LOGS, {"source": "api"}, "dense")
+
+
+def test_cached_analysis_is_only_served_for_the_same_retrieval_mode(client):
+    assert analyze(client, LOGS, "lexical") is None
+    assert analyze(client, LOGS, "lexical") == "exact"
+    assert analyze(client, LOGS, "dense") is None
+    assert analyze(client, LOGS, "hybrid") is None
+    assert analyze(client, LOGS, "dense") == "exact"
@@ -0,0 +1,80 @@
+"""Online incident clustering of log templates."""
+import time
+
+import numpy as np
+
+from app.ai.clustering import IncidentClusters
+from app.utils.preprocessing import LogTemplate
+
+DIM = 8
+NOW = 1_700_000_000.0
+
+
+def template(template_id: int, line: str = "") -> LogTemplate:
+    line = line or f"template {template_id}"
+    return LogTemplate(template_id, line.split(), line, "2024-01-01T00:00:00")
+
+
+def axis(i: int, noise: float = 0.0) -> list:
+    vector = np.zeros(DIM, dtype=np.float32)
+    vector[i] = 1.0
+    vector[(i + 1) % DIM] = noise
+    return vector.tolist()
+
+
+def test_similar_templates_join_and_distant_ones_open_clusters():
+    clusters = IncidentClusters(window_seconds=60, distance=0.3)
+    a, b, c = template(1, "ERROR [api] gateway timeout"), template(2), template(3)
+    now = time.time()
+    # b joins the cluster a opens within the same batch; c is orthogonal to both
+    clusters.add([(a, 5), (b, 2), (c, 1)], {1: axis(0), 2: axis(0, 0.1), 3: axis(3)}, now=now)
+    clusters.add([(a, 4)], {}, now=now)  # already placed: no vector needed
+
+    stats = clusters.stats()
+    assert stats["active_clusters"] == 2
+    assert stats["templates_assigned"] == 3
+    assert stats["lines_clustered"] == 12
+    largest, smallest = clusters.active()
+    assert (largest["lines"], largest["templates"]) == (11, 2)
+    assert largest["representatives"][0] == "ERROR [api] gateway timeout"
+    assert (smallest["lines"], smallest["templates"]) == (1, 1)
+
+    # A later batch joins the existing centroid through the knn path
+    clusters.add([(template(4), 3)], {4: axis(3, 0.2)}, now=now)
+    assert clusters.stats()["active_clusters"] == 2
+    assert [cluster["lines"] for cluster in clusters.active()] == [11, 4]
+
+
+def test_templates_without_vectors_are_unclustered():
+    clusters = IncidentClusters(window_seconds=60)
+    clusters.add([(template(1), 7)], {}, now=NOW)
+    stats = clusters.stats()
+    assert stats["active_clusters"] == 0
+    assert stats["lines_unclustered"] == 7
+    assert clusters.unplaced([template(1)])[0].id == 1
+
+
+def test_idle_clusters_close_and_their_templates_are_placed_afresh():
+    clusters = IncidentClusters(window_seconds=60)
+    a, b = template(1), template(2)
+    clusters.add([(a, 1), (b, 1)], {1: axis(0), 2: axis(4)}, now=NOW)
+    clusters.add([(b, 1)], {}, now=NOW + 50)
+    clusters.add([], {}, now=NOW + 100)
+
+    stats = clusters.stats()
+    assert stats["active_clusters"] == 1
+    assert stats["closed_clusters"] == 1
+    assert [t.id for t in clusters.unplaced([a, b])] == [1]
+
+
+def test_active_cap_closes_least_recent_even_with_expired_clusters():
+    clusters = IncidentClusters(window_seconds=60, max_active=2)
+    clusters.add([(template(1), 1)], {1: axis(0)}, now=NOW)
+    clusters.add([(template(i), 1) for i in range(2, 5)], {i: axis(i) for i in range(2, 5)}, now=NOW + 30)
+    # Cluster 1 is now idle past the window, and the other three exceed the cap
+    clusters.add([], {}, now=NOW + 70)
+
+    stats = clusters.stats()
+    assert stats["active_clusters"] == 2
+    assert stats["closed_clusters"] == 2
+    assert [t.id for t in clusters.unplaced([template(i) for i in range(1, 5)])] == [1, 2]
@@ -0,0 +1,119 @@
+"""Persistent ingestion jobs: interruption on shutdown and resume on restart."""
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from app.utils.jobs import COMPLETED, FAILED, QUEUED, RUNNING, JobContext, JobQueue, job_view
+from app.utils.storage import store
+
+ITEMS = 5
+
+
+def upload(data: bytes = b"line\n" * ITEMS) -> str:
+    path = JobQueue.new_upload_path(".log")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def wait_for(job_id: str, status: str, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get_job(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is {job['status']}, expected {status}")
+
+
+class CountingHandler:
+    """Processes ITEMS items from the last reported one, optionally pausing after `pause_after`."""
+
+    def __init__(self, pause_after: int = 0):
+        self.pause_after = pause_after
+        self.paused = threading.Event()
+        self.proceed = threading.Event()
+        self.started_from = []
+
+    def __call__(self, context: JobContext) -> dict:
+        done = context.job.get("items_done", 0)
+        self.started_from.append(done)
+        while done < ITEMS:
+            done += 1
+            context.report(items_done=done)
+            if done == self.pause_after:
+                self.paused.set()
+                self.proceed.wait()
+        return {"items_done": done}
+
+
+def test_interrupted_job_resumes_from_reported_progress():
+    first = CountingHandler(pause_after=2)
+    queue = JobQueue(first, workers=1)
+    queue.start()
+    job = queue.submit(upload(), "app.log")
+    assert first.paused.wait(10)
+
+    # Shutdown is noticed at the next progress report, which is kept
+    queue.stopping.set()
+    first.proceed.set()
+    queue.stop()
+    interrupted = store.get_job(job["id"])
+    assert interrupted["status"] == QUEUED
+    assert queue.stats() == {QUEUED: 1, RUNNING: 0}
+    assert interrupted["items_done"] == 3
+    assert os.path.exists(job["source_path"])
+
+    second = CountingHandler()
+    queue = JobQueue(second, workers=1)
+    queue.start()
+    try:
+        finished = wait_for(job["id"], COMPLETED)
+    finally:
+        queue.stop()
+    assert queue.stats()[QUEUED] == 0
+    assert second.started_from == [3]
+    assert finished["items_done"] == ITEMS
+    assert finished["elapsed_seconds"] >= interrupted["elapsed_seconds"]
+    assert not os.path.exists(job["source_path"])
+    assert job_view(finished)["progress"] == 1.0
+
+
+def test_job_left_running_by_a_crash_is_resumed():
+    job = {
+        "id": str(uuid.uuid4()),
+        "status": RUNNING,
+        "filename": "app.log",
+        "source_path": upload(),
+        "bytes_total": 5 * ITEMS,
+        "items_done": 4,
+        "created_at": datetime.now().isoformat(),
+    }
+    store.save_job(job)
+
+    handler = CountingHandler()
+    queue = JobQueue(handler, workers=1)
+    queue.start()
+    try:
+        wait_for(job["id"], COMPLETED)
+    finally:
+        queue.stop()
+    assert handler.started_from == [4]
+
+
+def test_failed_job_records_the_error():
+    def handler(context: JobContext) -> dict:
+        context.fail_item("line 1", "unparseable")
+        raise ValueError("embedding backend unavailable")
+
+    queue = JobQueue(handler, workers=1)
+    queue.start()
+    try:
+        job = queue.submit(upload(), "app.log")
+        failed = wait_for(job["id"], FAILED)
+    finally:
+        queue.stop()
+    assert failed["error"] == "embedding backend unavailable"
+    assert failed["failures"] == [{"item": "line 1", "error": "unparseable"}]
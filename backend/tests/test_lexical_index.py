@@ -0,0 +1,85 @@
+"""BM25 lexical index, reciprocal rank fusion and hybrid retrieval."""
+import numpy as np
+import pytest
+
+from app.db.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+from app.db.vector_store import VectorStore
+
+DOCS = [
+    "Connection timeout to db-01.prod after 30s",
+    "ERR-504 gateway timeout from upstream api",
+    "BTC/USD order book stale, trading paused",
+    "disk usage 91% on db-02.prod",
+    "user login succeeded",
+]
+
+
+@pytest.fixture
+def index():
+    index = LexicalIndex()
+    index.add(DOCS)
+    return index
+
+
+def test_tokenize_keeps_punctuated_tokens_and_their_parts():
+    tokens = tokenize("ERR-504 on db-01.prod: BTC/USD")
+    assert {"err-504", "db-01.prod", "btc/usd"} <= set(tokens)
+    assert {"err", "504", "db", "01", "prod", "btc", "usd"} <= set(tokens)
+
+
+def test_exact_token_ranks_first(index):
+    ids, scores = index.search("ERR-504", 3)
+    assert ids.tolist() == [1]
+    ids, scores = index.search("timeout db-01.prod", 5)
+    assert ids[0] == 0
+    assert set(ids.tolist()) == {0, 1, 3}
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_unmatched_documents_are_never_returned(index):
+    ids, _ = index.search("kafka rebalance", 5)
+    assert len(ids) == 0
+    ids, _ = index.search("", 5)
+    assert len(ids) == 0
+
+
+def test_count_and_mask_limit_candidates(index):
+    ids, _ = index.search("prod", 5, count=3)
+    assert ids.tolist() == [0]
+    mask = np.array([False, True, True, True, True])
+    ids, _ = index.search("prod", 5, mask=mask)
+    assert ids.tolist() == [3]
+
+
+def test_incremental_adds_score_like_one_add():
+    docs = [f"service-{i % 7} error code {i % 13} on host {i % 5}" for i in range(3000)]
+    whole = LexicalIndex()
+    whole.add(docs)
+    grown = LexicalIndex()
+    for start in range(0, len(docs), 100):
+        grown.add(docs[start:start + 100])
+        grown.search("service-3 host", 5)  # queried while it grows
+    assert len(grown) == len(whole) == 3000
+    for query in ("service-3 host 4", "code 12"):
+        ids, scores = grown.search(query, 10)
+        expected_ids, expected_scores = whole.search(query, 10)
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(scores, expected_scores)
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=3, rrf_k=60)
+    assert [doc for doc, _ in fused] == ["b", "a", "d"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+    assert reciprocal_rank_fusion([[], []], k=3) == []
+
+
+def test_hybrid_search_surfaces_exact_tokens(tmp_path):
+    store = VectorStore("flat", 4, "none", str(tmp_path))
+    store.load_index()
+    vectors = np.eye(4, dtype=np.float32)[[0, 1, 2, 3, 3]]
+    store.add_vectors(vectors, DOCS)
+    # The embedding points elsewhere; BM25 still pulls the error code in
+    hits = store.search_hybrid(np.eye(4, dtype=np.float32)[0], "ERR-504", 2)
+    assert {text for text, _ in hits} == {DOCS[0], DOCS[1]}
+    assert [text for text, _ in store.search_lexical("ERR-504", 5)] == [DOCS[1]]
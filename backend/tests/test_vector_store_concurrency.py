@@ -0,0 +1,148 @@
+"""Concurrent adds, searches, deletes and compactions against one VectorStore."""
+import threading
+
+import numpy as np
+import pytest
+
+from app.db import vector_store as vector_store_module
+from app.db.vector_store import VectorStore
+
+DIM = 16
+PRELOAD = 2000
+WRITERS = 3
+BATCHES = 40
+BATCH = 64
+
+
+def unit_vectors(rng: np.random.Generator, count: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Snapshot (and rebase onto the memory-mapped copy) several times during the run
+    monkeypatch.setattr(vector_store_module, "SNAPSHOT_INTERVAL", 1000)
+    store = VectorStore("flat", DIM, "none", str(tmp_path))
+    store.load_index()
+    yield store
+    store.clear()
+
+
+def test_concurrent_add_search_compact(store):
+    rng = np.random.default_rng(0)
+    vectors = unit_vectors(rng, PRELOAD)
+    known = {f"preload {i}": vector for i, vector in enumerate(vectors)}
+    store.add_vectors(vectors, list(known))
+    committed = list(known)  # texts whose add has returned
+    committed_lock = threading.Lock()
+    writers_done = threading.Event()
+    errors = []
+    deleted = []
+
+    def check(condition: bool, message: str) -> None:
+        if not condition:
+            errors.append(message)
+
+    def writer(n: int) -> None:
+        rng = np.random.default_rng(100 + n)
+        for batch in range(BATCHES):
+            vectors = unit_vectors(rng, BATCH)
+            names = [f"writer {n} batch {batch} vector {i}" for i in range(BATCH)]
+            known.update(zip(names, vectors))
+            store.add_vectors(vectors, names)
+            with committed_lock:
+                committed.extend(names)
+
+    def deleter() -> None:
+        while not writers_done.is_set():
+            deleted.append(store.delete_oldest(25))
+            store.compact()
+
+    def view_reader() -> None:
+        # A published view is never torn: every parallel structure covers its count
+        while not writers_done.is_set():
+            view = store._published
+            index, metadata, attributes, ids, lexical, count = view
+            check(len(view) == 6, "published view has the wrong shape")
+            check(index.ntotal >= count, f"index has {index.ntotal} vectors, view counts {count}")
+            check(len(metadata) >= count, f"{len(metadata)} texts for {count} vectors")
+            check(len(attributes) >= count, f"{len(attributes)} attribute rows for {count} vectors")
+            check(len(ids) >= count, f"{len(ids)} ids for {count} vectors")
+            check(len(lexical) >= count, f"{len(lexical)} BM25 documents for {count} vectors")
+
+    def locked_reader() -> None:
+        # Between writer critical sections the view is the live index, fully counted
+        while not writers_done.is_set():
+            with store._lock:
+                index, count = store._published[0], store._published[5]
+                check(index is store.index, "published index is not the store's index")
+                check(count == store.index.ntotal, f"view counts {count}, index has {store.index.ntotal}")
+
+    def searcher(n: int) -> None:
+        rng = np.random.default_rng(n)
+        while not writers_done.is_set():
+            with committed_lock:
+                name = committed[int(rng.integers(len(committed)))]
+            query = known[name]
+            hits = store.search_similar(query, 5)
+            check(bool(hits), "search returned nothing")
+            for text, distance in hits:
+                expected = float(((known[text] - query) ** 2).sum())
+                check(abs(expected - distance) < 1e-3, f"{text!r} paired with the wrong vector")
+            for text, _ in store.search_hybrid(query, name, 5):
+                check(text in known, f"hybrid search returned unknown text {text!r}")
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(WRITERS)]
+    others = [threading.Thread(target=target) for target in (deleter, view_reader, locked_reader)]
+    others += [threading.Thread(target=searcher, args=(n,)) for n in range(3)]
+    for thread in threads + others:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writers_done.set()
+    for thread in others:
+        thread.join()
+
+    assert errors == []
+    store.compact()
+    store.save_index()
+    total = PRELOAD + WRITERS * BATCHES * BATCH
+    assert store.compactions > 0
+    assert store.get_total_vectors() == store.index.ntotal == len(store.metadata)
+    assert store.ids.next_id == total
+    assert store.get_total_vectors() == store.live_count() == total - sum(deleted)
+    # Every surviving vector is still paired with its own text
+    start = store.index.ntotal - 50
+    for position, vector in zip(range(start, start + 50), store.index.reconstruct_n(start, 50)):
+        text = store.metadata[position]
+        np.testing.assert_allclose(vector, known[text], atol=1e-6)
+        assert store.search_similar(vector, 1)[0][0] == text
+
+
+def test_failed_commit_leaves_later_batches_aligned(store, monkeypatch):
+    rng = np.random.default_rng(1)
+    with pytest.raises(ValueError):
+        store.add_vectors(unit_vectors(rng, 3), ["only one text"])
+    with pytest.raises(ValueError):
+        store.add_vectors(unit_vectors(rng, 2), ["a", "b"], [(None, 0, None, None)])
+
+    good = unit_vectors(rng, 4)
+    store.add_vectors(good[:2], ["kept 0", "kept 1"], [(None, 4, "api", None)] * 2)
+    add = store.index.add
+
+    def failing_add(vectors):
+        raise MemoryError("index add failed")
+
+    monkeypatch.setattr(store.index, "add", failing_add)
+    with pytest.raises(MemoryError):
+        store.add_vectors(unit_vectors(rng, 5), [f"lost {i}" for i in range(5)], [(None, 5, "db", None)] * 5)
+    monkeypatch.setattr(store.index, "add", add)
+
+    store.add_vectors(good[2:], ["kept 2", "kept 3"], [(None, 3, "web", None)] * 2)
+    assert store.get_total_vectors() == store.index.ntotal == 4
+    assert [len(store.attributes), len(store.ids), len(store.metadata), len(store.lexical)] == [4] * 4
+    for i, vector in enumerate(good):
+        assert store.search_similar(vector, 1)[0][0] == f"kept {i}"
+    assert [text for text, _ in store.search_lexical("kept", 5, source="web")] == ["kept 2", "kept 3"]
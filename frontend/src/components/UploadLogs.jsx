@@ -105,7 +105,7 @@ function UploadLogs({ onUploadSuccess }) {
           <input
             ref={fileInputRef}
             type="file"
-            accept=".json,.csv,.txt,.log"
+            accept=".json,.csv,.txt,.log,.ndjson,.jsonl,.gz"
             onChange={handleFileUpload}
             className="hidden"
             disabled={isUploading}
@@ -12,13 +12,30 @@ const api = axios.create({
   timeout: 120000, // 2 minute timeout for LLM calls
 });
 
+/**
+ * Poll an ingestion job until it completes or fails
+ * @param {object} job - Job returned by an upload endpoint
+ * @param {number} intervalMs - Delay between polls
+ */
+export const waitForJob = async (job, intervalMs = 1000) => {
+  while (job.status === 'queued' || job.status === 'running') {
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    const response = await api.get(`/jobs/${job.id}`);
+    job = response.data;
+  }
+  if (job.status === 'failed') {
+    throw new Error(job.error || 'Ingestion failed');
+  }
+  return job;
+};
+
 /**
  * Upload log messages for processing
  * @param {string[]} logs - Array of log strings
  */
 export const uploadLogs = async (logs) => {
   const response = await api.post('/upload_logs', { logs });
-  return response.data;
+  return waitForJob(response.data);
 };
 
 /**
@@ -31,7 +48,7 @@ export const uploadLogFile = async (file) => {
   const response = await api.post('/upload_logs', formData, {
     headers: { 'Content-Type': 'multipart/form-data' },
   });
-  return response.data;
+  return waitForJob(response.data);
 };
 
 /**
@@ -39,7 +56,7 @@ export const uploadLogFile = async (file) => {
  */
 export const uploadDemoLogs = async () => {
   const response = await api.post('/upload_demo_logs');
-  return response.data;
+  return waitForJob(response.data);
 };
 
 /**